@@ -12,17 +12,57 @@ import pyrogue    as pr
 import lcls2_llrf as llrf
 
 class Application(pr.Device):
-    def __init__(self,**kwargs):
+    def __init__(self,
+            pollClass = None, # Poll interval overrides (see POLL_CLASS_C)
+            blockRead = True, # Flag to use the burst read variables in the cores and the combiner
+            **kwargs):
         super().__init__(**kwargs)
 
         for i in range(4):
             self.add(llrf.BsaMpsMsgRxCore(
-                name   = f'BsaMpsMsgRxCore[{i}]',
-                offset = i*0x10000000,
+                name      = f'BsaMpsMsgRxCore[{i}]',
+                offset    = i*0x10000000,
+                pollClass = pollClass,
+                blockRead = blockRead,
                 # expand = True,
             ))
 
         self.add(llrf.BsaMpsMsgRxCombine(
-            offset = 0x40000000,
+            offset    = 0x40000000,
+            pollClass = pollClass,
+            blockRead = blockRead,
             # expand = True,
         ))
+
+        self.add(pr.LocalCommand(
+            name        = 'SaveLinkConfig',
+            description = 'Write the RW configuration of the four cores to the YAML file given as argument',
+            value       = '',
+            function    = lambda arg: self.saveLinkConfig(arg),
+        ))
+
+        self.add(pr.LocalCommand(
+            name        = 'RestoreLinkConfig',
+            description = 'Write and verify the core configuration from the YAML file given as argument',
+            value       = '',
+            function    = lambda arg: self.restoreLinkConfig(arg),
+        ))
+
+    def readPipelined(self, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+        """Read the four cores and the combiner as one pipelined batch"""
+        return llrf.readPipelined(
+            devices     = [self.BsaMpsMsgRxCore[i] for i in range(4)] + [self.BsaMpsMsgRxCombine],
+            maxInFlight = maxInFlight,
+        )
+
+    def saveLinkConfig(self, path=None):
+        """Read the RW configuration of the four cores (see saveLinkConfig())"""
+        return llrf.saveLinkConfig(self, path)
+
+    def diffLinkConfig(self, profile):
+        """Differences between the cores and a profile (see diffLinkConfig())"""
+        return llrf.diffLinkConfig(self, profile)
+
+    def restoreLinkConfig(self, profile, verify=True):
+        """Batched write and verify of a profile (see restoreLinkConfig())"""
+        return llrf.restoreLinkConfig(self, profile, verify=verify)
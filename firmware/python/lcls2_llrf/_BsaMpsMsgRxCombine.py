@@ -10,83 +10,93 @@
 
 import pyrogue as pr
 
+import lcls2_llrf as llrf
+
 class BsaMpsMsgRxCombine(pr.Device):
-    def __init__(self,**kwargs):
+    def __init__(self,
+            blockRead = True, # Flag to read BsaData/BsaSevr as one 256-byte burst
+            pollClass = None, # Poll interval overrides (see POLL_CLASS_C)
+            **kwargs):
         super().__init__(**kwargs)
 
-        self.addRemoteVariables(
-            name         = 'BsaData',
-            description  = 'BsaData',
-            offset       = 0x000,
-            bitSize      = 32,
-            mode         = 'RO',
-            number       = 32,
-            stride       = 4,
-            pollInterval = 1,
-        )
-
-        self.addRemoteVariables(
-            name         = 'BsaSevr',
-            description  = 'BsaSevr',
-            offset       = 0x080,
-            bitSize      = 2,
-            mode         = 'RO',
-            number       = 32,
-            stride       = 4,
-            pollInterval = 1,
-        )
-
-        self.addRemoteVariables(
-            name         = 'RemoteDropCnt',
-            description  = 'Remote Drop Counter',
-            offset       = 0x100,
-            bitSize      = 32,
-            mode         = 'RO',
-            number       = 4,
-            stride       = 16,
-            pollInterval = 1,
-        )
-
-        self.addRemoteVariables(
-            name         = 'RemoteTimestamp',
-            description  = 'Remote Timestamp',
-            offset       = 0x200,
-            bitSize      = 64,
-            mode         = 'RO',
-            number       = 4,
-            stride       = 16,
-            pollInterval = 1,
-        )
-
-        self.add(pr.RemoteVariable(
-            name         = 'LocalTimestamp',
-            description  = 'Local Timestamp',
-            offset       = 0x240,
-            bitSize      = 64,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'PacketRate',
-            description  = 'Diagnostic Bus Update Rate (units of Hz)',
-            offset       = 0x300,
-            units        = 'Hz',
-            disp         = '{:d}',
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'CntRst',
-            description  = 'Status Counter Reset',
-            offset       = 0xFFC,
-            bitSize      = 1,
-            mode         = 'WO',
-        ))
-
-        self.add(pr.LocalCommand(
-            name        = 'RstCnt',
-            description = 'Reset all the status counters',
-            function    = lambda: self.CntRst.set(1),
-        ))
+        poll = llrf.pollIntervals(pollClass)
+
+        # Register layout from BsaMpsMsgRxCombine.yaml
+        regs = llrf.registerMap('BsaMpsMsgRxCombine')
+        data = regs['BsaData']
+        sevr = regs['BsaSevr']
+
+        if blockRead:
+
+            # BsaData (0x000:0x07F) and BsaSevr (0x080:0x0FF) in one transaction
+            self.add(pr.RemoteVariable(
+                name         = 'BsaBlock',
+                description  = 'BsaData[31:0] followed by BsaSevr[31:0] (single burst read)',
+                offset       = data.offset,
+                bitSize      = 64*32,
+                numValues    = 64,
+                valueBits    = 32,
+                valueStride  = 32,
+                mode         = 'RO',
+                hidden       = True,
+                pollInterval = poll['fast'],
+            ))
+
+            self.add(pr.LinkVariable(
+                name         = 'BsaDataArray',
+                description  = 'BsaData[31:0] as a NumPy array',
+                mode         = 'RO',
+                dependencies = [self.BsaBlock],
+                linkedGet    = lambda read: self.BsaBlock.get(read=read)[0:32],
+            ))
+
+            self.add(pr.LinkVariable(
+                name         = 'BsaSevrArray',
+                description  = 'BsaSevr[31:0] as a NumPy array',
+                mode         = 'RO',
+                dependencies = [self.BsaBlock],
+                linkedGet    = lambda read: self.BsaBlock.get(read=read)[32:64] & 0x3,
+            ))
+
+            for i in range(32):
+
+                self.add(pr.LinkVariable(
+                    name         = f'BsaData[{i}]',
+                    description  = 'BsaData',
+                    mode         = 'RO',
+                    typeStr      = 'UInt32',
+                    disp         = '{:#x}',
+                    dependencies = [self.BsaBlock],
+                    linkedGet    = lambda read, i=i: int(self.BsaBlock.get(read=read, index=i)),
+                ))
+
+            for i in range(32):
+
+                self.add(pr.LinkVariable(
+                    name         = f'BsaSevr[{i}]',
+                    description  = 'BsaSevr',
+                    mode         = 'RO',
+                    typeStr      = 'UInt2',
+                    disp         = '{:#x}',
+                    dependencies = [self.BsaBlock],
+                    linkedGet    = lambda read, i=i: int(self.BsaBlock.get(read=read, index=32+i)) & 0x3,
+                ))
+
+        else:
+
+            llrf.addRegister(self, data, pollInterval=poll['fast'])
+            llrf.addRegister(self, sevr, pollInterval=poll['fast'])
+
+        llrf.addRegister(self, regs['RemoteDropCnt'],   pollInterval=poll['health'])
+        llrf.addRegister(self, regs['RemoteTimestamp'], pollInterval=poll['fast'])
+        llrf.addRegister(self, regs['LocalTimestamp'],  pollInterval=poll['fast'])
+        llrf.addRegister(self, regs['PacketRate'],      pollInterval=poll['health'], units='Hz', disp='{:d}')
+        llrf.addRegister(self, regs['CntRst'])
+
+        for cmd in regs.commands:
+
+            self.add(pr.LocalCommand(
+                name        = str(cmd['name']),
+                description = str(cmd['description']),
+                function    = lambda entry=str(cmd['entry']), value=int(cmd['value']): self.node(entry).set(value),
+            ))
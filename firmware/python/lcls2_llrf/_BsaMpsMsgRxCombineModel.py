@@ -0,0 +1,110 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Reference model of the SEND_MSG_S mapping in BsaMpsMsgRxCombine.vhd:
+#
+#    data(6*i+j)(15:0)  = Link[i].bsaQuantity(2*j+0)(31:16)
+#    data(6*i+j)(31:16) = Link[i].bsaQuantity(2*j+1)(31:16)
+#    sevr(6*i+j)(0)     = Link[i].bsaSevr(2*j+0)(0) or linkSevr(i)(0)
+#    sevr(6*i+j)(1)     = Link[i].bsaSevr(2*j+1)(0) or linkSevr(i)(1)
+#    data(30)(8*i+2*j+1:8*i+2*j) = Link[i].mpsPermit(j) when linkSevr(i) = "00"
+#    sevr(30)           = linkSevr(0) or linkSevr(1) or linkSevr(2) or linkSevr(3)
+#
+# linkSevr(i) is "00" when link i was time aligned with the local timing
+# message and "11" when it was dropped. Slots 24-29 and 31 are never
+# written by the firmware and keep their reset value.
+##############################################################################
+
+import numpy as np
+
+import lcls2_llrf as llrf
+
+DIAG_BUS_SIZE_C = 32
+MPS_SLOT_C      = 30
+
+# Slots holding BSA data (two 16-bit halves each)
+BSA_DATA_SLOTS_C = 24
+
+# Slots written by the firmware on every strobe
+COMBINE_SLOTS_C = np.r_[0:BSA_DATA_SLOTS_C, MPS_SLOT_C]
+
+def splitBsaData(words):
+    """Split packed BsaData words into their signed 16-bit I (bits 15:0) and Q (bits 31:16) halves, stacked on a new first axis"""
+    v = np.asarray(words, dtype=np.uint32)
+    return np.stack([(v & 0xFFFF).astype(np.uint16).view(np.int16),
+                     (v >> 16).astype(np.uint16).view(np.int16)]).astype(np.int32)
+
+def combineMsg(msg, aligned):
+    """
+    Apply the diagnosticBus mapping to a batch of decoded messages.
+
+    msg     : MSG_DTYPE array of shape (N,4), one message per link
+    aligned : bool array of shape (N,4), link aligned with the local timing
+
+    Returns (data, sevr) with shape (N,32): the BsaData and BsaSevr
+    registers as the firmware would present them after each strobe.
+    """
+    msg     = np.asarray(msg, dtype=llrf.MSG_DTYPE)
+    aligned = np.broadcast_to(np.asarray(aligned, dtype=bool), msg.shape)
+    num     = msg.shape[0]
+
+    data = np.zeros((num, DIAG_BUS_SIZE_C), dtype=np.uint32)
+    sevr = np.zeros((num, DIAG_BUS_SIZE_C), dtype=np.uint8)
+
+    # Per link severity: "00" when aligned else "11"
+    linkSevr = np.where(aligned, 0x0, 0x3).astype(np.uint8)
+
+    # BSA data: upper 16 bits of the I (even) and Q (odd) quantities
+    quantity = msg['bsaQuantity'][:,:,0:12] >> 16
+    data[:,0:24] = (quantity[:,:,0::2] | (quantity[:,:,1::2] << 16)).reshape(num, 24)
+
+    # BSA severity: only the LSB of each bsaSevr, OR'd with the link severity
+    bsaSevr = msg['bsaSevr'] & 0x1
+    sevrI   = bsaSevr[:,:,0::2] | (linkSevr[:,:,np.newaxis] & 0x1)
+    sevrQ   = bsaSevr[:,:,1::2] | (linkSevr[:,:,np.newaxis] >> 1)
+    sevr[:,0:24] = (sevrI | (sevrQ << 1)).reshape(num, 24)
+
+    # MPS permits of the aligned links, packed 8 bits per link
+    shift  = (8*np.arange(4)[:,np.newaxis] + 2*np.arange(4)[np.newaxis,:]).astype(np.uint32)
+    permit = (msg['mpsPermit'].astype(np.uint32) & 0x3) << shift
+    permit = np.where(aligned[:,:,np.newaxis], permit, 0)
+    data[:,MPS_SLOT_C] = permit.reshape(num, 16).sum(axis=1, dtype=np.uint32)
+    sevr[:,MPS_SLOT_C] = np.bitwise_or.reduce(linkSevr, axis=1)
+
+    return data, sevr
+
+def alignMsg(msg, localTimeStamp, linkUp=True):
+    """
+    Returns the 'aligned' flags of the CHECK_ALIGN_S state: a link is
+    aligned when its message time stamp equals the local timing message
+    time stamp and the link is up.
+
+    msg            : MSG_DTYPE array of shape (N,4)
+    localTimeStamp : uint64 array of shape (N,)
+    """
+    local = np.asarray(localTimeStamp, dtype=np.uint64)[:,np.newaxis]
+    return (msg['timeStamp'] == local) & np.asarray(linkUp, dtype=bool)
+
+def checkCombine(bsaData, bsaSevr, msg, aligned, slots=COMBINE_SLOTS_C):
+    """
+    Cross-check captured BsaData/BsaSevr readback (shape (N,32)) against
+    the raw link messages. Returns a bool array (N,32) that is True where
+    the readback differs from the model. By default only the slots the
+    firmware writes are compared.
+    """
+    data, sevr = combineMsg(msg, aligned)
+    bsaData = np.asarray(bsaData, dtype=np.uint32)
+    bsaSevr = np.asarray(bsaSevr, dtype=np.uint8) & 0x3
+
+    mismatch = (bsaData != data) | (bsaSevr != sevr)
+
+    mask = np.zeros(DIAG_BUS_SIZE_C, dtype=bool)
+    mask[slots] = True
+    return mismatch & mask
@@ -8,255 +8,119 @@
 ## the terms contained in the LICENSE.txt file.
 ##############################################################################
 
+import numpy   as np
 import pyrogue as pr
 
+import lcls2_llrf as llrf
+
 class BsaMpsMsgRxCore(pr.Device):
-    def __init__(self,**kwargs):
+    def __init__(self,
+            blockRead = True, # Flag to read the ten status counters as one burst
+            pollClass = None, # Poll interval overrides (see POLL_CLASS_C)
+            **kwargs):
         super().__init__(**kwargs)
 
-        self.add(pr.RemoteVariable(
-            name         = 'RxLinkUpCnt',
-            description  = 'RxLinkUp Status Counter',
-            offset       = 0x000,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'RxDecErr0Cnt',
-            description  = 'RxDecErr0 Status Counter',
-            offset       = 0x004,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'RxDecErr1Cnt',
-            description  = 'RxDecErr1 Status Counter',
-            offset       = 0x008,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'RxDispErr0Cnt',
-            description  = 'RxDispErr0 Status Counter',
-            offset       = 0x00C,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'RxDispErr1Cnt',
-            description  = 'RxDispErr1 Status Counter',
-            offset       = 0x010,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
+        poll = llrf.pollIntervals(pollClass)
+
+        # Register layout from BsaMpsMsgRxCore.yaml
+        regs = llrf.registerMap('BsaMpsMsgRxCore')
+        cnts = regs.span(0x000, 0x028)
+
+        if blockRead:
+
+            # All ten status counters (0x000:0x027) in one transaction
+            self.add(llrf.StatusCntVariable(
+                name         = 'StatusCnt',
+                description  = f'Status counters [{cnts[0].name}:{cnts[-1].name}] (single burst read)',
+                offset       = cnts[0].offset,
+                bitSize      = len(cnts)*32,
+                numValues    = len(cnts),
+                valueBits    = 32,
+                valueStride  = 32,
+                mode         = 'RO',
+                hidden       = True,
+                pollInterval = poll['health'],
+            ))
+
+            for i,reg in enumerate(cnts):
+
+                self.add(pr.LinkVariable(
+                    name         = reg.name,
+                    description  = reg.description,
+                    mode         = 'RO',
+                    typeStr      = 'UInt32',
+                    disp         = '{:#x}',
+                    dependencies = [self.StatusCnt],
+                    linkedGet    = lambda read, i=i: int(self.StatusCnt.get(read=read, index=i)),
+                ))
+
+            self.add(pr.LocalVariable(
+                name        = 'StatusCntRate',
+                description = 'Status counter increment rates from the last two snapshots',
+                mode        = 'RO',
+                units       = 'Hz',
+                value       = np.zeros(len(cnts), dtype=np.float64),
+            ))
+
+            self.add(pr.LocalVariable(
+                name        = 'StatusCntTotal',
+                description = 'Wrap-corrected 64-bit status counter totals',
+                mode        = 'RO',
+                value       = np.zeros(len(cnts), dtype=np.uint64),
+            ))
+
+        else:
+
+            for reg in cnts:
+                llrf.addRegister(self, reg, pollInterval=poll['health'])
+
+        # Previous name of the OverflowCnt register
+        self.add(pr.LinkVariable(
             name         = 'OverflowCntCnt',
-            description  = 'OverflowCnt Status Counter',
-            offset       = 0x014,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'ErrPktLenCnt',
-            description  = 'ErrPktLenCnt Status Counter',
-            offset       = 0x018,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'ErrCrcCnt',
-            description  = 'ErrCrc Status Counter',
-            offset       = 0x01C,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'CPllLockCnt',
-            description  = 'CPllLock Status Counter',
-            offset       = 0x020,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'GtRxFifoErrCnt',
-            description  = 'GtRxFifoErr Status Counter',
-            offset       = 0x024,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'RxLinkUp',
-            description  = 'RxLinkUp Status Counter',
-            offset       = 0x400,
-            bitSize      = 1,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'CPllLock',
-            description  = 'CPllLock Status Counter',
-            offset       = 0x401,
-            bitSize      = 1,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'PacketRate',
-            description  = 'Packet Rate (units of Hz)',
-            offset       = 0x410,
-            units        = 'Hz',
-            disp         = '{:d}',
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'SofRate',
-            description  = 'Start-Of-Frame Rate (units of Hz)',
-            offset       = 0x414,
-            units        = 'Hz',
-            disp         = '{:d}',
+            description  = 'Deprecated, use OverflowCnt',
             mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'UserValue',
-            description  = 'Remote UserValue Status Counter',
-            offset       = 0x500,
-            bitSize      = 128,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'RxPolarity',
-            description  = 'GTH RxPolarity',
-            offset       = 0x700,
-            bitSize      = 1,
-            mode         = 'RW',
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'TxPolarity',
-            description  = 'GTH TxPolarity',
-            offset       = 0x704,
-            bitSize      = 1,
-            mode         = 'RW',
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'Loopback',
-            description  = 'GTH Loopback',
-            offset       = 0x708,
-            bitSize      = 1,
-            mode         = 'RW',
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'RollOverEn',
-            description  = 'Status counters roll over enable bit mask',
-            offset       = 0x7F0,
-            bitSize      = 10,
-            mode         = 'RW',
-        ))
-
-        self.add(pr.RemoteVariable(
-            name         = 'CntRst',
-            description  = 'Status Counter Reset',
-            offset       = 0x7F4,
-            bitSize      = 1,
-            mode         = 'WO',
+            hidden       = True,
+            dependencies = [self.OverflowCnt],
+            linkedGet    = lambda read: self.OverflowCnt.get(read=read),
         ))
 
-        self.add(pr.RemoteVariable(
-            name         = 'GtRst',
-            description  = 'GTH Reset',
-            offset       = 0x7F8,
-            bitSize      = 1,
-            mode         = 'WO',
-        ))
+        llrf.addRegister(self, regs['RxLinkUp'],   pollInterval=poll['health'])
+        llrf.addRegister(self, regs['CPllLock'],   pollInterval=poll['health'])
+        llrf.addRegister(self, regs['PacketRate'], pollInterval=poll['health'], units='Hz', disp='{:d}')
+        llrf.addRegister(self, regs['SofRate'],    pollInterval=poll['health'], units='Hz', disp='{:d}')
+        llrf.addRegister(self, regs['UserValue'],  pollInterval=poll['slow'])
 
-        self.add(pr.RemoteVariable(
-            name         = 'HardRst',
-            description  = 'Hard Reset',
-            offset       = 0x7FC,
-            bitSize      = 1,
-            mode         = 'WO',
-        ))
+        for name in ['RxPolarity', 'TxPolarity', 'Loopback', 'RollOverEn']:
+            llrf.addRegister(self, regs[name], pollInterval=poll['onDemand'])
 
-        self.add(pr.LocalCommand(
-            name        = 'RstCnt',
-            description = 'Reset all the status counters',
-            function    = lambda: self.CntRst.set(1),
-        ))
+        for name in ['CntRst', 'GtRst', 'HardRst']:
+            llrf.addRegister(self, regs[name])
 
-        self.add(pr.LocalCommand(
-            name        = 'RstGt',
-            description = 'Reset the GTH',
-            function    = lambda: self.GtRst.set(1),
-        ))
+        for cmd in regs.commands:
 
-        self.add(pr.LocalCommand(
-            name        = 'RstHard',
-            description = 'Reset the registers to default values',
-            function    = lambda: self.HardRst.set(1),
-        ))
+            self.add(pr.LocalCommand(
+                name        = str(cmd['name']),
+                description = str(cmd['description']),
+                function    = lambda entry=str(cmd['entry']), value=int(cmd['value']): self._command(entry, value),
+            ))
 
-        self.addRemoteVariables(
-            name         = 'BsaQuantity',
-            description  = 'BsaQuantity',
-            offset       = 0x800,
-            bitSize      = 32,
-            mode         = 'RO',
-            number       = 12,
-            stride       = 4,
-            pollInterval = 1,
-        )
+        llrf.addRegister(self, regs['BsaQuantity'],     pollInterval=poll['fast'])
+        llrf.addRegister(self, regs['BsaSevr'],         pollInterval=poll['fast'])
+        llrf.addRegister(self, regs['MpsPermit'],       pollInterval=poll['fast'])
+        llrf.addRegister(self, regs['RemoteTimestamp'], pollInterval=poll['fast'])
 
-        self.addRemoteVariables(
-            name         = 'BsaSevr',
-            description  = 'BsaSevr',
-            offset       = 0x840,
-            bitSize      = 2,
-            mode         = 'RO',
-            number       = 12,
-            stride       = 4,
-            pollInterval = 1,
-        )
+        # Per-core counter snapshot, refreshed by every StatusCnt read
+        self.counterSnapshot = llrf.CounterSnapshot(self) if blockRead else None
 
-        self.add(pr.RemoteVariable(
-            name         = 'MpsPermit',
-            description  = 'Remote MpsPermit',
-            offset       = 0x900,
-            bitSize      = 8,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
+    def _command(self, entry, value):
+        self.node(entry).set(value)
 
-        self.add(pr.RemoteVariable(
-            name         = 'RemoteTimestamp',
-            description  = 'Remote Timestamp',
-            offset       = 0x910,
-            bitSize      = 64,
-            mode         = 'RO',
-            pollInterval = 1,
-        ))
+        # Cleared counters must not be unwrapped against their old values
+        if entry in ['CntRst', 'HardRst'] and self.counterSnapshot is not None:
+            self.counterSnapshot.reset()
 
     def hardReset(self):
-        self.HardRst.set(1)
+        self._command('HardRst', 1)
 
     def countReset(self):
-        self.CntRst.set(1)
+        self._command('CntRst', 1)
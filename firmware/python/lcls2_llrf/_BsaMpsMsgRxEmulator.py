@@ -0,0 +1,331 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+import time
+import heapq
+import threading
+
+import numpy as np
+import rogue.interfaces.memory as rim
+import pyrogue as pr
+
+import lcls2_llrf as llrf
+
+# Register space of each module (matches the 'size' in the YAML)
+MODULE_SIZE_C = 0x1000
+
+# Status counter indexes (SyncStatusVector bit order in BsaMpsMsgRxFramerReg.vhd)
+RX_LINK_UP_C   = 0
+CPLL_LOCK_C    = 8
+ERROR_CNT_C    = [1,2,3,4,5,6,7,9]
+
+def _timeStamp(t):
+    """Convert a float time (units of seconds) into the 64-bit (sec << 32 | nsec) timing format"""
+    sec  = int(t)
+    nsec = int(round((t - sec) * 1e9)) % 1000000000
+    return (sec << 32) | nsec
+
+class _LinkModel(object):
+    """Behavioural model of one BsaMpsMsgRxCore register space"""
+
+    def __init__(self, index, rng):
+        self.index  = index
+        self.rng    = rng
+        self.linkUp = True
+        self.phase  = rng.uniform(0.0, 2.0*np.pi, 12)
+        self.permit = 0xFF
+        self.hardReset()
+
+    def hardReset(self):
+        self.rxPolarity = 0
+        self.txPolarity = 0
+        self.loopback   = 0
+        self.rollOverEn = 0x1
+        self.countReset()
+
+    def countReset(self):
+        self.cnt = np.zeros(10, dtype=np.uint64)
+        self.cnt[RX_LINK_UP_C] = 1 if self.linkUp else 0
+        self.cnt[CPLL_LOCK_C]  = 1
+
+    def addCount(self, idx, n):
+        # Counters with the RollOverEn bit set wrap, others saturate
+        for i,inc in zip(idx,n):
+            total = int(self.cnt[i]) + int(inc)
+            if (self.rollOverEn >> i) & 0x1:
+                self.cnt[i] = total & 0xFFFFFFFF
+            else:
+                self.cnt[i] = min(total, 0xFFFFFFFF)
+
+    def bsaQuantity(self, t):
+        # 12 slowly rotating I/Q values per link
+        wave = np.sin(2.0*np.pi*0.1*t + self.phase)
+        return (wave * 0x3FFFFFFF).astype(np.int64) & 0xFFFFFFFF
+
+class BsaMpsMsgRxEmulator(rim.Slave):
+    """
+    In-process emulation of the carrier's SRP memory space.
+
+    The four BsaMpsMsgRxCore and the BsaMpsMsgRxCombine register spaces are
+    backed by a behavioural model (counters, rates, timestamps and BSA data
+    advance with wall clock time). Every other address behaves as plain
+    memory, which is enough for the AmcCarrierCore tree to start up.
+    Each transaction is completed after the configured latency, from a
+    separate thread, so that multiple transactions can be in flight.
+    """
+
+    def __init__(self,
+            appBase  = 0x80000000, # Application offset in the memory map
+            latency  = 0.0,        # Per-transaction latency (units of seconds)
+            pktRate  = 1000.0,     # Emulated message rate (units of Hz)
+            errRate  = 0.0,        # Emulated error counter increment rate (units of Hz)
+            seed     = None,
+            maxSize  = 4096):
+        rim.Slave.__init__(self, 4, maxSize)
+        self._log     = pr.logInit(cls=self)
+        self._appBase = appBase
+        self._latency = latency
+        self._pktRate = pktRate
+        self._errRate = errRate
+        self._rng     = np.random.default_rng(seed)
+        self._lock    = threading.Lock()
+        self._pages   = {}
+        self._links   = [_LinkModel(i, self._rng) for i in range(4)]
+        self._dropCnt = np.zeros(4, dtype=np.uint32)
+        self._dropAcc = np.zeros(4, dtype=np.float64) # Fraction of a drop not counted yet
+        self._tLast   = time.time()
+
+        # Completion queue for the transactions with latency
+        self._queue   = []
+        self._seq     = 0
+        self._cond    = threading.Condition()
+        self._thread  = None
+        self._run     = False
+
+    ########################################################################
+    # Configuration of the behavioural model
+    ########################################################################
+
+    @property
+    def latency(self):
+        return self._latency
+
+    @latency.setter
+    def latency(self, value):
+        self._latency = value
+
+    def setLinkUp(self, link, value):
+        with self._lock:
+            self._advance(time.time())
+            model = self._links[link]
+            if value and not model.linkUp:
+                model.addCount([RX_LINK_UP_C],[1])
+            model.linkUp = bool(value)
+
+    def setMpsPermit(self, link, value):
+        with self._lock:
+            self._links[link].permit = value & 0xFF
+
+    ########################################################################
+    # Transaction handling
+    ########################################################################
+
+    def _start(self):
+        self._run    = True
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        self._run = False
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _doTransaction(self, transaction):
+        if self._latency <= 0.0 or not self._run:
+            self._process(transaction)
+        else:
+            with self._cond:
+                self._seq += 1
+                heapq.heappush(self._queue, (time.monotonic() + self._latency, self._seq, transaction))
+                self._cond.notify()
+
+    def _worker(self):
+        while self._run:
+            with self._cond:
+                while self._run and (len(self._queue) == 0 or self._queue[0][0] > time.monotonic()):
+                    timeout = None if len(self._queue) == 0 else self._queue[0][0] - time.monotonic()
+                    self._cond.wait(timeout)
+                if not self._run:
+                    break
+                _,_,transaction = heapq.heappop(self._queue)
+            self._process(transaction)
+
+        # Complete anything still queued at shutdown
+        while len(self._queue) > 0:
+            _,_,transaction = heapq.heappop(self._queue)
+            self._process(transaction)
+
+    def _process(self, transaction):
+        address = transaction.address()
+        size    = transaction.size()
+        tType   = transaction.type()
+
+        with self._lock:
+            self._advance(time.time())
+
+            if (tType == rim.Write) or (tType == rim.Post):
+                ba = bytearray(size)
+                transaction.getData(ba, 0)
+                self._write(address, np.frombuffer(ba, dtype=np.uint8))
+            else:
+                ba = self._read(address, size)
+                transaction.setData(ba, 0)
+
+        transaction.done()
+
+    ########################################################################
+    # Memory pages
+    ########################################################################
+
+    def _page(self, page):
+        if page not in self._pages:
+            self._pages[page] = np.zeros(MODULE_SIZE_C, dtype=np.uint8)
+        return self._pages[page]
+
+    def _read(self, address, size):
+        ba  = bytearray(size)
+        pos = 0
+        while pos < size:
+            addr = address + pos
+            off  = addr % MODULE_SIZE_C
+            num  = min(size - pos, MODULE_SIZE_C - off)
+            page = self._page(addr // MODULE_SIZE_C)
+            self._render(addr - off, page)
+            ba[pos:pos+num] = page[off:off+num].tobytes()
+            pos += num
+        return ba
+
+    def _write(self, address, data):
+        pos = 0
+        while pos < len(data):
+            addr = address + pos
+            off  = addr % MODULE_SIZE_C
+            num  = min(len(data) - pos, MODULE_SIZE_C - off)
+            page = self._page(addr // MODULE_SIZE_C)
+            page[off:off+num] = data[pos:pos+num]
+            self._commit(addr - off, off, num, page)
+            pos += num
+
+    def _module(self, base):
+        """Returns the link index (0-3), 4 for the combiner or None"""
+        off = base - self._appBase
+        if off < 0 or (off % 0x10000000) != 0:
+            return None
+        idx = off // 0x10000000
+        return idx if idx <= 4 else None
+
+    ########################################################################
+    # Behavioural model
+    ########################################################################
+
+    def _advance(self, now):
+        dt = max(now - self._tLast, 0.0)
+        self._tLast = now
+
+        for model in self._links:
+            if not model.linkUp:
+                # Combiner drops a message for each local timing strobe
+                # Whole drops only: transactions may come faster than the strobes
+                self._dropAcc[model.index] += dt * self._pktRate
+                drops = int(self._dropAcc[model.index])
+                self._dropAcc[model.index] -= drops
+                self._dropCnt[model.index] += np.uint32(drops)
+            elif self._errRate > 0.0:
+                model.addCount(ERROR_CNT_C, self._rng.poisson(self._errRate*dt, len(ERROR_CNT_C)))
+
+    def _render(self, base, page):
+        idx = self._module(base)
+        if idx is None:
+            return
+
+        now   = self._tLast
+        tMsg  = np.floor(now * self._pktRate) / self._pktRate
+        words = page.view(np.uint32)
+
+        if idx < 4:
+            model = self._links[idx]
+            up    = 1 if model.linkUp else 0
+            rate  = int(self._pktRate) if model.linkUp else 0
+            words[0x000>>2:0x028>>2] = model.cnt.astype(np.uint32)
+            words[0x400>>2]          = up | (1 << 8)
+            words[0x404>>2]          = 0
+            words[0x410>>2]          = rate
+            words[0x414>>2]          = rate
+            words[0x500>>2:0x510>>2] = [0xCAFE0000 | idx, 0x0, 0x0, 0x0]
+            words[0x700>>2]          = model.rxPolarity
+            words[0x704>>2]          = model.txPolarity
+            words[0x708>>2]          = model.loopback
+            words[0x7F0>>2]          = model.rollOverEn
+            words[0x7F4>>2:0x800>>2] = 0
+
+            if model.linkUp:
+                words[0x800>>2:0x830>>2] = model.bsaQuantity(tMsg)
+                words[0x840>>2:0x870>>2] = 0
+                words[0x900>>2]          = model.permit
+                page[0x910:0x918].view(np.uint64)[0] = _timeStamp(tMsg)
+            else:
+                words[0x800>>2:0x830>>2] = 0
+                words[0x840>>2:0x870>>2] = 0
+                words[0x900>>2]          = 0
+                page[0x910:0x918].view(np.uint64)[0] = 0
+
+        else:
+            msg = np.zeros((1,4), dtype=llrf.MSG_DTYPE)
+            for model in self._links:
+                msg['bsaQuantity'][0,model.index] = model.bsaQuantity(tMsg)
+                msg['mpsPermit'][0,model.index]   = [(model.permit >> (2*j)) & 0x3 for j in range(4)]
+            aligned    = np.array([[model.linkUp for model in self._links]])
+            data, sevr = llrf.combineMsg(msg, aligned)
+            data, sevr = data[0], sevr[0]
+            words[0x000>>2:0x080>>2] = data
+            words[0x080>>2:0x100>>2] = sevr
+            words[0x100>>2:0x140>>2:4] = self._dropCnt
+            for model in self._links:
+                stamp = _timeStamp(tMsg) if model.linkUp else 0
+                page[0x200+16*model.index:0x208+16*model.index].view(np.uint64)[0] = stamp
+            page[0x240:0x248].view(np.uint64)[0] = _timeStamp(tMsg)
+            words[0x300>>2] = int(self._pktRate)
+            words[0xFFC>>2] = 0
+
+    def _commit(self, base, off, num, page):
+        idx = self._module(base)
+        if idx is None:
+            return
+
+        words = page.view(np.uint32)
+        for reg in range(off & ~0x3, off + num, 4):
+            value = int(words[reg>>2])
+
+            if idx < 4:
+                model = self._links[idx]
+                if   reg == 0x700: model.rxPolarity = value & 0x1
+                elif reg == 0x704: model.txPolarity = value & 0x1
+                elif reg == 0x708: model.loopback   = value & 0x1
+                elif reg == 0x7F0: model.rollOverEn = value & 0x3FF
+                elif reg == 0x7F4 and (value & 0x1): model.countReset()
+                elif reg == 0x7F8 and (value & 0x1): model.addCount([RX_LINK_UP_C],[1])
+                elif reg == 0x7FC and (value & 0x1): model.hardReset()
+
+            elif reg == 0xFFC and (value & 0x1):
+                self._dropCnt[:] = 0
+                self._dropAcc[:] = 0.0
@@ -0,0 +1,245 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Software reference of the BsaMpsMsgRxFramer.vhd state machine.
+#
+# Frame format (16-bit words, rxdataK per byte):
+#
+#    word  0     : SOF = x"01" & K28.5           (rxdataK = "01")
+#    word  1:8   : userValue(127:0), LSW first
+#    word  9:12  : timeStamp(63:0),  LSW first
+#    word 13     : mpsPermit(1:0)  & bsaSevr(5:0)
+#    word 14     : mpsPermit(3:2)  & bsaSevr(11:6)
+#    word 15:38  : bsaQuantity(11:0), LSW first
+#    word 39:40  : CRC32 over words 0 to 38, LSW first
+#    word 41     : IDLE = K28.2 & K28.1           (rxdataK = "11")
+#
+# Any word in 1:40 that is not valid data aborts the frame (ErrPktLenCnt)
+# and is consumed. A frame whose word 41 is not IDLE is a length error,
+# otherwise the CRC is checked (ErrCrcCnt) and the message is written to
+# the FIFO. SOF characters are counted anywhere in the stream (SofRate).
+##############################################################################
+
+import numpy as np
+
+import lcls2_llrf as llrf
+
+K28_5_C = 0xBC
+K28_1_C = 0x3C
+K28_2_C = 0x5C
+SOF_C   = (0x01 << 8) | K28_5_C
+IDLE_C  = (K28_2_C << 8) | K28_1_C
+
+FRAME_WORDS_C = 42
+CRC_WORDS_C   = 39
+
+# Frame status
+FRAME_OK_C      = 0
+FRAME_ERR_CRC_C = 1
+FRAME_ERR_LEN_C = 2
+
+FRAME_DTYPE = np.dtype([
+    ('index',     '<i8'),         # Word index of the SOF in the stream
+    ('status',    'u1'),          # FRAME_OK_C, FRAME_ERR_CRC_C or FRAME_ERR_LEN_C
+    ('length',    '<u2'),         # Number of words consumed by the state machine
+    ('userValue', '<u2', (8,)),
+    ('crc',       '<u4'),         # CRC received in the frame
+    ('crcCalc',   '<u4'),         # CRC computed over the frame
+])
+
+def _crcTable():
+    table = np.arange(256, dtype=np.uint32)
+    for _ in range(8):
+        table = np.where(table & 0x1, (table >> 1) ^ np.uint32(0xEDB88320), table >> 1).astype(np.uint32)
+    return table
+
+_CRC_TABLE_C = _crcTable()
+
+def crc32(words):
+    """
+    CRC-32 (IEEE 802.3, as surf.Crc32Parallel) of each row of a 2-D array
+    of 16-bit words. The two bytes of a word are fed MSB first, as the
+    engine is driven with crcDataWidth = 2 bytes. Rows are processed in
+    parallel, one table lookup per byte column.
+    """
+    words = np.atleast_2d(np.asarray(words, dtype=np.uint16))
+    crc   = np.full(words.shape[0], 0xFFFFFFFF, dtype=np.uint32)
+    for col in range(words.shape[1]):
+        word = words[:,col].astype(np.uint32)
+        crc  = _CRC_TABLE_C[(crc ^ (word >> 8)) & 0xFF] ^ (crc >> 8)
+        crc  = _CRC_TABLE_C[(crc ^ word) & 0xFF] ^ (crc >> 8)
+    return crc ^ np.uint32(0xFFFFFFFF)
+
+def wordsToMsg(words):
+    """Build MSG_DTYPE messages from (N,42) (or (N,39)) frame words"""
+    words = words.astype(np.uint64)
+    msg   = np.zeros(words.shape[0], dtype=llrf.MSG_DTYPE)
+
+    msg['timeStamp'] = words[:,9] | (words[:,10] << 16) | (words[:,11] << 32) | (words[:,12] << 48)
+
+    shift = np.arange(6, dtype=np.uint64)*2 + 4
+    msg['mpsPermit'][:,0:2] = (words[:,13,np.newaxis] >> np.array([0,2],dtype=np.uint64)) & 0x3
+    msg['mpsPermit'][:,2:4] = (words[:,14,np.newaxis] >> np.array([0,2],dtype=np.uint64)) & 0x3
+    msg['bsaSevr'][:,0:6]   = (words[:,13,np.newaxis] >> shift) & 0x3
+    msg['bsaSevr'][:,6:12]  = (words[:,14,np.newaxis] >> shift) & 0x3
+
+    msg['bsaQuantity'] = words[:,15:39:2] | (words[:,16:39:2] << 16)
+
+    return msg
+
+class BsaMpsMsgRxFramer(object):
+    """
+    Bulk deframer of captured 16-bit word streams.
+
+    process() can be called repeatedly on consecutive chunks of a capture;
+    a frame that runs past the end of a chunk is completed with the next
+    one. The counters follow the firmware status counters:
+
+        SofCnt       : SOF characters seen (SofRate)
+        PacketCnt    : frames written to the message FIFO (PacketRate)
+        ErrPktLenCnt : frames aborted or missing the IDLE
+        ErrCrcCnt    : frames with a CRC mismatch
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._data   = np.zeros(0, dtype=np.uint16)
+        self._dataK  = np.zeros(0, dtype=np.uint8)
+        self._good   = np.zeros(0, dtype=bool)
+        self._offset = 0
+        self.counters = {
+            'SofCnt'       : 0,
+            'PacketCnt'    : 0,
+            'ErrPktLenCnt' : 0,
+            'ErrCrcCnt'    : 0,
+        }
+
+    def process(self, data, dataK, valid=None, decErr=None, dispErr=None):
+        """
+        Deframe a chunk of the word stream.
+
+        data    : uint16 array of rxData
+        dataK   : 2-bit rxdataK per word
+        valid   : optional rxValid per word
+        decErr  : optional 2-bit rxDecErr per word
+        dispErr : optional 2-bit rxDispErr per word
+
+        Returns (frames, msg): a FRAME_DTYPE array with one entry per frame
+        the state machine entered, and the MSG_DTYPE messages decoded from
+        them (zeros for the length errors).
+        """
+        data  = np.asarray(data,  dtype=np.uint16)
+        dataK = np.asarray(dataK, dtype=np.uint8) & 0x3
+
+        # Word validity as registered by the framer
+        good = np.ones(len(data), dtype=bool) if valid is None else np.asarray(valid, dtype=bool).copy()
+        if decErr is not None:
+            good &= (np.asarray(decErr) & 0x3) == 0
+        if dispErr is not None:
+            good &= (np.asarray(dispErr) & 0x3) == 0
+
+        # SOF monitor is independent of the state machine (new words only)
+        self.counters['SofCnt'] += int(np.count_nonzero(good & (dataK == 0x1) & ((data & 0xFF) == K28_5_C)))
+
+        # Prepend the words of an unfinished frame from the previous chunk
+        data  = np.concatenate((self._data, data))
+        dataK = np.concatenate((self._dataK, dataK))
+        good  = np.concatenate((self._good, good))
+        num   = len(data)
+
+        isData = good & (dataK == 0x0)
+        isSof  = good & (dataK == 0x1) & (data == SOF_C)
+        isIdle = good & (dataK == 0x3) & (data == IDLE_C)
+
+        # First non-data word after each SOF candidate
+        cand     = np.flatnonzero(isSof)
+        bad      = np.append(np.flatnonzero(~isData), num)
+        firstBad = bad[np.searchsorted(bad, cand + 1)]
+
+        # Word index where the state machine returns to IDLE for each candidate
+        aborted  = (firstBad < num) & (firstBad <= cand + (FRAME_WORDS_C - 2))
+        complete = ~aborted & (cand + FRAME_WORDS_C <= num)
+        pending  = ~aborted & ~complete
+        end      = np.where(aborted, firstBad + 1, cand + FRAME_WORDS_C)
+
+        # Follow the chain of frames (a SOF inside a frame is not seen)
+        nxt  = np.searchsorted(cand, end)
+        sel  = []
+        idx  = 0
+        while idx < len(cand):
+            sel.append(idx)
+            if pending[idx]:
+                break
+            idx = nxt[idx]
+        sel = np.array(sel, dtype=np.int64)
+
+        # Keep an unfinished last frame for the next chunk
+        if len(sel) > 0 and pending[sel[-1]]:
+            keep = cand[sel[-1]]
+            sel  = sel[:-1]
+        else:
+            keep = num
+
+        self._data   = data[keep:]
+        self._dataK  = dataK[keep:]
+        self._good   = good[keep:]
+
+        start  = cand[sel]
+        frames = np.zeros(len(sel), dtype=FRAME_DTYPE)
+        msg    = np.zeros(len(sel), dtype=llrf.MSG_DTYPE)
+        frames['index']  = start + self._offset
+        frames['length'] = end[sel] - start
+        frames['status'] = FRAME_ERR_LEN_C
+
+        # Frames that reached LAST_S
+        last = np.flatnonzero(complete[sel])
+        if len(last) > 0:
+            pos   = start[last]
+            words = data[pos[:,np.newaxis] + np.arange(FRAME_WORDS_C)]
+
+            crcCalc = crc32(words[:,0:CRC_WORDS_C])
+            crcRx   = words[:,39].astype(np.uint32) | (words[:,40].astype(np.uint32) << 16)
+            idle    = isIdle[pos + FRAME_WORDS_C - 1]
+
+            frames['crc'][last]       = crcRx
+            frames['crcCalc'][last]   = crcCalc
+            frames['userValue'][last] = words[:,1:9]
+            frames['status'][last]    = np.where(~idle, FRAME_ERR_LEN_C, np.where(crcRx == crcCalc, FRAME_OK_C, FRAME_ERR_CRC_C))
+            msg[last] = wordsToMsg(words)
+
+        self._offset += keep
+
+        self.counters['PacketCnt']    += int(np.count_nonzero(frames['status'] == FRAME_OK_C))
+        self.counters['ErrCrcCnt']    += int(np.count_nonzero(frames['status'] == FRAME_ERR_CRC_C))
+        self.counters['ErrPktLenCnt'] += int(np.count_nonzero(frames['status'] == FRAME_ERR_LEN_C))
+
+        return frames, msg
+
+def deframe(data, dataK, chunkSize=1<<22, **kwargs):
+    """
+    Deframe a whole capture in chunks. Returns (frames, msg, counters).
+    Extra keyword arguments (valid, decErr, dispErr) are per-word arrays.
+    """
+    framer = BsaMpsMsgRxFramer()
+    frames = []
+    msgs   = []
+    for i in range(0, len(data), chunkSize):
+        sl  = slice(i, i+chunkSize)
+        arg = {k: np.asarray(v)[sl] for k,v in kwargs.items() if v is not None}
+        f,m = framer.process(data[sl], dataK[sl], **arg)
+        frames.append(f)
+        msgs.append(m)
+
+    if len(frames) == 0:
+        return np.zeros(0, dtype=FRAME_DTYPE), np.zeros(0, dtype=llrf.MSG_DTYPE), framer.counters
+
+    return np.concatenate(frames), np.concatenate(msgs), framer.counters
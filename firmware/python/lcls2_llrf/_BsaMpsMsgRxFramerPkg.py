@@ -0,0 +1,103 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Python equivalent of BsaMpsMsgRxFramerPkg.vhd: the 480-bit MsgType layout
+#
+#    dout(383 downto   0) = bsaQuantity(11 downto 0), 32 bits each
+#    dout(447 downto 384) = timeStamp
+#    dout(455 downto 448) = mpsPermit(3 downto 0),    2 bits each
+#    dout(479 downto 456) = bsaSevr(11 downto 0),     2 bits each
+#
+# A message is stored as 60 bytes, little-endian (slv bit N is bit N%8 of
+# byte N/8). fromSlv()/toSlv() work on whole arrays of messages at once.
+##############################################################################
+
+import numpy as np
+
+RX_MSG_FIFO_WIDTH_C = 480
+MSG_BYTES_C         = RX_MSG_FIFO_WIDTH_C // 8
+
+# Raw 480-bit message, fields that are byte aligned map straight onto the buffer
+MSG_RAW_DTYPE = np.dtype({
+    'names'   : ['bsaQuantity', 'timeStamp', 'mpsSevr'],
+    'formats' : [('<u4',12),    '<u8',       '<u4'],
+    'offsets' : [0,             48,          56],
+    'itemsize': MSG_BYTES_C,
+})
+
+# Decoded MsgType record
+MSG_DTYPE = np.dtype([
+    ('bsaQuantity', '<u4', (12,)),
+    ('timeStamp',   '<u8'),
+    ('mpsPermit',   'u1',  (4,)),
+    ('bsaSevr',     'u1',  (12,)),
+])
+
+_PERMIT_SHIFT_C = np.arange(4,  dtype=np.uint32) * 2
+_SEVR_SHIFT_C   = np.arange(12, dtype=np.uint32) * 2 + 8
+
+def msgView(buf, stride=MSG_BYTES_C, offset=0):
+    """
+    Zero-copy view of a buffer of raw 480-bit messages as MSG_RAW_DTYPE.
+
+    stride is the distance in bytes between messages, which lets captures
+    with padded records (e.g. 64 bytes per message) be viewed in place.
+    """
+    if isinstance(buf, int):
+        buf = buf.to_bytes(MSG_BYTES_C, 'little')
+
+    data = np.frombuffer(buf, dtype=np.uint8)[offset:]
+    num  = (len(data) - MSG_BYTES_C) // stride + 1 if len(data) >= MSG_BYTES_C else 0
+
+    if stride == MSG_BYTES_C:
+        return data[:num*MSG_BYTES_C].view(MSG_RAW_DTYPE)
+    else:
+        return np.ndarray(shape=(num,), dtype=MSG_RAW_DTYPE, buffer=data, strides=(stride,))
+
+def fromSlv(buf, stride=MSG_BYTES_C, offset=0):
+    """
+    Decode raw 480-bit messages into a MSG_DTYPE array.
+
+    buf can be a bytes-like object, a NumPy array, a MSG_RAW_DTYPE array
+    or a single 480-bit integer.
+    """
+    raw = buf if (isinstance(buf, np.ndarray) and buf.dtype == MSG_RAW_DTYPE) else msgView(buf, stride, offset)
+    msg = np.empty(raw.shape, dtype=MSG_DTYPE)
+
+    msg['bsaQuantity'] = raw['bsaQuantity']
+    msg['timeStamp']   = raw['timeStamp']
+
+    word = raw['mpsSevr'][...,np.newaxis]
+    msg['mpsPermit'] = (word >> _PERMIT_SHIFT_C) & 0x3
+    msg['bsaSevr']   = (word >> _SEVR_SHIFT_C)   & 0x3
+
+    return msg
+
+def toSlv(msg, out=None):
+    """
+    Encode a MSG_DTYPE array into raw 480-bit messages (MSG_RAW_DTYPE).
+
+    Use .tobytes() on the result for a contiguous byte stream.
+    """
+    msg = np.asarray(msg, dtype=MSG_DTYPE)
+    raw = np.zeros(msg.shape, dtype=MSG_RAW_DTYPE) if out is None else out
+
+    raw['bsaQuantity'] = msg['bsaQuantity']
+    raw['timeStamp']   = msg['timeStamp']
+
+    permit = (msg['mpsPermit'].astype(np.uint32) & 0x3) << _PERMIT_SHIFT_C
+    sevr   = (msg['bsaSevr'].astype(np.uint32)   & 0x3) << _SEVR_SHIFT_C
+    raw['mpsSevr'] = np.bitwise_or.reduce(permit, axis=-1) | np.bitwise_or.reduce(sevr, axis=-1)
+
+    return raw
+
+def msgToInt(msg):
+    """Returns a single MSG_DTYPE record as the 480-bit integer (slv) value"""
+    return int.from_bytes(toSlv(np.asarray(msg).reshape(1)).tobytes(), 'little')
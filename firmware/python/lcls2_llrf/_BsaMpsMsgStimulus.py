@@ -0,0 +1,206 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Link traffic generator for the BsaMpsMsgGtx7Tb / BsaMpsMsgRxCombineTb
+# simulations. Frames follow the BsaMpsMsgRxFramer format (see
+# _BsaMpsMsgRxFramerModel.py), separated by IDLE commas, and are built
+# for all the messages at once.
+##############################################################################
+
+import numpy as np
+
+import lcls2_llrf as llrf
+
+# Injected faults
+FAULT_NONE_C = 0
+FAULT_CRC_C  = 1 # CRC word corrupted    -> ErrCrcCnt
+FAULT_LEN_C  = 2 # Frame cut or no IDLE  -> ErrPktLenCnt
+FAULT_DROP_C = 3 # Frame not sent (IDLE) -> RemoteDropCnt in the combiner
+
+STIMULUS_DTYPE = np.dtype([
+    ('index',     '<i8'),         # Word index of the SOF (or of the dropped slot)
+    ('fault',     'u1'),          # FAULT_*_C
+    ('userValue', '<u2', (8,)),
+])
+
+def encodeFrames(msg, userValue=None):
+    """
+    Encode MSG_DTYPE messages into frames.
+    Returns (data, dataK), both of shape (N,42).
+    """
+    msg   = np.asarray(msg, dtype=llrf.MSG_DTYPE).reshape(-1)
+    num   = len(msg)
+    data  = np.zeros((num, llrf.FRAME_WORDS_C), dtype=np.uint16)
+    dataK = np.zeros((num, llrf.FRAME_WORDS_C), dtype=np.uint8)
+
+    data[:,0]  = llrf.SOF_C
+    dataK[:,0] = 0x1
+
+    if userValue is not None:
+        data[:,1:9] = np.asarray(userValue, dtype=np.uint16).reshape(num, 8)
+
+    ts = msg['timeStamp'].astype(np.uint64)
+    for i in range(4):
+        data[:,9+i] = (ts >> np.uint64(16*i)) & np.uint64(0xFFFF)
+
+    permit = msg['mpsPermit'].astype(np.uint16) & 0x3
+    sevr   = msg['bsaSevr'].astype(np.uint16) & 0x3
+    shift  = np.arange(6, dtype=np.uint16)*2 + 4
+    data[:,13] = permit[:,0] | (permit[:,1] << 2) | np.bitwise_or.reduce(sevr[:,0:6]  << shift, axis=1)
+    data[:,14] = permit[:,2] | (permit[:,3] << 2) | np.bitwise_or.reduce(sevr[:,6:12] << shift, axis=1)
+
+    quantity = msg['bsaQuantity'].astype(np.uint32)
+    data[:,15:39:2] = quantity & 0xFFFF
+    data[:,16:39:2] = quantity >> 16
+
+    crc = llrf.crc32(data[:,0:llrf.CRC_WORDS_C])
+    data[:,39] = crc & 0xFFFF
+    data[:,40] = crc >> 16
+
+    data[:,41]  = llrf.IDLE_C
+    dataK[:,41] = 0x3
+
+    return data, dataK
+
+def generateMsg(num, msgRate=1.0e6, t0=0.0, sevrProb=0.0, permitProb=1.0, seed=None):
+    """
+    Generate num MSG_DTYPE messages at msgRate (units of Hz) starting at t0
+    (units of seconds). Each bsaSevr is non-zero with probability sevrProb
+    and each mpsPermit is 0x3 with probability permitProb (else 0x0).
+    """
+    rng = np.random.default_rng(seed)
+    msg = np.zeros(num, dtype=llrf.MSG_DTYPE)
+
+    # Timing format: seconds in the upper 32 bits, nanoseconds in the lower
+    t    = t0 + np.arange(num, dtype=np.float64) / msgRate
+    sec  = np.floor(t).astype(np.uint64)
+    nsec = np.round((t - np.floor(t)) * 1e9).astype(np.uint64) % np.uint64(1000000000)
+    msg['timeStamp'] = (sec << np.uint64(32)) | nsec
+
+    # Slowly rotating I/Q pairs with some noise
+    phase = rng.uniform(0.0, 2.0*np.pi, 6)
+    wave  = np.sin(2.0*np.pi*1.0e3*t[:,np.newaxis] + phase)
+    iq    = np.empty((num, 12), dtype=np.float64)
+    iq[:,0::2] = wave
+    iq[:,1::2] = np.cos(np.arcsin(wave))
+    iq   += rng.normal(0.0, 1e-3, iq.shape)
+    msg['bsaQuantity'] = (np.clip(iq, -1.0, 1.0) * 0x3FFFFFFF).astype(np.int64) & 0xFFFFFFFF
+
+    msg['bsaSevr']   = np.where(rng.random((num, 12)) < sevrProb, rng.integers(1, 4, (num, 12)), 0)
+    msg['mpsPermit'] = np.where(rng.random((num, 4)) < permitProb, 0x3, 0x0)
+
+    return msg
+
+def generateStream(msg, wordRate=185.714286e6, msgRate=1.0e6, crcErrRate=0.0, lenErrRate=0.0, dropRate=0.0, seed=None):
+    """
+    Build the word stream of a batch of messages: one frame per message
+    followed by IDLE commas to fill the msgRate period at wordRate (16-bit
+    words per second, 185.7 MHz for the 3.714 Gb/s 8B/10B link). Faults
+    are injected per frame with the given probabilities.
+
+    Returns (data, dataK, stim): uint16 words, 2-bit K flags and a
+    STIMULUS_DTYPE record per message with the injected fault.
+    """
+    rng  = np.random.default_rng(seed)
+    msg  = np.asarray(msg, dtype=llrf.MSG_DTYPE).reshape(-1)
+    num  = len(msg)
+    slot = max(int(round(wordRate / msgRate)), llrf.FRAME_WORDS_C + 1)
+
+    userValue = rng.integers(0, 1<<16, (num, 8), dtype=np.uint16)
+    data, dataK = encodeFrames(msg, userValue)
+
+    # Faults (mutually exclusive, drop first)
+    r     = rng.random(num)
+    fault = np.full(num, FAULT_NONE_C, dtype=np.uint8)
+    fault[r < crcErrRate + lenErrRate + dropRate] = FAULT_CRC_C
+    fault[r < lenErrRate + dropRate]              = FAULT_LEN_C
+    fault[r < dropRate]                           = FAULT_DROP_C
+
+    crc = np.flatnonzero(fault == FAULT_CRC_C)
+    data[crc, 39] ^= (1 << rng.integers(0, 16, len(crc))).astype(np.uint16)
+
+    # An IDLE inside the frame aborts it, data in place of the last IDLE
+    # is a missing IDLE; both are length errors
+    cut  = np.flatnonzero(fault == FAULT_LEN_C)
+    pos  = rng.integers(1, llrf.FRAME_WORDS_C, len(cut))
+    last = pos == llrf.FRAME_WORDS_C - 1
+    data[cut, pos]  = np.where(last, rng.integers(0, 1<<16, len(cut)), llrf.IDLE_C).astype(np.uint16)
+    dataK[cut, pos] = np.where(last, 0x0, 0x3)
+
+    drop = np.flatnonzero(fault == FAULT_DROP_C)
+    data[drop]  = llrf.IDLE_C
+    dataK[drop] = 0x3
+
+    # Frames followed by the IDLE gap
+    stream  = np.full((num, slot), llrf.IDLE_C, dtype=np.uint16)
+    streamK = np.full((num, slot), 0x3, dtype=np.uint8)
+    stream[:,0:llrf.FRAME_WORDS_C]  = data
+    streamK[:,0:llrf.FRAME_WORDS_C] = dataK
+
+    stim = np.zeros(num, dtype=STIMULUS_DTYPE)
+    stim['index']     = np.arange(num, dtype=np.int64) * slot
+    stim['fault']     = fault
+    stim['userValue'] = userValue
+
+    return stream.reshape(-1), streamK.reshape(-1), stim
+
+def expectedCounters(stim):
+    """Framer status counter increments expected for a generated stream"""
+    fault = stim['fault']
+    return {
+        'SofCnt'       : int(np.count_nonzero(fault != FAULT_DROP_C)),
+        'PacketCnt'    : int(np.count_nonzero(fault == FAULT_NONE_C)),
+        'ErrPktLenCnt' : int(np.count_nonzero(fault == FAULT_LEN_C)),
+        'ErrCrcCnt'    : int(np.count_nonzero(fault == FAULT_CRC_C)),
+    }
+
+def writeStimulus(path, data, dataK, fmt='text'):
+    """
+    Write a word stream as a stimulus file.
+
+    fmt = 'text' : one "<K> <DATA>" line per word in hex (e.g. "1 01BC"),
+                   for VHDL textio readers
+    fmt = 'npy'  : NumPy structured array with 'data' and 'dataK' fields
+    """
+    data  = np.asarray(data,  dtype=np.uint16)
+    dataK = np.asarray(dataK, dtype=np.uint8)
+
+    if fmt == 'npy':
+        out = np.empty(len(data), dtype=[('data', '<u2'), ('dataK', 'u1')])
+        out['data']  = data
+        out['dataK'] = dataK
+        np.save(path, out)
+
+    elif fmt == 'text':
+        # Build all the lines at once: "K DDDD\n" = 7 bytes per word
+        hexChars = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)
+        lines = np.empty((len(data), 7), dtype=np.uint8)
+        lines[:,0] = hexChars[dataK & 0x3]
+        lines[:,1] = ord(' ')
+        for i in range(4):
+            lines[:,2+i] = hexChars[(data >> (12 - 4*i)) & 0xF]
+        lines[:,6] = ord('\n')
+        with open(path, 'wb') as f:
+            f.write(lines.tobytes())
+
+    else:
+        raise ValueError(f'Unknown stimulus format "{fmt}"')
+
+def readStimulus(path):
+    """Read back a stimulus file written by writeStimulus(), returns (data, dataK)"""
+    if path.endswith('.npy'):
+        arr = np.load(path)
+        return arr['data'], arr['dataK']
+
+    raw   = np.fromfile(path, dtype=np.uint8).reshape(-1, 7)
+    nib   = lambda c: np.where(c >= ord('A'), c - ord('A') + 10, c - ord('0')).astype(np.uint16)
+    dataK = nib(raw[:,0]).astype(np.uint8)
+    data  = (nib(raw[:,2]) << 12) | (nib(raw[:,3]) << 8) | (nib(raw[:,4]) << 4) | nib(raw[:,5])
+    return data, dataK
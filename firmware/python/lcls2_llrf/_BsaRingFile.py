@@ -0,0 +1,235 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Memory-mapped ring file of BSA/MPS records.
+#
+#    bytes 0:63  : RING_HEADER_DTYPE
+#    bytes 64:   : capacity x RING_RECORD_DTYPE
+#
+# writeIndex is the total number of records ever written; record n is at
+# slot n % capacity. The writer fills the record before it advances
+# writeIndex, and the next slot it fills holds the oldest record (n =
+# writeIndex - capacity). A reader therefore copies only the records from
+# writeIndex - capacity + 1, then checks writeIndex again and drops those
+# the writer may have reached during the copy: the records it returns are
+# never partial.
+##############################################################################
+
+import os
+import glob
+import time
+
+import numpy as np
+
+import lcls2_llrf as llrf
+
+RING_MAGIC_C   = b'LLRFBSA1'
+RING_VERSION_C = 1
+RING_HEADER_C  = 64
+
+RING_HEADER_DTYPE = np.dtype({
+    'names'   : ['magic', 'version', 'recordSize', 'capacity', 'writeIndex', 'chunkSize'],
+    'formats' : ['S8',    '<u4',     '<u4',        '<u8',      '<u8',        '<u8'],
+    'offsets' : [0,       8,         12,           16,         24,           32],
+    'itemsize': RING_HEADER_C,
+})
+
+RING_RECORD_DTYPE = np.dtype([
+    ('time',            '<f8'),         # Host time of the read (units of seconds)
+    ('localTimestamp',  '<u8'),
+    ('remoteTimestamp', '<u8', (4,)),
+    ('bsaData',         '<u4', (32,)),
+    ('bsaSevr',         'u1',  (32,)),
+    ('mpsPermit',       'u1',  (4,)),
+    ('remoteDropCnt',   '<u4', (4,)),
+])
+
+class BsaRingWriter(object):
+    """
+    Appends RING_RECORD_DTYPE records to a pre-allocated ring file.
+
+    When chunkDir is set, every chunkSize records are also saved to a
+    compressed .npz chunk file, so the history outlives the ring.
+    """
+
+    def __init__(self, path, capacity=1<<20, chunkDir=None, chunkSize=1<<16):
+        if chunkDir is not None and chunkSize > capacity:
+            raise ValueError(f'chunkSize ({chunkSize}) must not exceed the ring capacity ({capacity})')
+
+        self._path     = path
+        self._chunkDir = chunkDir
+        size = RING_HEADER_C + capacity * RING_RECORD_DTYPE.itemsize
+
+        # Re-open an existing ring of the same geometry, otherwise start a new one
+        resume = os.path.exists(path) and os.path.getsize(path) == size
+        if resume:
+            header = np.memmap(path, dtype=RING_HEADER_DTYPE, mode='r', shape=(1,))[0]
+            resume = (header['magic'] == RING_MAGIC_C and
+                      header['recordSize'] == RING_RECORD_DTYPE.itemsize and
+                      header['capacity'] == capacity)
+
+        if not resume:
+            with open(path, 'wb') as f:
+                f.truncate(size)
+
+        self._header = np.memmap(path, dtype=RING_HEADER_DTYPE, mode='r+', shape=(1,))
+        self._ring   = np.memmap(path, dtype=RING_RECORD_DTYPE, mode='r+', offset=RING_HEADER_C, shape=(capacity,))
+
+        if not resume:
+            self._header['magic']      = RING_MAGIC_C
+            self._header['version']    = RING_VERSION_C
+            self._header['recordSize'] = RING_RECORD_DTYPE.itemsize
+            self._header['capacity']   = capacity
+            self._header['writeIndex'] = 0
+        self._header['chunkSize'] = chunkSize if chunkDir is not None else 0
+
+        self.capacity  = capacity
+        self.chunkSize = chunkSize
+
+        if chunkDir is not None:
+            os.makedirs(chunkDir, exist_ok=True)
+
+    @property
+    def writeIndex(self):
+        return int(self._header['writeIndex'][0])
+
+    def append(self, rec):
+        """Append one record (a RING_RECORD_DTYPE scalar or a dictionary of its fields)"""
+        idx = self.writeIndex
+
+        if isinstance(rec, dict):
+            slot = self._ring[idx % self.capacity]
+            for k in RING_RECORD_DTYPE.names:
+                slot[k] = rec.get(k, 0)
+        else:
+            self._ring[idx % self.capacity] = rec
+
+        # Publish the record only once it is complete
+        self._header['writeIndex'] = idx + 1
+
+        if self._chunkDir is not None and (idx + 1) % self.chunkSize == 0:
+            self._saveChunk(idx + 1 - self.chunkSize)
+
+    def _saveChunk(self, first):
+        start = first % self.capacity
+        end   = start + self.chunkSize
+
+        # A chunk crossing the end of the ring is saved from both pieces
+        if end <= self.capacity:
+            data = self._ring[start:end]
+        else:
+            data = np.concatenate([self._ring[start:], self._ring[:end - self.capacity]])
+
+        name = os.path.join(self._chunkDir, f'{os.path.basename(self._path)}.{first:016d}.npz')
+        np.savez_compressed(name, records=data, first=first)
+
+    def flush(self):
+        self._ring.flush()
+        self._header.flush()
+
+    def close(self):
+        self.flush()
+        del self._ring
+        del self._header
+
+class BsaRingReader(object):
+    """
+    Read-only access to a ring file written by BsaRingWriter, from any process.
+
+    read() returns a copy of the records: views of the mapped file would
+    keep changing as the writer goes round the ring.
+    """
+
+    def __init__(self, path):
+        self._header = np.memmap(path, dtype=RING_HEADER_DTYPE, mode='r', shape=(1,))
+        header = self._header[0]
+
+        if header['magic'] != RING_MAGIC_C:
+            raise ValueError(f'{path} is not a BSA ring file')
+        if header['recordSize'] != RING_RECORD_DTYPE.itemsize:
+            raise ValueError(f'{path} record size {header["recordSize"]} does not match {RING_RECORD_DTYPE.itemsize}')
+
+        self.capacity = int(header['capacity'])
+        self._ring    = np.memmap(path, dtype=RING_RECORD_DTYPE, mode='r', offset=RING_HEADER_C, shape=(self.capacity,))
+
+    @property
+    def writeIndex(self):
+        return int(self._header['writeIndex'][0])
+
+    def read(self, since=0):
+        """
+        Returns (records, next): a copy of the records written from index
+        'since', and the index to pass on the next call. Records already
+        overwritten, or overwritten while they were copied, are skipped.
+        """
+        end   = self.writeIndex
+        start = max(since, end - self.capacity + 1)
+        if start >= end:
+            return np.zeros(0, dtype=RING_RECORD_DTYPE), end
+
+        lo = start % self.capacity
+        hi = lo + (end - start)
+        if hi <= self.capacity:
+            rec = np.array(self._ring[lo:hi])
+        else:
+            rec = np.concatenate([self._ring[lo:], self._ring[:hi - self.capacity]])
+
+        # The writer may have gone past the first records during the copy
+        first = self.writeIndex - self.capacity + 1
+        if first > start:
+            rec = rec[min(first - start, len(rec)):]
+
+        return rec, end
+
+    def latest(self, num=1):
+        """Returns a copy of the last num records (at most capacity - 1)"""
+        rec, _ = self.read(self.writeIndex - num)
+        return rec
+
+def readChunks(chunkDir, pattern='*.npz'):
+    """Load and concatenate the compressed chunk files of a ring, in record order"""
+    files = sorted(glob.glob(os.path.join(chunkDir, pattern)))
+    if len(files) == 0:
+        return np.zeros(0, dtype=RING_RECORD_DTYPE)
+    return np.concatenate([np.load(f)['records'] for f in files])
+
+def readBsaRecord(app, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+    """
+    Read the combiner and the four core MpsPermit registers of an
+    Application as one pipelined batch and return a RING_RECORD_DTYPE record.
+    """
+    comb  = app.BsaMpsMsgRxCombine
+    cores = [app.BsaMpsMsgRxCore[i] for i in range(4)]
+    llrf.readPipelined([comb] + [core.MpsPermit for core in cores], maxInFlight=maxInFlight)
+
+    rec = np.zeros((), dtype=RING_RECORD_DTYPE)
+    rec['time']      = time.time()
+    rec['mpsPermit'] = [core.MpsPermit.value() for core in cores]
+    combineFields(comb, rec)
+
+    return rec
+
+def combineFields(comb, rec):
+    """
+    Fill the localTimestamp, remoteTimestamp, remoteDropCnt, bsaData and
+    bsaSevr fields of a record from the cached (last read) values of a
+    BsaMpsMsgRxCombine device.
+    """
+    rec['localTimestamp']  = comb.LocalTimestamp.value()
+    rec['remoteTimestamp'] = [comb.RemoteTimestamp[i].value() for i in range(4)]
+    rec['remoteDropCnt']   = [comb.RemoteDropCnt[i].value() for i in range(4)]
+
+    if hasattr(comb, 'BsaBlock'):
+        block = comb.BsaBlock.value()
+        rec['bsaData'] = block[0:32]
+        rec['bsaSevr'] = block[32:64] & 0x3
+    else:
+        rec['bsaData'] = [comb.BsaData[i].value() for i in range(32)]
+        rec['bsaSevr'] = [comb.BsaSevr[i].value() for i in range(32)]
@@ -0,0 +1,220 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Multi-resolution history of the BSA channels.
+#
+# Every resolution is a ring of fixed size of (bucket x channel) arrays
+# holding min, max, sum, sample count and worst severity. Bucket b covers
+# [b*resolution, (b+1)*resolution) and lives in slot b % capacity; a slot
+# is cleared when a newer bucket takes it over, so the memory never grows.
+##############################################################################
+
+import time
+import threading
+
+import numpy as np
+
+import lcls2_llrf as llrf
+
+# (resolution in seconds, number of buckets): 1 s for 1 h, 1 min for 1 day, 1 h for 30 days
+ROLLUP_RESOLUTIONS_C = ((1.0, 3600), (60.0, 1440), (3600.0, 720))
+
+# Channels of an Application: 4 x 12 core BsaQuantity, then the I and Q
+# halves of the 24 combiner BsaData slots that hold BSA data
+BSA_CHANNELS_C = ([f'BsaMpsMsgRxCore[{i}].BsaQuantity[{j}]' for i in range(4) for j in range(12)] +
+                  [f'BsaMpsMsgRxCombine.BsaData[{k}].{h}' for k in range(llrf.BSA_DATA_SLOTS_C) for h in 'IQ'])
+
+def rollupDtype(numChannels):
+    """Record of one bucket, as returned by BsaRollup.query()"""
+    return np.dtype([
+        ('time',  '<f8'),                  # Start of the bucket (units of seconds)
+        ('min',   '<f8', (numChannels,)),
+        ('max',   '<f8', (numChannels,)),
+        ('mean',  '<f8', (numChannels,)),
+        ('count', '<u4', (numChannels,)),
+        ('sevr',  'u1',  (numChannels,)), # Worst severity in the bucket
+    ])
+
+class _RollupLevel(object):
+    def __init__(self, resolution, capacity, numChannels):
+        self.resolution = float(resolution)
+        self.capacity   = int(capacity)
+        self.bucket     = np.full(self.capacity, -1, dtype=np.int64)
+        self.min        = np.zeros((self.capacity, numChannels), dtype=np.float64)
+        self.max        = np.zeros((self.capacity, numChannels), dtype=np.float64)
+        self.sum        = np.zeros((self.capacity, numChannels), dtype=np.float64)
+        self.count      = np.zeros((self.capacity, numChannels), dtype=np.uint32)
+        self.sevr       = np.zeros((self.capacity, numChannels), dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in [self.bucket, self.min, self.max, self.sum, self.count, self.sevr])
+
+    def add(self, times, values, sevr):
+        bucket = np.floor(times / self.resolution).astype(np.int64)
+
+        # Samples older than the ring can hold are dropped
+        keep = bucket > max(bucket.max(), self.bucket.max()) - self.capacity
+        if not np.all(keep):
+            bucket, values, sevr = bucket[keep], values[keep], sevr[keep]
+        if len(bucket) == 0:
+            return
+
+        slot = bucket % self.capacity
+
+        # Take over the slots of the new buckets (the last bucket of a slot wins)
+        newest = np.full(self.capacity, -1, dtype=np.int64)
+        np.maximum.at(newest, slot, bucket)
+        reset = np.flatnonzero(newest > self.bucket)
+        self.bucket[reset] = newest[reset]
+        self.min[reset]    = np.inf
+        self.max[reset]    = -np.inf
+        self.sum[reset]    = 0.0
+        self.count[reset]  = 0
+        self.sevr[reset]   = 0
+
+        # Samples of buckets already overwritten in their slot are dropped
+        live = self.bucket[slot] == bucket
+        slot, values, sevr = slot[live], values[live], sevr[live]
+
+        valid = np.isfinite(values)
+
+        # One sample per poll: plain row updates, much cheaper than ufunc.at
+        if len(slot) == 1:
+            i = slot[0]
+            self.min[i]    = np.fmin(self.min[i], values[0])
+            self.max[i]    = np.fmax(self.max[i], values[0])
+            self.sum[i]   += np.where(valid[0], values[0], 0.0)
+            self.count[i] += valid[0]
+            self.sevr[i]   = np.maximum(self.sevr[i], sevr[0])
+            return
+
+        np.fmin.at(self.min, slot, values)
+        np.fmax.at(self.max, slot, values)
+        np.add.at(self.sum,   slot, np.where(valid, values, 0.0))
+        np.add.at(self.count, slot, valid.astype(np.uint32))
+        np.maximum.at(self.sevr, slot, sevr)
+
+class BsaRollup(object):
+    """
+    Fixed-memory, multi-resolution min/max/mean/count/worst severity
+    history of numChannels channels. add() updates every channel at every
+    resolution in one vectorized step; query() returns the buckets of a
+    time range.
+    """
+
+    def __init__(self, numChannels=len(BSA_CHANNELS_C), resolutions=ROLLUP_RESOLUTIONS_C):
+        self.numChannels = int(numChannels)
+        self._levels     = {float(r): _RollupLevel(r, c, self.numChannels) for r,c in resolutions}
+        self._lock       = threading.Lock()
+
+    @property
+    def resolutions(self):
+        return sorted(self._levels)
+
+    @property
+    def nbytes(self):
+        """Memory used by the buckets (fixed at construction)"""
+        return sum(lvl.nbytes for lvl in self._levels.values())
+
+    def add(self, t, values, sevr=None):
+        """Add one sample per channel taken at time t (units of seconds)"""
+        self.addArray(
+            np.array([t], dtype=np.float64),
+            np.asarray(values, dtype=np.float64).reshape(1, self.numChannels),
+            None if sevr is None else np.asarray(sevr, dtype=np.uint8).reshape(1, self.numChannels),
+        )
+
+    def addArray(self, times, values, sevr=None):
+        """Add N samples per channel: times (N,), values and sevr (N, numChannels)"""
+        times  = np.asarray(times, dtype=np.float64).reshape(-1)
+        values = np.asarray(values, dtype=np.float64).reshape(len(times), self.numChannels)
+        if sevr is None:
+            sevr = np.zeros(values.shape, dtype=np.uint8)
+        else:
+            sevr = np.asarray(sevr, dtype=np.uint8).reshape(values.shape)
+
+        if len(times) == 0:
+            return
+
+        with self._lock:
+            for lvl in self._levels.values():
+                lvl.add(times, values, sevr)
+
+    def query(self, resolution, t0=None, t1=None, channels=None):
+        """
+        Returns the buckets of the given resolution that start in [t0, t1)
+        (None for no bound), oldest first, as a rollupDtype array (limited
+        to the channel indices in channels if given).
+        """
+        lvl = self._levels[float(resolution)]
+        ch  = np.arange(self.numChannels) if channels is None else np.asarray(channels)
+
+        with self._lock:
+            start = lvl.bucket * lvl.resolution
+            sel   = lvl.bucket >= 0
+            if t0 is not None:
+                sel &= start >= t0
+            if t1 is not None:
+                sel &= start < t1
+
+            idx = np.flatnonzero(sel)
+            idx = idx[np.argsort(lvl.bucket[idx])]
+
+            count = lvl.count[idx][:,ch]
+            ret   = np.zeros(len(idx), dtype=rollupDtype(len(ch)))
+            ret['time']  = start[idx]
+            ret['count'] = count
+            ret['sevr']  = lvl.sevr[idx][:,ch]
+            ret['min']   = np.where(count > 0, lvl.min[idx][:,ch], np.nan)
+            ret['max']   = np.where(count > 0, lvl.max[idx][:,ch], np.nan)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ret['mean'] = np.where(count > 0, lvl.sum[idx][:,ch] / count, np.nan)
+
+        return ret
+
+def bsaChannels(rec):
+    """
+    Channel values and severities of a SNAPSHOT_DTYPE record, in the
+    BSA_CHANNELS_C order. The core words are taken as signed integers, the
+    combiner words are split in their signed 16-bit halves, each with its
+    own severity bit.
+    """
+    data = rec['combine']['bsaData'][0:llrf.BSA_DATA_SLOTS_C]
+    sevr = rec['combine']['bsaSevr'][0:llrf.BSA_DATA_SLOTS_C]
+
+    values = np.concatenate([rec['core']['bsaQuantity'].reshape(-1).astype(np.uint32).view(np.int32),
+                             llrf.splitBsaData(data).T.reshape(-1)])
+    sevr   = np.concatenate([rec['core']['bsaSevr'].reshape(-1),
+                             np.stack([sevr & 0x1, (sevr >> 1) & 0x1]).T.reshape(-1)])
+    return values.astype(np.float64), sevr.astype(np.uint8)
+
+class BsaRollupServer(llrf.VarListenerServer):
+    """
+    Feeds a BsaRollup from the poll cycles of a Root: at the end of each
+    update group that touched the BSA values of the Application, they are
+    taken from the variable cache (no extra transactions) and added.
+    """
+
+    def __init__(self, *, root, app, rollup=None):
+        super().__init__(root=root, dev=app, names=['BsaQuantity', 'BsaData', 'BsaBlock'])
+        self._app   = app
+        self.rollup = BsaRollup() if rollup is None else rollup
+
+    def _update(self):
+        rec = np.zeros((), dtype=llrf.SNAPSHOT_DTYPE)
+        for i in range(4):
+            core = self._app.BsaMpsMsgRxCore[i]
+            rec['core'][i]['bsaQuantity'] = [core.BsaQuantity[j].value() for j in range(12)]
+            rec['core'][i]['bsaSevr']     = [core.BsaSevr[j].value() for j in range(12)]
+        llrf.combineFields(self._app.BsaMpsMsgRxCombine, rec['combine'])
+
+        values, sevr = bsaChannels(rec)
+        self.rollup.add(time.time(), values, sevr)
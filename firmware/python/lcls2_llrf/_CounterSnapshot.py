@@ -0,0 +1,137 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+import time
+import threading
+
+import numpy   as np
+import pyrogue as pr
+
+import lcls2_llrf as llrf
+
+# Status counters in register order (0x000:0x027), from the register map
+STATUS_CNT_C = [(r.name, r.description) for r in llrf.registerMap('BsaMpsMsgRxCore').span(0x000, 0x028)]
+
+class StatusCntVariable(pr.RemoteVariable):
+    """
+    RemoteVariable of the status counter span. onRead(values, time) is
+    called as soon as a read of its block completes, from the thread that
+    completed it, before the update reaches any listener.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.onRead = None
+
+    def _queueUpdate(self):
+        if self.onRead is not None:
+            self.onRead(self.get(read=False), time.time())
+        super()._queueUpdate()
+
+class CounterSnapshot(object):
+    """
+    Timestamped snapshot of the ten BsaMpsMsgRxCore status counters.
+
+    Every read of the StatusCnt block (polling, readPipelined, ...) is
+    loaded when it completes (StatusCntVariable), with the time of its
+    completion. update() reads the counter span with one raw transaction,
+    which the variable does not see, so each read is loaded exactly once.
+    Every new snapshot is compared with the previous one to give the
+    per-second increment rates and 64-bit totals. Counters with their
+    RollOverEn bit set wrap at 2^32 and are unwrapped; the others
+    saturate at 0xFFFFFFFF, and a value lower than the previous one is
+    taken as a counter reset. A wrapping counter cleared to 0 cannot be
+    told from a wrap: reset() must be called when the counters are
+    cleared (the core RstCnt/RstHard commands do it).
+    """
+
+    def __init__(self, core):
+        self._core      = core
+        self._size      = len(STATUS_CNT_C)
+        self._lock      = threading.Lock()
+        self._regs      = llrf.registerMap('BsaMpsMsgRxCore')
+        self.timestamp  = None
+        self.counts     = None
+        self.prevTime   = None
+        self.prevCounts = None
+        self.rate       = np.zeros(self._size, dtype=np.float64)
+        self.total      = np.zeros(self._size, dtype=np.uint64)
+        self.saturated  = np.zeros(self._size, dtype=bool)
+
+        # Refresh on every StatusCnt read (including polling)
+        core.StatusCnt.onRead = self._onRead
+
+    def update(self, read=True):
+        """
+        Read the counters (one raw transaction) and return the snapshot.
+        With read=False, returns the snapshot of the last StatusCnt read.
+        """
+        if read:
+            fields = llrf.rawReadFields(self._core, self._regs, self.names())
+            with self._lock:
+                self._load([fields[n] for n in self.names()], time.time())
+        return self
+
+    def reset(self):
+        """Clear the history, the next snapshot becomes the new reference"""
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self.timestamp  = None
+        self.counts     = None
+        self.prevTime   = None
+        self.prevCounts = None
+        self.rate[:]    = 0.0
+        self.total[:]   = 0
+
+    def _onRead(self, counts, timestamp):
+        with self._lock:
+            self._load(counts, timestamp)
+
+    def _load(self, counts, timestamp):
+        counts = np.asarray(counts, dtype=np.uint64)
+
+        if self.counts is not None:
+            rollOver = (int(self._core.RollOverEn.value()) >> np.arange(self._size)) & 0x1
+            dt       = timestamp - self.timestamp
+
+            # Wrapping counters: modulo 2^32 difference
+            wrap  = (counts - self.counts) & np.uint64(0xFFFFFFFF)
+
+            # Saturating counters: a decrease means the counters were reset
+            sat   = np.where(counts >= self.counts, counts - self.counts, counts)
+
+            delta = np.where(rollOver.astype(bool), wrap, sat)
+
+            self.total += delta
+            self.rate[:] = delta / dt if dt > 0.0 else 0.0
+        else:
+            self.total[:] = counts
+
+        self.saturated  = counts == np.uint64(0xFFFFFFFF)
+        self.prevTime   = self.timestamp
+        self.prevCounts = self.counts
+        self.timestamp  = timestamp
+        self.counts     = counts
+
+        self._core.StatusCntRate.set(self.rate.copy())
+        self._core.StatusCntTotal.set(self.total.copy())
+
+    def rates(self):
+        """Returns a dictionary of the counter rates (units of Hz) by counter name"""
+        return {k: float(v) for k,v in zip(self.names(), self.rate)}
+
+    def totals(self):
+        """Returns a dictionary of the wrap-corrected totals by counter name"""
+        return {k: int(v) for k,v in zip(self.names(), self.total)}
+
+    def names(self):
+        return [n for n,_ in STATUS_CNT_C]
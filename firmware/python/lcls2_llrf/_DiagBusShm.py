@@ -0,0 +1,182 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Shared-memory snapshot of the combined diagnostic bus.
+#
+#    bytes 0:63  : DIAG_SHM_HEADER_DTYPE
+#    bytes 64:   : one DIAG_SHM_RECORD_DTYPE
+#
+# The record is protected by a sequence lock: the writer makes seq odd,
+# writes the record, then makes seq even again. A reader copies the
+# record between two reads of seq and retries if seq was odd or changed.
+# There is a single writer; any number of readers on the same host map
+# the file (by default in /dev/shm) read-only.
+##############################################################################
+
+import os
+import time
+
+import numpy as np
+
+import lcls2_llrf as llrf
+
+DIAG_SHM_MAGIC_C   = b'LLRFDBS1'
+DIAG_SHM_VERSION_C = 1
+DIAG_SHM_HEADER_C  = 64
+DIAG_SHM_PATH_C    = '/dev/shm/lcls2_llrf_diag'
+
+DIAG_SHM_HEADER_DTYPE = np.dtype({
+    'names'   : ['magic', 'version', 'recordSize', 'seq', 'pid'],
+    'formats' : ['S8',    '<u4',     '<u4',        '<u8', '<u8'],
+    'offsets' : [0,       8,         12,           16,    24],
+    'itemsize': DIAG_SHM_HEADER_C,
+})
+
+DIAG_SHM_RECORD_DTYPE = np.dtype([
+    ('time',            '<f8'),         # Host time of the poll (units of seconds)
+    ('localTimestamp',  '<u8'),
+    ('remoteTimestamp', '<u8', (4,)),
+    ('bsaData',         '<u4', (32,)),
+    ('bsaSevr',         'u1',  (32,)),
+    ('remoteDropCnt',   '<u4', (4,)),
+])
+
+class DiagBusShmWriter(object):
+    """Single writer of the diagnostic bus segment"""
+
+    def __init__(self, path=DIAG_SHM_PATH_C):
+        self.path = path
+
+        # Resized in place, never truncated to zero: readers of a previous
+        # writer may still have the file mapped
+        with open(path, 'ab') as f:
+            f.truncate(DIAG_SHM_HEADER_C + DIAG_SHM_RECORD_DTYPE.itemsize)
+
+        self._header = np.memmap(path, dtype=DIAG_SHM_HEADER_DTYPE, mode='r+', shape=(1,))
+        self._rec    = np.memmap(path, dtype=DIAG_SHM_RECORD_DTYPE, mode='r+', offset=DIAG_SHM_HEADER_C, shape=(1,))
+        self._seq    = self._header['seq']
+
+        # Continue the sequence of a previous writer (even, it may have died mid-publish)
+        if self._header['magic'][0] == DIAG_SHM_MAGIC_C:
+            self._seq[0] = (self.seq + 1) & ~0x1
+        else:
+            self._seq[0] = 0
+
+        self._header['version']    = DIAG_SHM_VERSION_C
+        self._header['recordSize'] = DIAG_SHM_RECORD_DTYPE.itemsize
+        self._header['pid']        = os.getpid()
+        self._header['magic']      = DIAG_SHM_MAGIC_C
+
+    @property
+    def seq(self):
+        return int(self._seq[0])
+
+    def publish(self, rec):
+        """Write one record (a DIAG_SHM_RECORD_DTYPE scalar or a dictionary of its fields)"""
+        seq = self.seq
+        self._seq[0] = seq + 1
+
+        if isinstance(rec, dict):
+            for k in DIAG_SHM_RECORD_DTYPE.names:
+                self._rec[k][0] = rec.get(k, 0)
+        else:
+            self._rec[0] = rec
+
+        self._seq[0] = seq + 2
+
+    def close(self, unlink=True):
+        del self._rec
+        del self._header
+        del self._seq
+        if unlink and os.path.exists(self.path):
+            os.unlink(self.path)
+
+class DiagBusShmReader(object):
+    """
+    Reader of the diagnostic bus segment. read() copies the record into a
+    pre-allocated buffer (no allocation or serialization per read).
+    """
+
+    def __init__(self, path=DIAG_SHM_PATH_C):
+        self._header = np.memmap(path, dtype=DIAG_SHM_HEADER_DTYPE, mode='r', shape=(1,))
+        header = self._header[0]
+
+        if header['magic'] != DIAG_SHM_MAGIC_C:
+            raise ValueError(f'{path} is not a diagnostic bus segment')
+        if header['recordSize'] != DIAG_SHM_RECORD_DTYPE.itemsize:
+            raise ValueError(f'{path} record size {header["recordSize"]} does not match {DIAG_SHM_RECORD_DTYPE.itemsize}')
+
+        self._rec = np.memmap(path, dtype=DIAG_SHM_RECORD_DTYPE, mode='r', offset=DIAG_SHM_HEADER_C, shape=(1,))
+        self._seq = self._header['seq']
+        self._buf = np.zeros(1, dtype=DIAG_SHM_RECORD_DTYPE)
+
+    @property
+    def seq(self):
+        return int(self._seq[0])
+
+    def read(self, out=None, retries=1000):
+        """
+        Returns (rec, seq): a consistent copy of the record (into out if
+        given, else into an internal buffer that the next call overwrites)
+        and its sequence number (seq // 2 records published so far).
+        """
+        out = self._buf if out is None else out
+
+        for _ in range(retries):
+            s0 = self.seq
+            if s0 & 0x1:
+                continue
+            np.copyto(out, self._rec)
+            if self.seq == s0:
+                return out[0], s0
+
+        raise TimeoutError('Diagnostic bus segment is being rewritten continuously')
+
+    def wait(self, seq, timeout=1.0, period=1e-4):
+        """Wait for a record newer than seq, returns (rec, seq) or None on timeout"""
+        tEnd = time.monotonic() + timeout
+        while self.seq <= seq:
+            if time.monotonic() > tEnd:
+                return None
+            time.sleep(period)
+        return self.read()
+
+class DiagBusShmServer(llrf.VarListenerServer):
+    """
+    Publishes the combiner values of each poll cycle of a Root into a
+    DiagBusShmWriter segment. The values come from the variable cache at
+    the end of each update group that read the combiner BsaData (or
+    LocalTimestamp), so no extra transactions are issued.
+    """
+
+    def __init__(self, *, root, comb, path=DIAG_SHM_PATH_C):
+        super().__init__(root=root, dev=comb, names=['BsaData', 'BsaBlock', 'LocalTimestamp'])
+        self._comb   = comb
+        self._path   = path
+        self._writer = None
+        self._rec    = np.zeros((), dtype=DIAG_SHM_RECORD_DTYPE)
+
+    def _start(self):
+        self._writer = DiagBusShmWriter(self._path)
+        super()._start()
+
+    def _stop(self):
+        super()._stop()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _update(self):
+        if self._writer is None:
+            return
+
+        self._rec['time'] = time.time()
+        llrf.combineFields(self._comb, self._rec)
+        self._writer.publish(self._rec)
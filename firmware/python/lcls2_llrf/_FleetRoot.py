@@ -0,0 +1,154 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+import time
+
+import pyrogue as pr
+import pyrogue.interfaces
+
+import lcls2_llrf as llrf
+
+class Carrier(pr.Device):
+    """LLRF application of one carrier in a FleetRoot"""
+    def __init__(self,
+            ip        = '',
+            pollClass = None, # Poll interval overrides (see POLL_CLASS_C)
+            **kwargs):
+        super().__init__(**kwargs)
+
+        self.add(pr.LocalVariable(
+            name        = 'Ip',
+            description = 'Carrier IP address',
+            mode        = 'RO',
+            value       = ip,
+        ))
+
+        self.add(llrf.Application(
+            offset    = 0x80000000,
+            pollClass = pollClass,
+        ))
+
+class FleetRoot(pr.Root):
+    """
+    Monitor of many carriers from one process.
+
+    Every carrier gets its own SRP path, but they all share the Root: one
+    poll thread and poll queue (the blocks of all the carriers due in the
+    same cycle are issued together), one update worker and one ZMQ server.
+    The initial read and readPipelined() interleave the blocks of all the
+    carriers, so the round trips of the different links overlap.
+    """
+
+    def __init__(self,
+            ips           = ('10.0.0.107',),
+            backdoorComm  = True,
+            zmqSrvEn      = True,        # Flag to include the ZMQ server
+            zmqSrvAddr    = '127.0.0.1', # ZMQ server bind address ('*' for all interfaces)
+            zmqSrvPort    = 0,           # ZMQ server base port (0 = auto)
+            emulate       = False,       # Flag to use the in-process register emulator instead of the carriers
+            emuLatency    = 0.0,         # Emulated per-transaction latency (units of seconds)
+            pollClass     = None,        # Poll interval overrides (see POLL_CLASS_C)
+            maxInFlight   = llrf.MAX_IN_FLIGHT_C, # Outstanding read transactions of the pipelined reads
+            txnMonitor    = False,       # Flag to include the SRP TransactionMonitor
+            zmqChangeOnly = False,       # Flag to only publish changed values from the ZMQ server
+            zmqDeadbands  = None,        # {path pattern: deadband} of the change-only ZMQ server
+            zmqKeyframe   = 0.0,         # Full refresh period of the change-only ZMQ server (units of seconds, 0 = off)
+            **kwargs):
+
+        self._maxInFlight  = maxInFlight
+        self._llrfInitRead = kwargs.pop('initRead', False)
+        self._llrfPollEn   = kwargs.pop('pollEn', True)
+        self._links        = []
+        self._probes       = []
+
+        # Polling is enabled after the initial read, so the poller does not race it
+        super().__init__(pollEn=False, **kwargs)
+
+        #################################################################
+        if zmqSrvEn:
+            if zmqChangeOnly:
+                self.zmqServer = llrf.ChangeOnlyZmqServer(root=self, addr=zmqSrvAddr, port=zmqSrvPort, deadbands=zmqDeadbands, keyframe=zmqKeyframe)
+            else:
+                self.zmqServer = pyrogue.interfaces.ZmqServer(root=self, addr=zmqSrvAddr, port=zmqSrvPort)
+            self.addInterface(self.zmqServer)
+
+        #################################################################
+
+        for i,ip in enumerate(ips):
+            srp, link = llrf.connectSrp(self, ip, backdoorComm, emulate, emuLatency)
+            self._links.append((srp, link))
+
+            # With the TransactionMonitor, the carrier reaches its SRP through a probe
+            memBase = srp
+            if txnMonitor:
+                memBase = llrf.TransactionProbe(srp=srp)
+                self.addProtocol(memBase)
+                self._probes.append(memBase)
+
+            self.add(llrf.Carrier(
+                name      = f'Carrier[{i}]',
+                memBase   = memBase,
+                offset    = 0x00000000,
+                ip        = ip,
+                pollClass = pollClass,
+            ))
+
+        if txnMonitor:
+            self.add(llrf.TransactionMonitor(
+                name   = 'TransactionMonitor',
+                probes = [(probe, self.Carrier[i]) for i,probe in enumerate(self._probes)],
+            ))
+
+    @property
+    def carriers(self):
+        return [self.Carrier[i] for i in range(len(self._links))]
+
+    def start(self, **kwargs):
+        super().start(**kwargs)
+
+        if self._llrfInitRead:
+            num, elapsed = self.readPipelined()
+            self._log.info(f'Initial read of {num} blocks from {len(self._links)} carriers in {elapsed:.3f} s')
+
+        self.PollEn.set(self._llrfPollEn)
+
+    def readPipelined(self, maxInFlight=None):
+        """Read the LLRF application of every carrier as one pipelined batch"""
+        return llrf.readPipelined(
+            devices     = [c.Application for c in self.carriers],
+            maxInFlight = self._maxInFlight if maxInFlight is None else maxInFlight,
+        )
+
+    async def snapshot(self, executor=None):
+        """Awaitable SNAPSHOT_DTYPE array, one record per carrier (one pipelined read of all the carriers)"""
+        return await llrf.readSnapshotsAsync([c.Application for c in self.carriers], self._maxInFlight, executor)
+
+    def summary(self, read=False):
+        """
+        Returns a list with one dictionary per carrier: link status, rates
+        and drop counters of the four links. With read=True the carriers
+        are read first (one pipelined batch).
+        """
+        if read:
+            self.readPipelined()
+
+        ret = []
+        for c in self.carriers:
+            comb  = c.Application.BsaMpsMsgRxCombine
+            cores = [c.Application.BsaMpsMsgRxCore[i] for i in range(4)]
+            ret.append({
+                'Ip'            : c.Ip.value(),
+                'RxLinkUp'      : [int(core.RxLinkUp.value()) for core in cores],
+                'PacketRate'    : [int(core.PacketRate.value()) for core in cores],
+                'RemoteDropCnt' : [int(comb.RemoteDropCnt[i].value()) for i in range(4)],
+                'CombineRate'   : int(comb.PacketRate.value()),
+                'Time'          : time.time(),
+            })
+        return ret
@@ -0,0 +1,139 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Save/restore of the RW link configuration of the four BsaMpsMsgRxCore.
+#
+# Profiles use the pyrogue configuration YAML layout, keyed relative to
+# the Application, so the same profile applies to the Application of a
+# Root or of any FleetRoot carrier:
+#
+#    Application:
+#      BsaMpsMsgRxCore[0]:
+#        RxPolarity: 0
+#        ...
+#
+# A configuration saved from a tree (e.g. 'Root: Application: ...', as
+# written by the SaveConfig command) is also accepted: everything above
+# the Application entry is ignored.
+#
+# A 'BsaMpsMsgRxCore[*]' entry applies to the four cores, an entry for a
+# given core takes precedence over it.
+##############################################################################
+
+import pyrogue    as pr
+import lcls2_llrf as llrf
+
+def linkConfigNames():
+    """Names of the RW registers of a core (from BsaMpsMsgRxCore.yaml)"""
+    regs = llrf.registerMap('BsaMpsMsgRxCore')
+    return [n for n in regs.names() if regs[n].mode == 'RW']
+
+def linkConfigVariables(app):
+    """Returns the RW configuration variables of the four cores of an Application"""
+    names = linkConfigNames()
+    return [app.BsaMpsMsgRxCore[i].node(n) for i in range(4) for n in names]
+
+def _checkPath(path):
+    if not path:
+        raise ValueError('No link configuration file given')
+
+def saveLinkConfig(app, path=None, read=True, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+    """
+    Read the configuration of the four cores as one pipelined batch (unless
+    read is False) and return it as a profile. It is also written to path
+    as YAML if given.
+    """
+    if path is not None:
+        _checkPath(path)
+
+    variables = linkConfigVariables(app)
+    if read:
+        llrf.readPipelined(variables, maxInFlight=maxInFlight)
+
+    profile = {app.name: {}}
+    for var in variables:
+        profile[app.name].setdefault(var.parent.name, {})[var.name] = var.value()
+
+    if path is not None:
+        with open(path, 'w') as f:
+            f.write(pr.dataToYaml(profile))
+
+    return profile
+
+def loadLinkConfig(path):
+    """Load a profile from a YAML file"""
+    _checkPath(path)
+    return pr.yamlToData(fName=path)
+
+def _applicationNode(app, profile):
+    """Returns the Application entry of a profile, skipping any tree above it"""
+    node = profile
+    while app.name not in node:
+        subs = [v for v in node.values() if isinstance(v, dict)]
+        if len(subs) != 1:
+            raise ValueError(f'Profile has no single {app.name} entry')
+        node = subs[0]
+    return node[app.name]
+
+def _profileValues(app, profile):
+    """Returns [(variable, value)] of the profile entries for the cores of app"""
+    ret   = []
+    names = linkConfigNames()
+    node  = _applicationNode(app, profile)
+
+    for i in range(4):
+        core   = app.BsaMpsMsgRxCore[i]
+        values = dict(node.get('BsaMpsMsgRxCore[*]', {}))
+        values.update(node.get(core.name, {}))
+
+        for name,value in values.items():
+            if name not in names:
+                raise ValueError(f'{core.path}.{name} is not a link configuration register')
+            var = core.node(name)
+            ret.append((var, var.parseDisp(value) if isinstance(value, str) else value))
+
+    return ret
+
+def diffLinkConfig(app, profile, read=True, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+    """
+    Compare the configuration of the cores against a profile (a dictionary
+    or a YAML file). The registers are read as one pipelined batch unless
+    read is False. Returns [(path, profile value, live value)] of the
+    registers that differ.
+    """
+    if isinstance(profile, str):
+        profile = loadLinkConfig(profile)
+
+    items = _profileValues(app, profile)
+    if read:
+        llrf.readPipelined([var for var,_ in items], maxInFlight=maxInFlight)
+
+    return [(var.path, value, var.value()) for var,value in items if var.value() != value]
+
+def restoreLinkConfig(app, profile, verify=True, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+    """
+    Write a profile (a dictionary or a YAML file) to the cores as one
+    pipelined batch, then read everything back as a second batch and
+    raise a RuntimeError if any register does not match.
+
+    Returns a tuple (number of blocks written, elapsed time in seconds).
+    """
+    if isinstance(profile, str):
+        profile = loadLinkConfig(profile)
+
+    items = _profileValues(app, profile)
+    num, elapsed = llrf.writePipelined(items, maxInFlight=maxInFlight)
+
+    if verify:
+        diff = diffLinkConfig(app, profile, read=True, maxInFlight=maxInFlight)
+        if len(diff) > 0:
+            raise RuntimeError('Link configuration verify failed: ' + ', '.join(f'{p} = {l} (expected {v})' for p,v,l in diff))
+
+    return num, elapsed
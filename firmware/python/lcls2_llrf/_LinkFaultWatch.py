@@ -0,0 +1,280 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Fast link fault watch.
+#
+# A thread reads only the registers that show a link fault, at its own
+# rate and independently of the poll classes:
+#
+#    BsaMpsMsgRxCore[n]  : status counters (one StatusCnt block) and RxLinkUp
+#    BsaMpsMsgRxCombine  : RemoteDropCnt[n]
+#
+# All of them are issued as one pipelined batch of raw reads per cycle,
+# decoded with the register map: the variables, their cached values and
+# listeners (CounterSnapshot, ZMQ server, ...) are not touched. Counter
+# increments and RxLinkUp changes become LINK_FAULT_DTYPE events:
+#
+#    counters : the first increment is reported at once, the increments
+#               that follow within holdoff seconds are summed into one
+#               event at the end of the holdoff
+#    RxLinkUp : a new state is reported once it has been seen for
+#               linkDebounce consecutive cycles
+##############################################################################
+
+import json
+import time
+import threading
+import collections
+
+import numpy   as np
+import pyrogue as pr
+
+import lcls2_llrf as llrf
+
+# Event kinds
+LINK_FAULT_DROP_C    = 0 # RemoteDropCnt (combiner)
+LINK_FAULT_CRC_C     = 1 # ErrCrcCnt
+LINK_FAULT_DEC_ERR_C = 2 # RxDecErr0Cnt + RxDecErr1Cnt
+LINK_FAULT_DISP_C    = 3 # RxDispErr0Cnt + RxDispErr1Cnt
+LINK_FAULT_DOWN_C    = 4 # RxLinkUp dropped
+LINK_FAULT_UP_C      = 5 # RxLinkUp restored
+
+LINK_FAULT_NAMES_C = ['Drop', 'Crc', 'DecErr', 'DispErr', 'LinkDown', 'LinkUp']
+
+LINK_FAULT_DTYPE = np.dtype([
+    ('time',  '<f8'),  # Host time of the first cycle that saw the fault (units of seconds)
+    ('link',  'u1'),   # Link (RF station fiber) 0 to 3
+    ('kind',  'u1'),   # LINK_FAULT_*_C
+    ('count', '<u4'),  # Counter increment (1 for the link state events)
+])
+
+# Counters per kind, summed over the named registers of each core
+_CORE_COUNTERS_C = {
+    LINK_FAULT_CRC_C     : ['ErrCrcCnt'],
+    LINK_FAULT_DEC_ERR_C : ['RxDecErr0Cnt', 'RxDecErr1Cnt'],
+    LINK_FAULT_DISP_C    : ['RxDispErr0Cnt', 'RxDispErr1Cnt'],
+}
+
+# All the counters of _CORE_COUNTERS_C are in the one StatusCnt span
+_COUNTER_NAMES_C = [n for names in _CORE_COUNTERS_C.values() for n in names]
+
+def _delta(new, old):
+    """Counter increments, a value lower than the previous one is a counter reset"""
+    return np.where(new >= old, new - old, new)
+
+class LinkFaultWatch(llrf.PeriodicDevice):
+    """
+    Reads the link fault registers of an Application at rate Hz and
+    reports debounced LINK_FAULT_DTYPE events: to callback(event) if
+    given, as JSON in the LastEvent variable (published by the ZMQ
+    server) and in a bounded in-memory log (see events()).
+    """
+
+    def __init__(self,
+            app          = None,  # Application to watch
+            rate         = 100.0, # Watch cycles per second
+            holdoff      = 1.0,   # Counter event aggregation time (units of seconds)
+            linkDebounce = 2,     # Cycles a RxLinkUp change must persist before it is reported
+            callback     = None,  # Called with each event (a LINK_FAULT_DTYPE record)
+            logSize      = 4096,  # Number of events kept by events()
+            **kwargs):
+        super().__init__(rate=rate, **kwargs)
+
+        self._app          = app
+        self._holdoff      = holdoff
+        self._linkDebounce = linkDebounce
+        self._callback     = callback
+        self._events       = collections.deque(maxlen=logSize)
+        self._eventLock    = threading.Lock()
+        self._state        = None
+        self._spanList     = None
+        self._decoders     = None
+        self._cycleTime    = 0.0
+
+        # Polled once a second, not updated on every cycle
+        self.add(pr.LocalVariable(
+            name         = 'CycleTime',
+            description  = 'Duration of the last read of the fault registers',
+            mode         = 'RO',
+            units        = 'ms',
+            disp         = '{:.3f}',
+            value        = 0.0,
+            localGet     = lambda: 1e3*self._cycleTime,
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'Overruns',
+            description  = 'Cycles that took longer than the watch period',
+            mode         = 'RO',
+            value        = 0,
+            localGet     = lambda: self._overruns,
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'EventCnt',
+            description = 'Number of fault events since start',
+            mode        = 'RO',
+            value       = 0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'LastEvent',
+            description = 'Last fault event as JSON',
+            mode        = 'RO',
+            value       = '',
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'LinkUp',
+            description = 'Debounced RxLinkUp of the four links',
+            mode        = 'RO',
+            value       = np.ones(4, dtype=np.uint8),
+        ))
+
+    ########################################################################
+    # Watch loop
+    ########################################################################
+
+    def _spans(self):
+        """Raw read spans of each cycle and their decoders"""
+        coreMap = llrf.registerMap('BsaMpsMsgRxCore')
+        combMap = llrf.registerMap('BsaMpsMsgRxCombine')
+        cnt     = llrf.RawDecoder(coreMap, _COUNTER_NAMES_C, base=0)
+        link    = llrf.RawDecoder(coreMap, ['RxLinkUp'], base=coreMap['RxLinkUp'].offset & ~0x3)
+        drop    = combMap['RemoteDropCnt']
+
+        spans = []
+        for i in range(4):
+            core   = self._app.BsaMpsMsgRxCore[i]
+            spans += [(core, 0, (cnt.size + 3) & ~0x3), (core, coreMap['RxLinkUp'].offset & ~0x3, 4)]
+
+        # One word per link: the addresses between them are not mapped
+        comb   = self._app.BsaMpsMsgRxCombine
+        spans += [(comb, drop.offset + i*drop.stride, 4) for i in range(4)]
+        return spans, cnt, link, drop
+
+    def _sample(self, data, cnt, link, drop):
+        """Returns (counters (kinds x links), linkUp (links,)) from the raw reads of _spans()"""
+        counters = np.zeros((len(_CORE_COUNTERS_C) + 1, 4), dtype=np.int64)
+        linkUp   = np.zeros(4, dtype=np.uint8)
+
+        for i in range(4):
+            fields = cnt.decode(data[2*i])
+            for kind,names in _CORE_COUNTERS_C.items():
+                counters[kind,i] = sum(int(fields[n]) for n in names)
+            linkUp[i] = link.decode(data[2*i+1])['RxLinkUp']
+
+        mask = (1 << drop.bitSize) - 1
+        counters[LINK_FAULT_DROP_C] = [(int(d.view('<u4')[0]) >> drop.bitOffset) & mask for d in data[8:12]]
+        return counters, linkUp
+
+    def _prepare(self):
+        self._state = None
+        self._spanList, *self._decoders = self._spans()
+
+    def _cycle(self):
+        data, self._cycleTime = llrf.rawReadPipelined(self._spanList)
+        self.process(time.time(), *self._sample(data, *self._decoders))
+
+    ########################################################################
+    # Event detection
+    ########################################################################
+
+    def process(self, t, counters, linkUp):
+        """
+        Run the event detection on one sample: counters is a (kinds x 4)
+        array in LINK_FAULT_*_C order (the link state kinds excluded) and
+        linkUp the four RxLinkUp bits. Returns the events raised as a
+        LINK_FAULT_DTYPE array.
+        """
+        counters = np.array(counters, dtype=np.int64)
+        linkUp   = np.array(linkUp, dtype=np.uint8)
+        events   = []
+
+        if self._state is None:
+            self._state = {
+                'counters' : counters,
+                'pending'  : np.zeros(counters.shape, dtype=np.int64),
+                'holdEnd'  : np.zeros(counters.shape, dtype=np.float64),
+                'first'    : np.zeros(counters.shape, dtype=np.float64),
+                'linkUp'   : linkUp.copy(),
+                'linkNew'  : np.zeros(4, dtype=np.int64),
+            }
+            self.LinkUp.set(linkUp.copy())
+            return np.zeros(0, dtype=LINK_FAULT_DTYPE)
+
+        st    = self._state
+        delta = _delta(counters, st['counters'])
+        st['counters'] = counters
+
+        # Increments outside of a holdoff are reported now and start one
+        active = st['holdEnd'] > t
+        now    = (delta > 0) & ~active
+        for kind,link in zip(*np.nonzero(now)):
+            events.append((t, link, kind, delta[kind,link]))
+        st['holdEnd'][now] = t + self._holdoff
+
+        # Increments during a holdoff are summed, and reported when it ends
+        held = (delta > 0) & active
+        st['first'][held & (st['pending'] == 0)] = t
+        st['pending'][held] += delta[held]
+
+        done = (st['pending'] > 0) & (st['holdEnd'] <= t)
+        for kind,link in zip(*np.nonzero(done)):
+            events.append((st['first'][kind,link], link, kind, st['pending'][kind,link]))
+            st['holdEnd'][kind,link] = t + self._holdoff
+        st['pending'][done] = 0
+
+        # Link state changes must persist for linkDebounce cycles
+        changed = linkUp != st['linkUp']
+        st['linkNew'] = np.where(changed, st['linkNew'] + 1, 0)
+        for link in np.flatnonzero(st['linkNew'] >= self._linkDebounce):
+            st['linkUp'][link]  = linkUp[link]
+            st['linkNew'][link] = 0
+            events.append((t, link, LINK_FAULT_UP_C if linkUp[link] else LINK_FAULT_DOWN_C, 1))
+
+        events = np.array(sorted(events), dtype=LINK_FAULT_DTYPE)
+        if len(events) > 0:
+            self._emit(events)
+        return events
+
+    def _emit(self, events):
+        with self._eventLock:
+            self._events.extend(events)
+
+        self.LinkUp.set(self._state['linkUp'].copy())
+        self.EventCnt.set(self.EventCnt.value() + len(events))
+        self.LastEvent.set(json.dumps(eventToDict(events[-1])))
+
+        if self._callback is not None:
+            for ev in events:
+                self._callback(ev)
+
+    def events(self, since=0.0, link=None, kind=None):
+        """Logged events with a time >= since, optionally for one link and/or kind"""
+        with self._eventLock:
+            ret = np.array(list(self._events), dtype=LINK_FAULT_DTYPE)
+        sel = ret['time'] >= since
+        if link is not None:
+            sel &= ret['link'] == link
+        if kind is not None:
+            sel &= ret['kind'] == kind
+        return ret[sel]
+
+def eventToDict(ev):
+    """JSON friendly representation of a LINK_FAULT_DTYPE record"""
+    return {
+        'time'  : float(ev['time']),
+        'link'  : int(ev['link']),
+        'kind'  : LINK_FAULT_NAMES_C[int(ev['kind'])],
+        'count' : int(ev['count']),
+    }
@@ -0,0 +1,263 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# MPS permit transition log.
+#
+# The permits arrive packed, 2 bits each:
+#
+#    BsaMpsMsgRxCore[i].MpsPermit(2*j+1:2*j)  = Link[i].mpsPermit(j)
+#    BsaMpsMsgRxCombine.BsaData[30](8*i+2*j+1:8*i+2*j) = Link[i].mpsPermit(j)
+#
+# Both are decoded in batches to (N, link, permit) arrays, and only the
+# changes are kept, as PERMIT_EVENT_DTYPE records in an append-only log
+# (in memory, and in a file if given). The first sample of each permit is
+# logged with old = PERMIT_UNKNOWN_C, so the log alone gives the value of
+# every permit at any time after the start.
+##############################################################################
+
+import os
+import time
+import threading
+
+import numpy   as np
+import pyrogue as pr
+
+import lcls2_llrf as llrf
+
+NUM_LINKS_C   = 4
+NUM_PERMITS_C = 4
+
+# Previous value of the first event of each permit
+PERMIT_UNKNOWN_C = 0xFF
+
+PERMIT_EVENT_DTYPE = np.dtype([
+    ('time',   '<f8'), # Host time of the sample that saw the new value (units of seconds)
+    ('link',   'u1'),  # Link (RF station fiber) 0 to 3
+    ('permit', 'u1'),  # Permit 0 to 3 of the link
+    ('old',    'u1'),  # Previous value (PERMIT_UNKNOWN_C for the first sample)
+    ('new',    'u1'),  # New value
+])
+
+_CORE_SHIFT_C = (2*np.arange(NUM_PERMITS_C)).astype(np.uint32)
+_SLOT_SHIFT_C = (8*np.arange(NUM_LINKS_C)[:,np.newaxis] + 2*np.arange(NUM_PERMITS_C)[np.newaxis,:]).astype(np.uint32)
+
+def decodeCorePermit(words):
+    """Decode BsaMpsMsgRxCore.MpsPermit words of any shape S to an S + (4,) array of permits"""
+    words = np.asarray(words, dtype=np.uint32)
+    return ((words[...,np.newaxis] >> _CORE_SHIFT_C) & 0x3).astype(np.uint8)
+
+def decodeMpsSlot(words):
+    """Decode BsaData[30] words of any shape S to an S + (4 links, 4 permits) array"""
+    words = np.asarray(words, dtype=np.uint32)
+    return ((words[...,np.newaxis,np.newaxis] >> _SLOT_SHIFT_C) & 0x3).astype(np.uint8)
+
+def readPermitLog(path):
+    """Read the events of a MpsPermitLog file as a PERMIT_EVENT_DTYPE array"""
+    return np.fromfile(path, dtype=PERMIT_EVENT_DTYPE)
+
+class MpsPermitLog(object):
+    """
+    Append-only log of the MPS permit transitions of the four links.
+    add*() decode a batch of packed words and append the changes in one
+    vectorized step; query() uses a per (link, permit) index.
+    """
+
+    def __init__(self, path=None, capacity=1024):
+        self._events = np.zeros(capacity, dtype=PERMIT_EVENT_DTYPE)
+        self._index  = [np.zeros(capacity, dtype=np.int64) for _ in range(NUM_LINKS_C*NUM_PERMITS_C)]
+        self._idxLen = np.zeros(NUM_LINKS_C*NUM_PERMITS_C, dtype=np.int64)
+        self._len    = 0
+        self._state  = np.full((NUM_LINKS_C, NUM_PERMITS_C), PERMIT_UNKNOWN_C, dtype=np.uint8)
+        self._lock   = threading.Lock()
+        self._file   = None
+        self._log    = pr.logInit(cls=self)
+        self.path    = path
+
+        # Continue an existing file
+        if path is not None:
+            if os.path.exists(path):
+                self._repair(path)
+                self._append(readPermitLog(path))
+            self._file = open(path, 'ab')
+
+    def _repair(self, path):
+        """Drop a partial last record (e.g. after a crash), so the appends stay aligned"""
+        size  = os.path.getsize(path)
+        extra = size % PERMIT_EVENT_DTYPE.itemsize
+        if extra != 0:
+            self._log.warning(f'{path}: dropping {extra} bytes of a partial last record')
+            os.truncate(path, size - extra)
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def nbytes(self):
+        """Size of the logged events"""
+        return self._len * PERMIT_EVENT_DTYPE.itemsize
+
+    @property
+    def state(self):
+        """Last value of each permit, (link, permit) array (PERMIT_UNKNOWN_C before the first sample)"""
+        with self._lock:
+            return self._state.copy()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    ########################################################################
+    # Append
+    ########################################################################
+
+    def addCore(self, t, words):
+        """Add one sample of the four BsaMpsMsgRxCore.MpsPermit words taken at time t"""
+        return self.addCoreArray(np.array([t], dtype=np.float64), np.asarray(words).reshape(1, NUM_LINKS_C))
+
+    def addCoreArray(self, times, words, valid=None):
+        """Add N samples: times (N,), MpsPermit words of the four cores (N,4)"""
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        return self.addPermits(times, decodeCorePermit(np.asarray(words).reshape(len(times), NUM_LINKS_C)), valid)
+
+    def addSlot(self, t, word, valid=None):
+        """Add one BsaData[30] word taken at time t"""
+        return self.addSlotArray(np.array([t], dtype=np.float64), np.array([word]),
+                                 None if valid is None else np.asarray(valid, dtype=bool).reshape(1, NUM_LINKS_C))
+
+    def addSlotArray(self, times, words, valid=None):
+        """
+        Add N BsaData[30] words (e.g. the bsaData[:,30] of ring records).
+        The slot is zero for a link that was not aligned with the local
+        timing message: valid (N,4) masks out such samples, which then keep
+        the previous value of the link.
+        """
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        return self.addPermits(times, decodeMpsSlot(np.asarray(words).reshape(len(times))), valid)
+
+    def addPermits(self, times, permits, valid=None):
+        """
+        Add N decoded samples: times (N,), permits (N, link, permit) and
+        optionally valid (N, link). Returns the new events.
+        """
+        times   = np.asarray(times, dtype=np.float64).reshape(-1)
+        permits = np.asarray(permits, dtype=np.uint8).reshape(len(times), NUM_LINKS_C, NUM_PERMITS_C)
+        num     = len(times)
+        if num == 0:
+            return np.zeros(0, dtype=PERMIT_EVENT_DTYPE)
+
+        with self._lock:
+            prev = np.concatenate([self._state[np.newaxis], permits])
+
+            # Invalid samples hold the last valid value of their link
+            if valid is not None:
+                valid = np.concatenate([np.ones((1, NUM_LINKS_C), dtype=bool),
+                                        np.asarray(valid, dtype=bool).reshape(num, NUM_LINKS_C)])
+                idx   = np.maximum.accumulate(np.where(valid, np.arange(num + 1)[:,np.newaxis], 0), axis=0)
+                prev  = prev[idx, np.arange(NUM_LINKS_C)[np.newaxis,:]]
+
+            # Row major order of nonzero(): by time, then link, then permit
+            n, link, permit = np.nonzero(prev[1:] != prev[:-1])
+
+            events = np.zeros(len(n), dtype=PERMIT_EVENT_DTYPE)
+            events['time']   = times[n]
+            events['link']   = link
+            events['permit'] = permit
+            events['old']    = prev[n, link, permit]
+            events['new']    = prev[n + 1, link, permit]
+
+            self._state = prev[-1].copy()
+            self._append(events)
+
+            if self._file is not None and len(events) > 0:
+                self._file.write(events.tobytes())
+                self._file.flush()
+
+        return events
+
+    def _append(self, events):
+        num = len(events)
+        if num == 0:
+            return
+
+        # Grow by doubling, so appending stays amortized O(1)
+        if self._len + num > len(self._events):
+            size = max(2*len(self._events), self._len + num)
+            self._events = np.resize(self._events, size)
+            self._index  = [np.resize(idx, size) for idx in self._index]
+
+        pos = np.arange(self._len, self._len + num)
+        self._events[pos] = events
+        self._len += num
+
+        key = events['link'].astype(np.int64)*NUM_PERMITS_C + events['permit']
+        for k in np.unique(key):
+            sel = pos[key == k]
+            self._index[k][self._idxLen[k]:self._idxLen[k] + len(sel)] = sel
+            self._idxLen[k] += len(sel)
+
+        self._state[events['link'], events['permit']] = events['new']
+
+    ########################################################################
+    # Query
+    ########################################################################
+
+    def query(self, link=None, permit=None, t0=None, t1=None):
+        """
+        Events with a time in [t0, t1) (None for no bound), optionally for
+        one link and/or one permit, oldest first.
+        """
+        links   = range(NUM_LINKS_C)   if link   is None else [link]
+        permits = range(NUM_PERMITS_C) if permit is None else [permit]
+
+        with self._lock:
+            if link is None and permit is None:
+                idx = np.arange(self._len)
+            else:
+                idx = np.sort(np.concatenate([self._index[l*NUM_PERMITS_C + p][:self._idxLen[l*NUM_PERMITS_C + p]] for l in links for p in permits]))
+            ret = self._events[idx]
+
+        # The log is in time order: bound it by binary search
+        lo = 0         if t0 is None else np.searchsorted(ret['time'], t0, side='left')
+        hi = len(ret)  if t1 is None else np.searchsorted(ret['time'], t1, side='left')
+        return ret[lo:hi]
+
+    def valueAt(self, t):
+        """Value of each permit at time t, (link, permit) array (PERMIT_UNKNOWN_C if not yet seen)"""
+        ret = np.full((NUM_LINKS_C, NUM_PERMITS_C), PERMIT_UNKNOWN_C, dtype=np.uint8)
+        with self._lock:
+            for l in range(NUM_LINKS_C):
+                for p in range(NUM_PERMITS_C):
+                    k   = l*NUM_PERMITS_C + p
+                    idx = self._index[k][:self._idxLen[k]]
+                    n   = np.searchsorted(self._events['time'][idx], t, side='right')
+                    if n > 0:
+                        ret[l,p] = self._events['new'][idx[n-1]]
+        return ret
+
+class MpsPermitLogServer(llrf.VarListenerServer):
+    """
+    Feeds a MpsPermitLog from the poll cycles of a Root: at the end of each
+    update group that touched a core MpsPermit, the four words are taken
+    from the variable cache (no extra transactions) and added.
+    """
+
+    def __init__(self, *, root, app, log=None, path=None):
+        super().__init__(root=root, dev=app, names=['MpsPermit'])
+        self._app = app
+        self.log  = MpsPermitLog(path=path) if log is None else log
+
+    def _stop(self):
+        super()._stop()
+        self.log.close()
+
+    def _update(self):
+        words = [self._app.BsaMpsMsgRxCore[i].MpsPermit.value() for i in range(NUM_LINKS_C)]
+        self.log.addCore(time.time(), words)
@@ -0,0 +1,101 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+import time
+import threading
+
+import pyrogue as pr
+
+class PeriodicDevice(pr.Device):
+    """
+    Device running _cycle() in its own thread, Rate times per second, while
+    Enable is set. _prepare() is called in the thread before the first
+    cycle. An exception in a cycle is logged and the loop goes on; cycles
+    that take longer than the period are counted in self._overruns. If
+    _prepare() raises, the loop ends and Enable is cleared.
+    """
+
+    def __init__(self,
+            rate = 1.0, # Cycles per second
+            **kwargs):
+        super().__init__(**kwargs)
+
+        self._thread   = None
+        self._run      = False
+        self._overruns = 0
+
+        self.add(pr.LocalVariable(
+            name        = 'Enable',
+            description = f'Run the {self.name} loop',
+            mode        = 'RW',
+            value       = False,
+            localSet    = lambda value: self._enable(value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'Rate',
+            description = 'Cycles per second',
+            mode        = 'RW',
+            units       = 'Hz',
+            value       = float(rate),
+        ))
+
+    def _stop(self):
+        self._enable(False)
+        super()._stop()
+
+    def _enable(self, value):
+        if value and self._thread is None:
+            self._run    = True
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+        elif not value and self._thread is not None:
+            self._run = False
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        try:
+            self._prepare()
+
+            while self._run:
+                tStart = time.monotonic()
+                period = 1.0 / max(self.Rate.value(), 1e-3)
+
+                try:
+                    self._cycle()
+                except Exception as e:
+                    pr.logException(self._log, e)
+
+                wait = period - (time.monotonic() - tStart)
+                if wait > 0:
+                    time.sleep(wait)
+                else:
+                    self._overruns += 1
+
+        except Exception as e:
+            pr.logException(self._log, e)
+
+        finally:
+            # Loop ended without a stop (e.g. _prepare() failed): clear Enable
+            # so that setting it again restarts the loop
+            if self._run:
+                self._run    = False
+                self._thread = None
+                self.Enable.set(False)
+
+    def _prepare(self):
+        """Called in the loop thread before the first cycle"""
+        pass
+
+    def _cycle(self):
+        """One cycle of the loop"""
+        raise NotImplementedError
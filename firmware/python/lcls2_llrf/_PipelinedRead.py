@@ -0,0 +1,152 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+import time
+import contextlib
+import collections
+import itertools
+
+import numpy as np
+
+import rogue.interfaces.memory as rim
+import pyrogue as pr
+
+# Default number of read transactions kept outstanding on the SRP link
+MAX_IN_FLIGHT_C = 64
+
+def deviceBlocks(dev):
+    """
+    Returns the register blocks of a device and all its sub-devices (or of
+    a remote variable). As in Device.readBlocks(), the blocks of a device
+    with bulkOpEn cleared are left out; a remote variable given explicitly
+    is always read.
+    """
+    if isinstance(dev, pr.RemoteVariable):
+        return [dev._block]
+
+    blocks = [block for block in dev._blocks if block.bulkOpEn]
+    for sub in dev.deviceList:
+        blocks += deviceBlocks(sub)
+    return blocks
+
+def readPipelined(devices, maxInFlight=MAX_IN_FLIGHT_C):
+    """
+    Read all the blocks of the devices (or remote variables) with up to
+    maxInFlight transactions outstanding.
+
+    Device.readBlocks() followed by checkBlocks() already starts every
+    transaction before checking any, so this is not faster for one
+    device. What it adds: the number of outstanding SRP transactions is
+    capped, the blocks of several devices (or several Roots) are
+    interleaved and read once each, in one update group, and the number
+    of blocks and the elapsed time are returned.
+
+    Returns a tuple (number of blocks, elapsed time in seconds).
+    """
+    devices = list(devices)
+    if len(devices) == 0:
+        return 0, 0.0
+
+    root   = devices[0].root
+    lists  = [deviceBlocks(dev) for dev in devices]
+    order  = []
+    seen   = set()
+    window = collections.deque()
+
+    # Interleave the devices, variables sharing a block only need one transaction
+    for block in itertools.chain.from_iterable(itertools.zip_longest(*lists)):
+        if block is not None and id(block) not in seen:
+            seen.add(id(block))
+            order.append(block)
+
+    tStart = time.monotonic()
+
+    with root.updateGroup():
+        for block in order:
+            if len(window) >= maxInFlight:
+                pr.checkTransaction(window.popleft())
+            pr.startTransaction(block, type=rim.Read)
+            window.append(block)
+
+        while len(window) > 0:
+            pr.checkTransaction(window.popleft())
+
+    return len(order), time.monotonic() - tStart
+
+def writePipelined(items, maxInFlight=MAX_IN_FLIGHT_C):
+    """
+    Write a list of (remote variable, value) pairs with up to maxInFlight
+    transactions outstanding. All the values are set in the shadow
+    registers first, then each block is written once (forced, so a
+    carrier that lost its state after a power cycle is written even when
+    the shadow value did not change).
+
+    Returns a tuple (number of blocks, elapsed time in seconds).
+    """
+    items = list(items)
+    if len(items) == 0:
+        return 0, 0.0
+
+    root   = items[0][0].root
+    order  = []
+    seen   = set()
+    window = collections.deque()
+
+    for var,value in items:
+        var.set(value, write=False)
+        if id(var._block) not in seen:
+            seen.add(id(var._block))
+            order.append(var._block)
+
+    tStart = time.monotonic()
+
+    with root.updateGroup():
+        for block in order:
+            if len(window) >= maxInFlight:
+                pr.checkTransaction(window.popleft())
+            pr.startTransaction(block, type=rim.Write, forceWr=True)
+            window.append(block)
+
+        while len(window) > 0:
+            pr.checkTransaction(window.popleft())
+
+    return len(order), time.monotonic() - tStart
+
+def rawReadPipelined(spans):
+    """
+    Raw reads of a list of (device, offset, number of bytes) spans, all in
+    flight together. The variables are bypassed: their cached values are
+    not updated and no listener is called.
+
+    Returns a tuple (list of uint8 arrays, one per span, elapsed time in seconds).
+    """
+    spans = list(spans)
+    data  = [bytearray(size) for _,_,size in spans]
+    devs  = list({id(dev): dev for dev,_,_ in spans}.values())
+
+    tStart = time.monotonic()
+
+    with contextlib.ExitStack() as stack:
+        for dev in devs:
+            stack.enter_context(dev._memLock)
+            dev._clearError()
+
+        for (dev,offset,size),ba in zip(spans, data):
+            step = dev._reqMaxAccess()
+            for i in range(0, size, step):
+                dev._reqTransaction(offset + i, ba, min(step, size - i), i, rim.Read)
+
+        for dev in devs:
+            dev._waitTransaction(0)
+            err = dev._getError()
+            if err != '':
+                raise pr.MemoryError(name=dev.path, address=dev.address, msg=err)
+
+    return [np.frombuffer(ba, dtype=np.uint8) for ba in data], time.monotonic() - tStart
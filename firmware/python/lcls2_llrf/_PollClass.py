@@ -0,0 +1,47 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+# Default poll interval of each poll class (units of seconds, 0 = not polled)
+#
+#    fast     : BSA data, severities, MPS permits and timestamps
+#    health   : status counters, drop counters, rates, link up and PLL lock
+#    slow     : static-ish status (user value)
+#    onDemand : link configuration (polarities, loopback, counter roll over),
+#               only read at start and on request
+#
+# The reset strobes are never polled.
+#
+# All the blocks of a class share the same interval, so the poller reads
+# them in the same pass: the transactions of a pass are all issued before
+# any of them is waited on.
+POLL_CLASS_C = {
+    'fast'     : 1.0,
+    'health'   : 5.0,
+    'slow'     : 30.0,
+    'onDemand' : 0.0,
+}
+
+def pollIntervals(pollClass=None):
+    """Returns the poll interval of each class, with the overrides in pollClass applied"""
+    ret = dict(POLL_CLASS_C)
+    if pollClass is not None:
+        for k,v in pollClass.items():
+            if k not in ret:
+                raise ValueError(f'Unknown poll class "{k}", must be one of {list(POLL_CLASS_C)}')
+            ret[k] = float(v)
+    return ret
+
+def parsePollClass(arg):
+    """Parse a 'fast=1,health=5,...' command line string into a pollClass dictionary"""
+    ret = {}
+    for item in [s for s in arg.split(',') if s.strip() != '']:
+        k,v = item.split('=')
+        ret[k.strip()] = float(v)
+    return pollIntervals(ret)
@@ -0,0 +1,198 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Incremental programming of the Micron N25Q PROM (surf AxiMicronN25Q).
+#
+# The MCS file is parsed once into a flat byte image and cached by file
+# hash. The PROM is read back one erase sector at a time and only the
+# sectors that differ from the image are erased, programmed and verified.
+#
+# The PROM is not memory mapped: AxiMicronN25Q reads one 256-byte page per
+# command into its data buffer. A sector read is therefore 256 commands,
+# each followed by one 256-byte burst read of the buffer, and the pages
+# cannot be pipelined since the next command overwrites the buffer.
+##############################################################################
+
+import os
+import hashlib
+
+import numpy as np
+
+SECTOR_SIZE_C = 0x10000 # N25Q erase sector (bytes)
+PAGE_SIZE_C   = 256     # AxiMicronN25Q data buffer = 64 x 32-bit words
+
+class McsImage(object):
+    """Flat PROM image: data[i] is the byte at PROM address startAddr + i"""
+
+    def __init__(self, startAddr, data, digest=''):
+        self.startAddr = startAddr
+        self.data      = data
+        self.digest    = digest
+
+    @property
+    def endAddr(self):
+        return self.startAddr + len(self.data)
+
+    def sectors(self):
+        """Returns the PROM addresses of the erase sectors covered by the image"""
+        first = self.startAddr - (self.startAddr % SECTOR_SIZE_C)
+        return list(range(first, self.endAddr, SECTOR_SIZE_C))
+
+    def sector(self, addr):
+        """Returns the image bytes of one erase sector (0xFF outside of the image)"""
+        ret = np.full(SECTOR_SIZE_C, 0xFF, dtype=np.uint8)
+        lo  = max(addr, self.startAddr)
+        hi  = min(addr + SECTOR_SIZE_C, self.endAddr)
+        if hi > lo:
+            ret[lo-addr:hi-addr] = self.data[lo-self.startAddr:hi-self.startAddr]
+        return ret
+
+def parseMcs(path):
+    """Parse an Intel HEX (.mcs) file into an McsImage, gaps are filled with 0xFF"""
+    chunks = []
+    upper  = 0
+
+    with open(path, 'r') as f:
+        for num,line in enumerate(f):
+            line = line.strip()
+            if line == '':
+                continue
+            if line[0] != ':':
+                raise ValueError(f'{path}:{num+1}: missing start code')
+
+            rec = bytes.fromhex(line[1:])
+            if (sum(rec) & 0xFF) != 0:
+                raise ValueError(f'{path}:{num+1}: checksum error')
+
+            length = rec[0]
+            addr   = (rec[1] << 8) | rec[2]
+            rtype  = rec[3]
+            data   = rec[4:4+length]
+
+            if rtype == 0x00:
+                chunks.append((upper + addr, data))
+            elif rtype == 0x01:
+                break
+            elif rtype == 0x02:
+                upper = ((data[0] << 8) | data[1]) << 4
+            elif rtype == 0x04:
+                upper = ((data[0] << 8) | data[1]) << 16
+
+    if len(chunks) == 0:
+        raise ValueError(f'{path}: no data records')
+
+    start = min(a for a,_ in chunks)
+    end   = max(a + len(d) for a,d in chunks)
+    image = np.full(end - start, 0xFF, dtype=np.uint8)
+    for a,d in chunks:
+        image[a-start:a-start+len(d)] = np.frombuffer(d, dtype=np.uint8)
+
+    return McsImage(start, image)
+
+def fileDigest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1<<20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def loadMcs(path, cacheDir=None):
+    """
+    Returns the McsImage of an MCS file. When cacheDir is set, the parsed
+    image is stored there keyed by the SHA-256 of the file, so re-deploying
+    the same image skips the parsing.
+    """
+    digest = fileDigest(path)
+
+    if cacheDir is not None:
+        cache = os.path.join(cacheDir, f'{digest}.npz')
+        if os.path.exists(cache):
+            with np.load(cache) as npz:
+                return McsImage(int(npz['startAddr']), npz['data'], digest)
+
+    image        = parseMcs(path)
+    image.digest = digest
+
+    if cacheDir is not None:
+        os.makedirs(cacheDir, exist_ok=True)
+        tmp = os.path.join(cacheDir, f'{digest}.tmp.npz')
+        np.savez(tmp, startAddr=image.startAddr, data=image.data)
+        os.replace(tmp, cache)
+
+    return image
+
+class N25QProm(object):
+    """Sector level access to a surf AxiMicronN25Q device"""
+
+    def __init__(self, dev):
+        self._dev = dev
+
+    def reset(self):
+        self._dev.resetFlash()
+
+    def readSector(self, addr):
+        """
+        Reads one sector, a page at a time: readCmd() fills the 64-word data
+        buffer and getDataReg() reads it back in one burst.
+        """
+        ret = np.empty(SECTOR_SIZE_C, dtype=np.uint8)
+        for off in range(0, SECTOR_SIZE_C, PAGE_SIZE_C):
+            self._dev.readCmd(addr + off)
+            words = np.asarray(self._dev.getDataReg(), dtype=np.uint32)
+            ret[off:off+PAGE_SIZE_C] = np.frombuffer(words.astype('>u4').tobytes(), dtype=np.uint8)
+        return ret
+
+    def eraseSector(self, addr):
+        self._dev.eraseCmd(addr)
+
+    def writeSector(self, addr, data):
+        # Pages left erased (all 0xFF) do not need to be programmed
+        words = np.frombuffer(np.ascontiguousarray(data).tobytes(), dtype='>u4').astype(np.uint32)
+        for off in range(0, SECTOR_SIZE_C, PAGE_SIZE_C):
+            page = words[off//4:(off+PAGE_SIZE_C)//4]
+            if np.all(page == 0xFFFFFFFF):
+                continue
+            self._dev.setDataReg([int(w) for w in page])
+            self._dev.writeCmd(addr + off)
+
+def diffSectors(prom, image, progress=None):
+    """Returns the list of sector addresses where the PROM differs from the image"""
+    sectors = image.sectors()
+    ret     = []
+    for i,addr in enumerate(sectors):
+        if not np.array_equal(prom.readSector(addr), image.sector(addr)):
+            ret.append(addr)
+        if progress is not None:
+            progress('compare', i+1, len(sectors))
+    return ret
+
+def incrementalLoad(prom, image, progress=None):
+    """
+    Program only the sectors of the PROM that differ from the image and
+    verify them. Returns the list of sectors that were programmed (empty
+    when the PROM already holds the image). Raises a RuntimeError if the
+    verification fails.
+    """
+    prom.reset()
+    dirty = diffSectors(prom, image, progress)
+
+    for i,addr in enumerate(dirty):
+        prom.eraseSector(addr)
+        prom.writeSector(addr, image.sector(addr))
+        if progress is not None:
+            progress('program', i+1, len(dirty))
+
+    for i,addr in enumerate(dirty):
+        if not np.array_equal(prom.readSector(addr), image.sector(addr)):
+            raise RuntimeError(f'PROM verify failed in the sector at {addr:#x}')
+        if progress is not None:
+            progress('verify', i+1, len(dirty))
+
+    return dirty
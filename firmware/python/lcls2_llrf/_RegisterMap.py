@@ -0,0 +1,303 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Register map compiled from firmware/common/AppCommon/yaml.
+#
+# Each MMIODev of the YAML becomes a compact table (REGISTER_DTYPE, one row
+# per IntField) plus its SequenceCommands. The compiled tables ship with
+# the package in _RegisterTables.py (software/scripts/genRegisterMap.py),
+# keyed by the SHA-256 of their YAML: an installed package needs neither
+# the YAML nor PyYAML. In a source tree whose YAML no longer matches the
+# shipped digest, the YAML is compiled instead. The pyrogue devices are
+# built from these tables, and RawDecoder decodes raw block reads straight
+# into named fields.
+##############################################################################
+
+import os
+import hashlib
+import collections
+import threading
+
+import numpy   as np
+import pyrogue as pr
+
+import lcls2_llrf._RegisterTables as _tables
+
+YAML_DIR_C = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'common', 'AppCommon', 'yaml'))
+
+# YAML files compiled into _RegisterTables.py
+REGISTER_MAP_FILES_C = ['BsaMpsMsgRxCore', 'BsaMpsMsgRxCombine']
+
+# Bump when the table layout changes to invalidate the shipped tables
+REGISTER_MAP_VERSION_C = 1
+
+REGISTER_DTYPE = np.dtype([
+    ('name',        'U32'),
+    ('offset',      '<u4'), # Byte offset in the device
+    ('bitOffset',   'u1'),
+    ('bitSize',     '<u2'),
+    ('number',      '<u2'), # Number of elements (nelms)
+    ('stride',      '<u2'), # Byte stride between the elements
+    ('mode',        'U2'),
+    ('description', 'U64'),
+])
+
+COMMAND_DTYPE = np.dtype([
+    ('name',        'U32'),
+    ('entry',       'U32'),
+    ('value',       '<u8'),
+    ('description', 'U64'),
+])
+
+Register = collections.namedtuple('Register', REGISTER_DTYPE.names)
+
+class RegisterMap(object):
+    """Register table of one device, indexed by register name"""
+
+    def __init__(self, name, registers, commands, size):
+        self.name      = name
+        self.registers = registers
+        self.commands  = commands
+        self.size      = size
+        self._index    = {str(n): i for i,n in enumerate(registers['name'])}
+
+    def __getitem__(self, name):
+        row = self.registers[self._index[name]]
+        return Register(*[v.item() if hasattr(v, 'item') else v for v in row])
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def names(self):
+        return list(self._index)
+
+    def span(self, lo, hi):
+        """Returns the registers with an offset in [lo, hi), in address order"""
+        sel = (self.registers['offset'] >= lo) & (self.registers['offset'] < hi)
+        return [self[str(n)] for n in self.registers['name'][sel]]
+
+def compileYaml(path):
+    """Parse one YAML file into {device: RegisterMap} (needs PyYAML)"""
+    import yaml
+
+    with open(path) as f:
+        tree = yaml.safe_load(f)
+
+    ret = {}
+    for devName,dev in tree.items():
+        if not isinstance(dev, dict) or dev.get('class') != 'MMIODev':
+            continue
+
+        regs = []
+        cmds = []
+        for name,child in dev.get('children', {}).items():
+            at = child.get('at', {})
+            if child.get('class') == 'IntField':
+                regs.append((
+                    name,
+                    at.get('offset', 0),
+                    child.get('lsBit', 0),
+                    child.get('sizeBits', 32),
+                    at.get('nelms', 1),
+                    at.get('stride', 0),
+                    child.get('mode', 'RW'),
+                    child.get('description', ''),
+                ))
+            elif child.get('class') == 'SequenceCommand':
+                for seq in child.get('sequence', []):
+                    cmds.append((name, seq['entry'], seq['value'], child.get('description', '')))
+
+        ret[devName] = RegisterMap(
+            name      = devName,
+            registers = np.array(regs, dtype=REGISTER_DTYPE),
+            commands  = np.array(cmds, dtype=COMMAND_DTYPE),
+            size      = dev.get('size', 0),
+        )
+
+    return ret
+
+def yamlDigest(path):
+    """Key of the compiled tables of a YAML file"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read() + bytes([REGISTER_MAP_VERSION_C])).hexdigest()
+
+def _shippedMaps(name):
+    entry = _tables.REGISTER_TABLES_C[name]
+    return {dev: RegisterMap(
+                name      = dev,
+                registers = np.array([tuple(r) for r in t['registers']], dtype=REGISTER_DTYPE),
+                commands  = np.array([tuple(c) for c in t['commands']], dtype=COMMAND_DTYPE),
+                size      = t['size'],
+            ) for dev,t in entry['devices'].items()}
+
+_log       = pr.logInit(name='RegisterMap')
+_cache     = {}
+_cacheLock = threading.Lock()
+
+def registerMap(name, yamlDir=YAML_DIR_C):
+    """
+    Returns the RegisterMap of a device (e.g. 'BsaMpsMsgRxCore'). The
+    shipped tables are used unless <yamlDir>/<name>.yaml exists and no
+    longer matches them, in which case it is compiled. Once per process.
+    """
+    path = os.path.join(yamlDir, f'{name}.yaml')
+
+    with _cacheLock:
+        if path in _cache:
+            return _cache[path][name]
+
+        maps    = None
+        shipped = _tables.REGISTER_TABLES_C.get(name)
+
+        if os.path.exists(path) and (shipped is None or yamlDigest(path) != shipped['digest']):
+            try:
+                maps = compileYaml(path)
+                _log.warning(f'{path} does not match the shipped register tables, run software/scripts/genRegisterMap.py')
+            except ImportError:
+                if shipped is None:
+                    raise
+                _log.warning(f'{path} does not match the shipped register tables and PyYAML is not installed, using the shipped tables')
+
+        if maps is None:
+            if shipped is None:
+                raise KeyError(f'No register table for {name}: not in _RegisterTables.py and {path} not found')
+            maps = _shippedMaps(name)
+
+        _cache[path] = maps
+        return maps[name]
+
+def writeRegisterTables(path=os.path.join(os.path.dirname(__file__), '_RegisterTables.py'), yamlDir=YAML_DIR_C, names=REGISTER_MAP_FILES_C):
+    """Compile the YAML files of names and write them as the shipped _RegisterTables.py"""
+    lines = [
+        '#' * 78,
+        "## This file is part of 'LCLS2 LLRF Firmware'.",
+        '## It is subject to the license terms in the LICENSE.txt file found in the',
+        '## top-level directory of this distribution and at:',
+        '##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.',
+        "## No part of 'LCLS2 LLRF Firmware', including this file,",
+        '## may be copied, modified, propagated, or distributed except according to',
+        '## the terms contained in the LICENSE.txt file.',
+        '#' * 78,
+        '#',
+        '# Generated by software/scripts/genRegisterMap.py from',
+        '# firmware/common/AppCommon/yaml, do not edit.',
+        '#' * 78,
+        '',
+        'REGISTER_TABLES_C = {',
+    ]
+
+    for name in names:
+        yamlPath = os.path.join(yamlDir, f'{name}.yaml')
+        lines += [f'    {name!r} : {{', f'        \'digest\'  : {yamlDigest(yamlPath)!r},', '        \'devices\' : {']
+
+        for dev,m in compileYaml(yamlPath).items():
+            lines += [f'            {dev!r} : {{', f'                \'size\'      : {int(m.size):#x},', '                \'registers\' : [',
+                      '                    # name, offset, bitOffset, bitSize, number, stride, mode, description']
+            for r in m.registers:
+                lines.append(f'                    ({str(r["name"])!r}, {int(r["offset"]):#05x}, {int(r["bitOffset"])}, {int(r["bitSize"])}, '
+                             f'{int(r["number"])}, {int(r["stride"])}, {str(r["mode"])!r}, {str(r["description"])!r}),')
+            lines += ['                ],', '                \'commands\'  : [', '                    # name, entry, value, description']
+            for c in m.commands:
+                lines.append(f'                    ({str(c["name"])!r}, {str(c["entry"])!r}, {int(c["value"])}, {str(c["description"])!r}),')
+            lines += ['                ],', '            },']
+
+        lines += ['        },', '    },']
+
+    lines.append('}')
+
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def addRegister(dev, reg, **kwargs):
+    """
+    Add a register of a RegisterMap to a pyrogue Device, as one
+    RemoteVariable or, for arrays, with addRemoteVariables(). kwargs
+    (pollInterval, units, disp, name, ...) are passed through.
+    """
+    args = {
+        'name'        : reg.name,
+        'description' : reg.description,
+        'offset'      : reg.offset,
+        'bitSize'     : reg.bitSize,
+        'bitOffset'   : reg.bitOffset,
+        'mode'        : reg.mode,
+    }
+    args.update(kwargs)
+
+    if reg.number > 1:
+        dev.addRemoteVariables(number=reg.number, stride=reg.stride, **args)
+    else:
+        dev.add(pr.RemoteVariable(**args))
+
+class RawDecoder(object):
+    """
+    Decode raw little-endian register bytes into named fields.
+
+    base is the device offset of the first byte of the buffers passed to
+    decode(). Fields wider than 64 bits are returned as Python ints.
+    """
+
+    def __init__(self, regMap, names=None, base=0):
+        names = regMap.names() if names is None else names
+        self.fields = []
+
+        for name in names:
+            reg   = regMap[name]
+            start = np.uint64(reg.offset - base) + np.arange(reg.number, dtype=np.uint64)*np.uint64(reg.stride)
+            bit   = (start*np.uint64(8)) + np.uint64(reg.bitOffset)
+            first = (bit >> np.uint64(3)).astype(np.int64)
+            shift = (bit & np.uint64(0x7))
+            nb    = int((int(shift[0]) + reg.bitSize + 7) // 8)
+            self.fields.append((name, reg.number, reg.bitSize, first, shift, nb))
+
+        self.size = max(int(f[3][-1]) + f[5] for f in self.fields) if len(self.fields) > 0 else 0
+
+    def decode(self, data):
+        """
+        data is a bytes-like object or a uint8 array of shape (size,) or
+        (N,size). Returns a dictionary of arrays; array registers get an
+        extra last dimension of their number of elements.
+        """
+        raw = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8)
+        ret = {}
+
+        for name,number,bitSize,first,shift,nb in self.fields:
+            idx   = first[:,np.newaxis] + np.arange(nb)
+            sel   = raw[...,idx]
+
+            if nb <= 8:
+                word = np.zeros(sel.shape[:-1], dtype=np.uint64)
+                for k in range(nb):
+                    word |= sel[...,k].astype(np.uint64) << np.uint64(8*k)
+                mask  = np.uint64((1 << bitSize) - 1)
+                value = (word >> shift) & mask
+            else:
+                flat  = sel.reshape(-1, nb)
+                sh    = np.broadcast_to(shift, sel.shape[:-1]).reshape(-1)
+                value = np.array([(int.from_bytes(b.tobytes(), 'little') >> int(s)) & ((1 << bitSize) - 1)
+                                  for b,s in zip(flat,sh)], dtype=object).reshape(sel.shape[:-1])
+
+            ret[name] = value if number > 1 else value[...,0]
+
+        return ret
+
+def rawReadFields(dev, regMap, names=None):
+    """
+    Read the span of registers covering 'names' from a pyrogue Device with
+    one raw transaction and decode it, bypassing the variable objects.
+    """
+    names  = regMap.names() if names is None else names
+    regs   = [regMap[n] for n in names]
+    lo     = min(r.offset for r in regs) & ~0x3
+    dec    = RawDecoder(regMap, names, base=lo)
+    words  = dev._rawRead(offset=lo, numWords=(dec.size + 3) // 4)
+
+    # _rawRead() returns a scalar for a single word
+    return dec.decode(np.atleast_1d(np.asarray(words, dtype='<u4')).view(np.uint8))
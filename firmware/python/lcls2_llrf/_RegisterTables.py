@@ -0,0 +1,81 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Generated by software/scripts/genRegisterMap.py from
+# firmware/common/AppCommon/yaml, do not edit.
+##############################################################################
+
+REGISTER_TABLES_C = {
+    'BsaMpsMsgRxCore' : {
+        'digest'  : 'cfde37f13f2904b444b4f2c2ca16221e7da7dd8d377b26f0c53b11411cac79ad',
+        'devices' : {
+            'BsaMpsMsgRxCore' : {
+                'size'      : 0x1000,
+                'registers' : [
+                    # name, offset, bitOffset, bitSize, number, stride, mode, description
+                    ('RxLinkUpCnt', 0x000, 0, 32, 1, 0, 'RO', 'RxLinkUp Status Counter'),
+                    ('RxDecErr0Cnt', 0x004, 0, 32, 1, 0, 'RO', 'RxDecErr0 Status Counter'),
+                    ('RxDecErr1Cnt', 0x008, 0, 32, 1, 0, 'RO', 'RxDecErr1 Status Counter'),
+                    ('RxDispErr0Cnt', 0x00c, 0, 32, 1, 0, 'RO', 'RxDispErr0 Status Counter'),
+                    ('RxDispErr1Cnt', 0x010, 0, 32, 1, 0, 'RO', 'RxDispErr1 Status Counter'),
+                    ('OverflowCnt', 0x014, 0, 32, 1, 0, 'RO', 'Overflow Status Counter'),
+                    ('ErrPktLenCnt', 0x018, 0, 32, 1, 0, 'RO', 'ErrPktLen Status Counter'),
+                    ('ErrCrcCnt', 0x01c, 0, 32, 1, 0, 'RO', 'ErrCrc Status Counter'),
+                    ('CPllLockCnt', 0x020, 0, 32, 1, 0, 'RO', 'CPllLock Status Counter'),
+                    ('GtRxFifoErrCnt', 0x024, 0, 32, 1, 0, 'RO', 'GtRxFifoErr Status Counter'),
+                    ('RxLinkUp', 0x400, 0, 1, 1, 0, 'RO', 'RxLinkUp Status Bit'),
+                    ('CPllLock', 0x401, 0, 1, 1, 0, 'RO', 'CPllLock Status Bit'),
+                    ('PacketRate', 0x410, 0, 32, 1, 0, 'RO', 'Packet Rate (units of Hz)'),
+                    ('SofRate', 0x414, 0, 32, 1, 0, 'RO', 'Start-Of-Frame Rate (units of Hz)'),
+                    ('UserValue', 0x500, 0, 128, 1, 0, 'RO', 'Remote UserValue Status Counter'),
+                    ('RxPolarity', 0x700, 0, 1, 1, 0, 'RW', "GTH's RxPolarity"),
+                    ('TxPolarity', 0x704, 0, 1, 1, 0, 'RW', "GTH's TxPolarity"),
+                    ('Loopback', 0x708, 0, 1, 1, 0, 'RW', "GTH's Loopback"),
+                    ('RollOverEn', 0x7f0, 0, 10, 1, 0, 'RW', "Status counters' roll over enable bit mask"),
+                    ('CntRst', 0x7f4, 0, 1, 1, 0, 'WO', 'Status Counter Reset'),
+                    ('GtRst', 0x7f8, 0, 1, 1, 0, 'WO', 'GTH Reset'),
+                    ('HardRst', 0x7fc, 0, 1, 1, 0, 'WO', 'Hard Reset'),
+                    ('BsaQuantity', 0x800, 0, 32, 12, 4, 'RO', 'BsaQuantity[11:0]'),
+                    ('BsaSevr', 0x840, 0, 2, 12, 4, 'RO', 'BsaSevr[11:0]'),
+                    ('MpsPermit', 0x900, 0, 8, 1, 0, 'RO', 'Remote MpsPermit'),
+                    ('RemoteTimestamp', 0x910, 0, 64, 1, 0, 'RO', 'Remote Timestamp'),
+                ],
+                'commands'  : [
+                    # name, entry, value, description
+                    ('RstCnt', 'CntRst', 1, 'Reset all the status counters'),
+                    ('RstGt', 'GtRst', 1, 'Reset the GTH'),
+                    ('RstHard', 'HardRst', 1, 'Reset the registers to default values'),
+                ],
+            },
+        },
+    },
+    'BsaMpsMsgRxCombine' : {
+        'digest'  : '6c5cfe6f5ab4a5fe69464fd8c2bd8a80c1f5d5f871fe48ed32b9875adb2b820c',
+        'devices' : {
+            'BsaMpsMsgRxCombine' : {
+                'size'      : 0x1000,
+                'registers' : [
+                    # name, offset, bitOffset, bitSize, number, stride, mode, description
+                    ('BsaData', 0x000, 0, 32, 32, 4, 'RO', 'BsaData[31:0]'),
+                    ('BsaSevr', 0x080, 0, 2, 32, 4, 'RO', 'BsaSevr[31:0]'),
+                    ('RemoteDropCnt', 0x100, 0, 32, 4, 16, 'RO', 'RemoteDropCnt[3:0]'),
+                    ('RemoteTimestamp', 0x200, 0, 64, 4, 16, 'RO', 'RemoteTimestamp[3:0]'),
+                    ('LocalTimestamp', 0x240, 0, 64, 1, 0, 'RO', 'LocalTimestamp'),
+                    ('PacketRate', 0x300, 0, 32, 1, 0, 'RO', 'Diagnostic Bus Update Rate (units of Hz)'),
+                    ('CntRst', 0xffc, 0, 1, 1, 0, 'WO', 'Status Counter Reset'),
+                ],
+                'commands'  : [
+                    # name, entry, value, description
+                    ('RstCnt', 'CntRst', 1, 'Reset all the status counters'),
+                ],
+            },
+        },
+    },
+}
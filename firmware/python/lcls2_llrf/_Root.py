@@ -8,6 +8,8 @@
 ## the terms contained in the LICENSE.txt file.
 ##############################################################################
 
+import time
+
 import rogue
 import pyrogue.protocols
 
@@ -17,51 +19,244 @@ import lcls2_llrf     as llrf
 
 rogue.Version.minVersion('6.0.0')
 
+def connectSrp(root, ip, backdoorComm=True, emulate=False, emuLatency=0.0):
+    """
+    Create the SRP register path to one carrier and return (srp, link),
+    where link is the UDP or RSSI transport (None for the emulator). The
+    caller must keep a reference to both.
+    """
+    link = None
+
+    if ( emulate ):
+
+        # In-process memory emulator (no carrier required)
+        srp = llrf.BsaMpsMsgRxEmulator(
+            appBase = 0x80000000,
+            latency = emuLatency,
+        )
+        root.addProtocol(srp)
+
+    elif ( backdoorComm ):
+
+        # UDP only
+        link = rogue.protocols.udp.Client(ip,8192,0)
+
+        # Connect the SRPv0 to RAW UDP
+        srp = rogue.protocols.srp.SrpV0()
+        srp == link
+
+    else:
+
+        # Create SRP/ASYNC_MSG interface
+        link = pyrogue.protocols.UdpRssiPack( name='rudpReg', host=ip, port=8193, packVer = 1, jumbo = False)
+
+        # Connect the SRPv3 to tDest = 0x0
+        srp = rogue.protocols.srp.SrpV3()
+        srp == link.application(dest=0x0)
+
+    return srp, link
+
+class _AmcCarrierRoot(pr.Root):
+    """Stand-alone tree for the AmcCarrierCore, sharing the SRP of the LLRF Root"""
+    def __init__(self, memBase, **kwargs):
+        super().__init__(pollEn=False, initRead=False, **kwargs)
+        self.add(amccCore.AmcCarrierCore(
+            memBase = memBase,
+            offset  = 0x00000000,
+        ))
+
 class Root(pr.Root):
     def __init__(self,
-            ip           = '10.0.0.107',
-            backdoorComm = True,
-            zmqSrvEn     = True,  # Flag to include the ZMQ server
+            ip             = '10.0.0.107',
+            backdoorComm   = True,
+            zmqSrvEn       = True,   # Flag to include the ZMQ server
+            emulate        = False,  # Flag to use the in-process register emulator instead of a carrier
+            emuLatency     = 0.0,    # Emulated per-transaction latency (units of seconds)
+            pollClass      = None,   # Poll interval overrides (see POLL_CLASS_C)
+            amcCarrierCore = 'full', # 'full', 'lazy' (built on first getAmcCarrierCore()) or 'none'
+            maxInFlight    = llrf.MAX_IN_FLIGHT_C, # Outstanding read transactions of the initial read
+            txnMonitor     = False,  # Flag to include the SRP TransactionMonitor
+            blockRead      = True,   # Flag to use the burst read variables in the LLRF application
+            zmqChangeOnly  = False,  # Flag to only publish changed values from the ZMQ server
+            zmqDeadbands   = None,   # {path pattern: deadband} of the change-only ZMQ server
+            zmqKeyframe    = 0.0,    # Full refresh period of the change-only ZMQ server (units of seconds, 0 = off)
+            diagShm        = None,   # Shared-memory file of the diagnostic bus snapshot (e.g. DIAG_SHM_PATH_C, None = off)
+            bsaRollup      = False,  # Flag to keep the multi-resolution BSA history (self.bsaRollup)
+            faultWatch     = 0.0,    # Rate of the LinkFaultWatch loop (units of Hz, 0 = not included)
+            tsMonitor      = 0.0,    # Sample rate of the TimestampMonitor (units of Hz, 0 = not included)
+            permitLog      = None,   # File of the MPS permit transition log (self.permitLog, '' = in memory only, None = off)
             **kwargs):
-        super().__init__(**kwargs)
+
+        if amcCarrierCore not in ['full', 'lazy', 'none']:
+            raise ValueError(f'amcCarrierCore must be "full", "lazy" or "none", not "{amcCarrierCore}"')
+
+        # The initial read is done here, with a bounded number of
+        # outstanding transactions (readPipelined), instead of by pr.Root.
+        # Without the full tree, only the LLRF application is read at start.
+        # Polling is enabled after that read, so the poller does not race it.
+        self._amcCarrierCore = amcCarrierCore
+        self._maxInFlight    = maxInFlight
+        self._llrfInitRead   = kwargs.pop('initRead', False)
+        self._llrfPollEn     = kwargs.pop('pollEn', True)
+        self._amcRoot        = None
+
+        tStart = time.monotonic()
+        super().__init__(pollEn=False, **kwargs)
 
         #################################################################
         if zmqSrvEn:
-            self.zmqServer = pyrogue.interfaces.ZmqServer(root=self, addr='127.0.0.1', port=0)
+            if zmqChangeOnly:
+                self.zmqServer = llrf.ChangeOnlyZmqServer(root=self, addr='127.0.0.1', port=0, deadbands=zmqDeadbands, keyframe=zmqKeyframe)
+            else:
+                self.zmqServer = pyrogue.interfaces.ZmqServer(root=self, addr='127.0.0.1', port=0)
             self.addInterface(self.zmqServer)
 
         #################################################################
 
-        if ( backdoorComm ):
+        self.srp, link = connectSrp(self, ip, backdoorComm, emulate, emuLatency)
 
-            # UDP only
-            self.udp = rogue.protocols.udp.Client(ip,8192,0)
+        # Keep the transport under its original name
+        if ( link is not None ):
+            setattr(self, 'udp' if backdoorComm else 'rudp', link)
 
-            # Connect the SRPv0 to RAW UDP
-            self.srp = rogue.protocols.srp.SrpV0()
-            self.srp == self.udp
+        # With the TransactionMonitor, the devices reach the SRP through its probe
+        self._srpBase = self.srp
+        if txnMonitor:
+            self.txnProbe = llrf.TransactionProbe(srp=self.srp)
+            self.addProtocol(self.txnProbe)
+            self._srpBase = self.txnProbe
 
-        else:
+        #################################################################
 
-            # Create SRP/ASYNC_MSG interface
-            self.rudp = pyrogue.protocols.UdpRssiPack( name='rudpReg', host=ip, port=8193, packVer = 1, jumbo = False)
+        if amcCarrierCore == 'full':
+            self.add(amccCore.AmcCarrierCore(
+                memBase = self._srpBase,
+                offset  = 0x00000000,
+                # expand  =  True,
+            ))
 
-            # Connect the SRPv3 to tDest = 0x0
-            self.srp = rogue.protocols.srp.SrpV3()
-            self.srp == self.rudp.application(dest=0x0)
+        self.add(llrf.Application(
+            memBase   = self._srpBase,
+            offset    =  0x80000000,
+            pollClass = pollClass,
+            blockRead = blockRead,
+            expand    =  True,
+        ))
 
         #################################################################
 
-        self.add(amccCore.AmcCarrierCore(
-            memBase = self.srp,
-            offset  = 0x00000000,
-            # expand  =  True,
+        # Combiner values of each poll cycle for the local consumers
+        if diagShm is not None:
+            self.diagShm = llrf.DiagBusShmServer(root=self, comb=self.Application.BsaMpsMsgRxCombine, path=diagShm)
+            self.addInterface(self.diagShm)
+
+        # In-process min/max/mean history of the BSA channels
+        if bsaRollup:
+            self.bsaRollupServer = llrf.BsaRollupServer(root=self, app=self.Application)
+            self.bsaRollup       = self.bsaRollupServer.rollup
+            self.addInterface(self.bsaRollupServer)
+
+        # Transitions of the core MPS permits of each poll cycle
+        if permitLog is not None:
+            self.permitLogServer = llrf.MpsPermitLogServer(root=self, app=self.Application, path=permitLog or None)
+            self.permitLog       = self.permitLogServer.log
+            self.addInterface(self.permitLogServer)
+
+        #################################################################
+
+        if txnMonitor:
+            self.add(llrf.TransactionMonitor(
+                name   = 'TransactionMonitor',
+                probes = [(self.txnProbe, self)],
+            ))
+
+        if faultWatch > 0.0:
+            self.add(llrf.LinkFaultWatch(
+                name = 'LinkFaultWatch',
+                app  = self.Application,
+                rate = faultWatch,
+            ))
+
+        if tsMonitor > 0.0:
+            self.add(llrf.TimestampMonitor(
+                name = 'TimestampMonitor',
+                app  = self.Application,
+                rate = tsMonitor,
+            ))
+
+        self.add(pr.LocalVariable(
+            name        = 'TreeBuildTime',
+            description = 'Time taken to build the device tree',
+            mode        = 'RO',
+            value       = time.monotonic() - tStart,
+            units       = 's',
+            disp        = '{:.3f}',
         ))
 
-        self.add(llrf.Application(
-            memBase = self.srp,
-            offset  =  0x80000000,
-            expand  =  True,
+        self.add(pr.LocalVariable(
+            name        = 'InitReadTime',
+            description = 'Time taken by the initial read',
+            mode        = 'RO',
+            value       = 0.0,
+            units       = 's',
+            disp        = '{:.3f}',
         ))
 
-        #################################################################
+    def start(self, **kwargs):
+        tStart = time.monotonic()
+        super().start(**kwargs)
+
+        if self._llrfInitRead:
+            devices = [self.Application]
+            if self._amcCarrierCore == 'full':
+                devices.insert(0, self.AmcCarrierCore)
+
+            num, elapsed = llrf.readPipelined(devices, maxInFlight=self._maxInFlight)
+            self.InitReadTime.set(elapsed)
+            self._log.info(f'Initial read of {num} blocks in {elapsed:.3f} s')
+
+        self.PollEn.set(self._llrfPollEn)
+
+        for name in ['LinkFaultWatch', 'TimestampMonitor']:
+            if hasattr(self, name):
+                self.node(name).Enable.set(True)
+
+        self._log.info(f'Tree built in {self.TreeBuildTime.value():.3f} s, started in {time.monotonic() - tStart:.3f} s (amcCarrierCore = {self._amcCarrierCore})')
+
+    def stop(self):
+        if self._amcRoot is not None:
+            self._amcRoot.stop()
+            self._amcRoot = None
+        super().stop()
+
+    async def snapshot(self, executor=None):
+        """Awaitable SNAPSHOT_DTYPE record of the four cores and the combiner (one pipelined read)"""
+        return await llrf.readSnapshotAsync(self.Application, self._maxInFlight, executor)
+
+    async def readCores(self, executor=None):
+        """Awaitable (4,) CORE_SNAPSHOT_DTYPE array of the four cores"""
+        return await llrf.readCoresAsync(self.Application, self._maxInFlight, executor)
+
+    async def readCombine(self, executor=None):
+        """Awaitable COMBINE_SNAPSHOT_DTYPE record of the combiner"""
+        return await llrf.readCombineAsync(self.Application, self._maxInFlight, executor)
+
+    def getAmcCarrierCore(self):
+        """
+        Returns the AmcCarrierCore device. With amcCarrierCore = 'lazy' it is
+        built and started in its own Root on the first call (not visible to
+        the ZMQ server), with 'none' it is not available.
+        """
+        if self._amcCarrierCore == 'full':
+            return self.AmcCarrierCore
+
+        if self._amcCarrierCore == 'none':
+            raise pr.NodeError('AmcCarrierCore is not included (amcCarrierCore = "none")')
+
+        if self._amcRoot is None:
+            tStart = time.monotonic()
+            self._amcRoot = _AmcCarrierRoot(memBase=self._srpBase, name='AmcCarrierRoot')
+            self._amcRoot.start()
+            self._log.info(f'AmcCarrierCore built in {time.monotonic() - tStart:.3f} s')
+
+        return self._amcRoot.AmcCarrierCore
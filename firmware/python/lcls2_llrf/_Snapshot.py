@@ -0,0 +1,140 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Structured snapshots of the four BsaMpsMsgRxCore and the combiner.
+#
+# readSnapshot() and friends read the devices as one pipelined batch and
+# return one NumPy record. The async versions run the same read in an
+# executor thread, so an asyncio service does not block its event loop.
+# Each awaited read holds one executor thread: to sample many carriers,
+# use readSnapshotsAsync(), which reads all of them as one pipelined batch
+# from a single thread:
+#
+#    snaps = await readSnapshotsAsync([root.Application for root in roots])
+##############################################################################
+
+import time
+import asyncio
+
+import numpy as np
+
+import lcls2_llrf as llrf
+
+CORE_SNAPSHOT_DTYPE = np.dtype([
+    ('statusCnt',       '<u4', (len(llrf.STATUS_CNT_C),)), # STATUS_CNT_C order
+    ('rxLinkUp',        'u1'),
+    ('cPllLock',        'u1'),
+    ('packetRate',      '<u4'),
+    ('sofRate',         '<u4'),
+    ('userValue',       '<u2', (8,)),
+    ('bsaQuantity',     '<u4', (12,)),
+    ('bsaSevr',         'u1',  (12,)),
+    ('mpsPermit',       'u1'),
+    ('remoteTimestamp', '<u8'),
+])
+
+COMBINE_SNAPSHOT_DTYPE = np.dtype([
+    ('bsaData',         '<u4', (32,)),
+    ('bsaSevr',         'u1',  (32,)),
+    ('remoteDropCnt',   '<u4', (4,)),
+    ('remoteTimestamp', '<u8', (4,)),
+    ('localTimestamp',  '<u8'),
+    ('packetRate',      '<u4'),
+])
+
+SNAPSHOT_DTYPE = np.dtype([
+    ('time',    '<f8'),                        # Host time at the end of the read (units of seconds)
+    ('elapsed', '<f8'),                        # Duration of the read (units of seconds)
+    ('core',    CORE_SNAPSHOT_DTYPE, (4,)),
+    ('combine', COMBINE_SNAPSHOT_DTYPE),
+])
+
+def coreFields(core, rec):
+    """Fill a CORE_SNAPSHOT_DTYPE record from the cached values of a BsaMpsMsgRxCore"""
+    userValue = int(core.UserValue.value())
+
+    rec['statusCnt']       = [core.node(n).value() for n,_ in llrf.STATUS_CNT_C]
+    rec['rxLinkUp']        = core.RxLinkUp.value()
+    rec['cPllLock']        = core.CPllLock.value()
+    rec['packetRate']      = core.PacketRate.value()
+    rec['sofRate']         = core.SofRate.value()
+    rec['userValue']       = [(userValue >> (16*i)) & 0xFFFF for i in range(8)]
+    rec['bsaQuantity']     = [core.BsaQuantity[i].value() for i in range(12)]
+    rec['bsaSevr']         = [core.BsaSevr[i].value() for i in range(12)]
+    rec['mpsPermit']       = core.MpsPermit.value()
+    rec['remoteTimestamp'] = core.RemoteTimestamp.value()
+
+def _read(apps, cores, combine, maxInFlight):
+    devices = []
+    for app in apps:
+        if cores:
+            devices += [app.BsaMpsMsgRxCore[i] for i in range(4)]
+        if combine:
+            devices += [app.BsaMpsMsgRxCombine]
+
+    rec = np.zeros(len(apps), dtype=SNAPSHOT_DTYPE)
+    _, elapsed = llrf.readPipelined(devices, maxInFlight=maxInFlight)
+    rec['time']    = time.time()
+    rec['elapsed'] = elapsed
+
+    for app,r in zip(apps, rec):
+        if cores:
+            for i in range(4):
+                coreFields(app.BsaMpsMsgRxCore[i], r['core'][i])
+
+        if combine:
+            comb = app.BsaMpsMsgRxCombine
+            llrf.combineFields(comb, r['combine'])
+            r['combine']['packetRate'] = comb.PacketRate.value()
+
+    return rec
+
+def readSnapshots(apps, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+    """
+    Read the cores and the combiner of several Applications (e.g. the
+    carriers of a FleetRoot) as one pipelined batch, returns a
+    SNAPSHOT_DTYPE array with one record per Application.
+    """
+    return _read(list(apps), True, True, maxInFlight)
+
+def readSnapshot(app, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+    """Read the four cores and the combiner (one pipelined batch), returns a SNAPSHOT_DTYPE record"""
+    return _read([app], True, True, maxInFlight)[0]
+
+def readCores(app, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+    """Read the four cores, returns a (4,) CORE_SNAPSHOT_DTYPE array"""
+    return _read([app], True, False, maxInFlight)[0]['core']
+
+def readCombine(app, maxInFlight=llrf.MAX_IN_FLIGHT_C):
+    """Read the combiner, returns a COMBINE_SNAPSHOT_DTYPE record"""
+    return _read([app], False, True, maxInFlight)[0]['combine']
+
+async def _runAsync(func, app, maxInFlight, executor):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, func, app, maxInFlight)
+
+async def readSnapshotsAsync(apps, maxInFlight=llrf.MAX_IN_FLIGHT_C, executor=None):
+    """Awaitable readSnapshots(), run in executor (the loop default if None)"""
+    return await _runAsync(readSnapshots, list(apps), maxInFlight, executor)
+
+async def readSnapshotAsync(app, maxInFlight=llrf.MAX_IN_FLIGHT_C, executor=None):
+    """
+    Awaitable readSnapshot(), run in executor (the loop default if None).
+    Use readSnapshotsAsync() for several carriers: one thread for all of them.
+    """
+    return await _runAsync(readSnapshot, app, maxInFlight, executor)
+
+async def readCoresAsync(app, maxInFlight=llrf.MAX_IN_FLIGHT_C, executor=None):
+    """Awaitable readCores(), run in executor (the loop default if None)"""
+    return await _runAsync(readCores, app, maxInFlight, executor)
+
+async def readCombineAsync(app, maxInFlight=llrf.MAX_IN_FLIGHT_C, executor=None):
+    """Awaitable readCombine(), run in executor (the loop default if None)"""
+    return await _runAsync(readCombine, app, maxInFlight, executor)
@@ -0,0 +1,245 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+import threading
+
+import numpy as np
+
+class StreamingHistogram(object):
+    """
+    Constant memory histogram with log-spaced bins.
+
+    Values in [minValue, maxValue) go into binsPerDecade bins per decade,
+    which bounds the relative error of the percentiles to about
+    10^(1/binsPerDecade) - 1 (12% with the default 20). Values below
+    minValue (including zero and negative values) are counted in an
+    underflow bin, values above maxValue in an overflow bin. The exact
+    count, sum, min and max are kept as well. Histograms with the same
+    binning can be merged, e.g. across links or carriers.
+    """
+
+    def __init__(self, minValue=1e-6, maxValue=1e3, binsPerDecade=20):
+        self.minValue      = float(minValue)
+        self.maxValue      = float(maxValue)
+        self.binsPerDecade = int(binsPerDecade)
+        self._decades      = np.log10(self.maxValue / self.minValue)
+        self._numBins      = int(np.ceil(self._decades * self.binsPerDecade))
+        self._lock         = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # [underflow, bins..., overflow]
+            self.counts = np.zeros(self._numBins + 2, dtype=np.int64)
+            self.count  = 0
+            self.sum    = 0.0
+            self.min    = np.inf
+            self.max    = -np.inf
+
+    def _bins(self, values):
+        idx = np.floor(np.log10(np.maximum(values, self.minValue) / self.minValue) * self.binsPerDecade).astype(np.int64) + 1
+        idx = np.where(values < self.minValue, 0, idx)
+        return np.clip(idx, 0, self._numBins + 1)
+
+    def add(self, value):
+        self.addArray(np.array([value], dtype=np.float64))
+
+    def addArray(self, values):
+        """Add an array of values (vectorized)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+
+        counts = np.bincount(self._bins(values), minlength=self._numBins + 2)
+
+        with self._lock:
+            self.counts += counts
+            self.count  += len(values)
+            self.sum    += float(values.sum())
+            self.min     = min(self.min, float(values.min()))
+            self.max     = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        """Add the content of another histogram with the same binning"""
+        if (other.minValue, other.maxValue, other.binsPerDecade) != (self.minValue, self.maxValue, self.binsPerDecade):
+            raise ValueError('Cannot merge histograms with a different binning')
+
+        with self._lock:
+            self.counts += other.counts
+            self.count  += other.count
+            self.sum    += other.sum
+            self.min     = min(self.min, other.min)
+            self.max     = max(self.max, other.max)
+        return self
+
+    def copy(self):
+        ret = StreamingHistogram(self.minValue, self.maxValue, self.binsPerDecade)
+        return ret.merge(self)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count > 0 else 0.0
+
+    def edges(self):
+        """Returns the lower edge of each bin (underflow bin first)"""
+        return np.concatenate(([-np.inf], self.minValue * 10.0**(np.arange(self._numBins + 1) / self.binsPerDecade)))
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100), at the geometric centre of its bin"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q / 100.0 * self.count
+        idx  = int(np.searchsorted(np.cumsum(self.counts), rank, side='left'))
+        idx  = min(idx, self._numBins + 1)
+
+        if idx == 0:
+            value = self.min
+        elif idx == self._numBins + 1:
+            value = self.max
+        else:
+            value = self.minValue * 10.0**((idx - 0.5) / self.binsPerDecade)
+
+        # Never report outside of the observed range
+        return float(min(max(value, self.min), self.max))
+
+    def summary(self):
+        return {
+            'count' : int(self.count),
+            'mean'  : self.mean,
+            'min'   : self.min if self.count > 0 else 0.0,
+            'p50'   : self.percentile(50),
+            'p90'   : self.percentile(90),
+            'p99'   : self.percentile(99),
+            'max'   : self.max if self.count > 0 else 0.0,
+        }
+
+    def toDict(self):
+        """JSON friendly representation (sparse bin counts)"""
+        nz = np.flatnonzero(self.counts)
+        return {
+            'minValue'      : self.minValue,
+            'maxValue'      : self.maxValue,
+            'binsPerDecade' : self.binsPerDecade,
+            'bins'          : {int(i): int(self.counts[i]) for i in nz},
+            'count'         : int(self.count),
+            'sum'           : self.sum,
+            'min'           : self.min if self.count > 0 else None,
+            'max'           : self.max if self.count > 0 else None,
+        }
+
+    @classmethod
+    def fromDict(cls, d):
+        ret = cls(d['minValue'], d['maxValue'], d['binsPerDecade'])
+        for i,n in d['bins'].items():
+            ret.counts[int(i)] = n
+        ret.count = d['count']
+        ret.sum   = d['sum']
+        ret.min   = np.inf  if d['min'] is None else d['min']
+        ret.max   = -np.inf if d['max'] is None else d['max']
+        return ret
+
+class SignedStreamingHistogram(object):
+    """
+    StreamingHistogram of signed values: the magnitudes of the negative
+    and of the positive (and zero) values go into two log-binned
+    histograms, so the percentiles keep the same relative error on both
+    sides of zero. Same interface as StreamingHistogram.
+    """
+
+    def __init__(self, minValue=1e-6, maxValue=1e3, binsPerDecade=20):
+        self.minValue      = float(minValue)
+        self.maxValue      = float(maxValue)
+        self.binsPerDecade = int(binsPerDecade)
+        self.negative      = StreamingHistogram(minValue, maxValue, binsPerDecade)
+        self.positive      = StreamingHistogram(minValue, maxValue, binsPerDecade)
+
+    def reset(self):
+        self.negative.reset()
+        self.positive.reset()
+
+    def add(self, value):
+        self.addArray(np.array([value], dtype=np.float64))
+
+    def addArray(self, values):
+        """Add an array of values (vectorized)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.negative.addArray(-values[values < 0])
+        self.positive.addArray(values[values >= 0])
+
+    def merge(self, other):
+        """Add the content of another histogram with the same binning"""
+        self.negative.merge(other.negative)
+        self.positive.merge(other.positive)
+        return self
+
+    def copy(self):
+        ret = SignedStreamingHistogram(self.minValue, self.maxValue, self.binsPerDecade)
+        return ret.merge(self)
+
+    @property
+    def count(self):
+        return self.negative.count + self.positive.count
+
+    @property
+    def sum(self):
+        return self.positive.sum - self.negative.sum
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count > 0 else 0.0
+
+    @property
+    def min(self):
+        return -self.negative.max if self.negative.count > 0 else self.positive.min
+
+    @property
+    def max(self):
+        return self.positive.max if self.positive.count > 0 else -self.negative.min
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100): the most negative values rank first"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q / 100.0 * self.count
+        neg  = self.negative.count
+        if rank <= neg and neg > 0:
+            return -self.negative.percentile(100.0 * (1.0 - rank / neg))
+        return self.positive.percentile(100.0 * (rank - neg) / self.positive.count)
+
+    def summary(self):
+        return {
+            'count' : int(self.count),
+            'mean'  : self.mean,
+            'min'   : self.min if self.count > 0 else 0.0,
+            'p50'   : self.percentile(50),
+            'p90'   : self.percentile(90),
+            'p99'   : self.percentile(99),
+            'max'   : self.max if self.count > 0 else 0.0,
+        }
+
+    def toDict(self):
+        """JSON friendly representation"""
+        return {
+            'minValue'      : self.minValue,
+            'maxValue'      : self.maxValue,
+            'binsPerDecade' : self.binsPerDecade,
+            'negative'      : self.negative.toDict(),
+            'positive'      : self.positive.toDict(),
+        }
+
+    @classmethod
+    def fromDict(cls, d):
+        ret = cls(d['minValue'], d['maxValue'], d['binsPerDecade'])
+        ret.negative = StreamingHistogram.fromDict(d['negative'])
+        ret.positive = StreamingHistogram.fromDict(d['positive'])
+        return ret
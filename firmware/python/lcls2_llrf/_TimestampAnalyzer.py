@@ -0,0 +1,272 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# Remote versus local timestamp analysis.
+#
+# The combiner latches RemoteTimestamp[0:3] (last message of each station)
+# and LocalTimestamp (timing bus) in the same clock cycle. Per link:
+#
+#    skew      : LocalTimestamp - RemoteTimestamp[n]
+#    coreSkew  : LocalTimestamp - BsaMpsMsgRxCore[n].RemoteTimestamp
+#    staleness : host time since RemoteTimestamp[n] last changed
+#
+# A remote timestamp ahead of the local one (negative skew) is counted as
+# late. The timestamps are the timing format: seconds in the upper 32
+# bits, nanoseconds in the lower 32 bits.
+##############################################################################
+
+import json
+import time
+import threading
+
+import numpy   as np
+import pyrogue as pr
+
+import lcls2_llrf as llrf
+
+def timingToSeconds(ts):
+    """Convert timing timestamps (sec << 32 | nsec) to seconds (vectorized)"""
+    ts = np.asarray(ts, dtype=np.uint64)
+    return (ts >> np.uint64(32)).astype(np.float64) + (ts & np.uint64(0xFFFFFFFF)).astype(np.float64)*1e-9
+
+def timingDiff(a, b):
+    """
+    a - b of timing timestamps in seconds (vectorized). The difference is
+    taken in integer nanoseconds first: as float64 seconds, a timestamp
+    near 1e9 s only resolves about 238 ns.
+    """
+    a    = np.asarray(a, dtype=np.uint64)
+    b    = np.asarray(b, dtype=np.uint64)
+    sec  = (a >> np.uint64(32)).astype(np.int64) - (b >> np.uint64(32)).astype(np.int64)
+    nsec = (a & np.uint64(0xFFFFFFFF)).astype(np.int64) - (b & np.uint64(0xFFFFFFFF)).astype(np.int64)
+    return (sec*1000000000 + nsec).astype(np.float64)*1e-9
+
+def _timestampSpans(app):
+    """Raw read spans of readTimestamps() and their decoders"""
+    coreMap = llrf.registerMap('BsaMpsMsgRxCore')
+    combMap = llrf.registerMap('BsaMpsMsgRxCombine')
+    coreOff = coreMap['RemoteTimestamp'].offset
+    combOff = combMap['RemoteTimestamp'].offset
+    core    = llrf.RawDecoder(coreMap, ['RemoteTimestamp'], base=coreOff)
+    comb    = llrf.RawDecoder(combMap, ['RemoteTimestamp', 'LocalTimestamp'], base=combOff)
+
+    # The words between the combiner timestamps are not mapped (SLVERR): one span per timestamp
+    remote = combMap['RemoteTimestamp']
+    spans  = [(app.BsaMpsMsgRxCore[i], coreOff, core.size) for i in range(4)]
+    spans += [(app.BsaMpsMsgRxCombine, remote.offset + i*remote.stride, 8) for i in range(remote.number)]
+    spans += [(app.BsaMpsMsgRxCombine, combMap['LocalTimestamp'].offset, 8)]
+    return spans, core, comb
+
+def _decodeTimestamps(spans, data, core, comb):
+    # Place the combiner words at their offsets for the decoder
+    raw = np.zeros(comb.size, dtype=np.uint8)
+    for (_,offset,size),d in zip(spans[4:], data[4:]):
+        off = offset - spans[4][1]
+        raw[off:off+size] = d
+
+    fields = comb.decode(raw)
+    return (np.uint64(fields['LocalTimestamp']),
+            fields['RemoteTimestamp'].astype(np.uint64),
+            np.array([core.decode(d)['RemoteTimestamp'] for d in data[0:4]], dtype=np.uint64))
+
+def readTimestamps(app):
+    """
+    Raw read of LocalTimestamp and RemoteTimestamp[0:3] of the combiner and
+    of the four core RemoteTimestamp, all in flight together. The variables
+    are bypassed: no cached value is updated and no listener is called.
+    Returns (local, remote (4,), coreRemote (4,)) as raw timestamps.
+    """
+    spans, *decoders = _timestampSpans(app)
+    data, _ = llrf.rawReadPipelined(spans)
+    return _decodeTimestamps(spans, data, *decoders)
+
+class TimestampAnalyzer(object):
+    """
+    Constant memory per-link skew, core skew and staleness histograms
+    (units of seconds). The skews are signed, a station ahead of the local
+    timing is negative (SignedStreamingHistogram). Analyzers with the same
+    binning can be merged, e.g. across carriers.
+    """
+
+    def __init__(self, minValue=1e-9, maxValue=1e3, binsPerDecade=20):
+        self._binning = (minValue, maxValue, binsPerDecade)
+        self._lock    = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        hist   = lambda: [llrf.StreamingHistogram(*self._binning) for _ in range(4)]
+        signed = lambda: [llrf.SignedStreamingHistogram(*self._binning) for _ in range(4)]
+        with self._lock:
+            self.skew        = signed()
+            self.coreSkew    = signed()
+            self.staleness   = hist()
+            self.late        = np.zeros(4, dtype=np.int64)
+            self.samples     = 0
+            self._lastRemote = None
+            self._lastChange = None
+
+    def add(self, t, local, remote, coreRemote=None):
+        """Add one sample taken at host time t (units of seconds)"""
+        self.addArray(
+            np.array([t], dtype=np.float64),
+            np.array([local], dtype=np.uint64),
+            np.asarray(remote, dtype=np.uint64).reshape(1, 4),
+            None if coreRemote is None else np.asarray(coreRemote, dtype=np.uint64).reshape(1, 4),
+        )
+
+    def addArray(self, times, local, remote, coreRemote=None):
+        """Add N samples: times and local (N,), remote and coreRemote (N,4)"""
+        times  = np.asarray(times, dtype=np.float64).reshape(-1)
+        local  = np.asarray(local, dtype=np.uint64).reshape(-1)
+        remote = np.asarray(remote, dtype=np.uint64).reshape(len(times), 4)
+        num    = len(times)
+        if num == 0:
+            return
+
+        skew = timingDiff(local[:,np.newaxis], remote)
+
+        with self._lock:
+
+            # Index of the last sample where each remote timestamp changed
+            prev    = remote[0] if self._lastRemote is None else self._lastRemote
+            changed = np.vstack([remote[0:1] != prev, remote[1:] != remote[:-1]])
+            if self._lastRemote is None:
+                changed[0] = True
+            idx  = np.maximum.accumulate(np.where(changed, np.arange(num)[:,np.newaxis], -1), axis=0)
+            last = np.where(idx >= 0, times[np.maximum(idx, 0)], times[0] if self._lastChange is None else self._lastChange)
+
+            self._lastRemote = remote[-1].copy()
+            self._lastChange = last[-1].copy()
+            self.late       += np.count_nonzero(skew < 0, axis=0)
+            self.samples    += num
+
+            for i in range(4):
+                self.skew[i].addArray(skew[:,i])
+                self.staleness[i].addArray(times - last[:,i])
+                if coreRemote is not None:
+                    core = np.asarray(coreRemote, dtype=np.uint64).reshape(num, 4)[:,i]
+                    self.coreSkew[i].addArray(timingDiff(local, core))
+
+    def merge(self, other):
+        """Add the histograms and counters of another analyzer (e.g. another carrier)"""
+        with self._lock:
+            for i in range(4):
+                self.skew[i].merge(other.skew[i])
+                self.coreSkew[i].merge(other.coreSkew[i])
+                self.staleness[i].merge(other.staleness[i])
+            self.late    += other.late
+            self.samples += other.samples
+        return self
+
+    def summary(self):
+        """Per link count/mean/min/p50/p90/p99/max of each histogram (units of seconds)"""
+        return {
+            f'link[{i}]' : {
+                'skew'      : self.skew[i].summary(),
+                'coreSkew'  : self.coreSkew[i].summary(),
+                'staleness' : self.staleness[i].summary(),
+                'late'      : int(self.late[i]),
+            } for i in range(4)
+        }
+
+    def toDict(self):
+        """JSON friendly representation (mergeable with fromDict)"""
+        return {
+            'samples'   : int(self.samples),
+            'late'      : [int(n) for n in self.late],
+            'skew'      : [h.toDict() for h in self.skew],
+            'coreSkew'  : [h.toDict() for h in self.coreSkew],
+            'staleness' : [h.toDict() for h in self.staleness],
+        }
+
+    @classmethod
+    def fromDict(cls, d):
+        h   = d['skew'][0]
+        ret = cls(h['minValue'], h['maxValue'], h['binsPerDecade'])
+        ret.samples   = d['samples']
+        ret.late      = np.array(d['late'], dtype=np.int64)
+        ret.skew      = [llrf.SignedStreamingHistogram.fromDict(x) for x in d['skew']]
+        ret.coreSkew  = [llrf.SignedStreamingHistogram.fromDict(x) for x in d['coreSkew']]
+        ret.staleness = [llrf.StreamingHistogram.fromDict(x) for x in d['staleness']]
+        return ret
+
+class TimestampMonitor(llrf.PeriodicDevice):
+    """
+    Samples the timestamps of an Application at rate Hz (readTimestamps())
+    into a TimestampAnalyzer, and exposes the per-link percentiles.
+    """
+
+    def __init__(self,
+            app  = None, # Application to sample
+            rate = 10.0, # Samples per second
+            **kwargs):
+        super().__init__(rate=rate, **kwargs)
+
+        self._app      = app
+        self._spanList = None
+        self._decoders = None
+        self.analyzer  = TimestampAnalyzer()
+
+        for name,hist,pct,desc in [
+                ('SkewP50',      'skew',      50,  'Median LocalTimestamp - RemoteTimestamp per link'),
+                ('SkewP99',      'skew',      99,  '99th percentile LocalTimestamp - RemoteTimestamp per link'),
+                ('SkewMax',      'skew',      100, 'Maximum LocalTimestamp - RemoteTimestamp per link'),
+                ('StalenessP99', 'staleness', 99,  '99th percentile time since the remote timestamp changed per link'),
+                ('StalenessMax', 'staleness', 100, 'Maximum time since the remote timestamp changed per link')]:
+
+            self.add(pr.LocalVariable(
+                name         = name,
+                description  = desc,
+                mode         = 'RO',
+                units        = 'us',
+                value        = np.zeros(4, dtype=np.float64),
+                localGet     = lambda hist=hist, pct=pct: self._percentile(hist, pct),
+                pollInterval = 1,
+            ))
+
+        self.add(pr.LocalVariable(
+            name         = 'Late',
+            description  = 'Samples with a remote timestamp ahead of the local one per link',
+            mode         = 'RO',
+            value        = np.zeros(4, dtype=np.int64),
+            localGet     = lambda: self.analyzer.late.copy(),
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalCommand(
+            name        = 'Reset',
+            description = 'Reset the histograms',
+            function    = lambda: self.analyzer.reset(),
+        ))
+
+        self.add(pr.LocalCommand(
+            name        = 'Dump',
+            description = 'Write the histograms as JSON to the file given as argument',
+            value       = '',
+            function    = lambda arg: self.dump(arg),
+        ))
+
+    def _percentile(self, hist, pct):
+        return np.array([1e6*(h.max if pct >= 100 and h.count > 0 else h.percentile(pct)) for h in getattr(self.analyzer, hist)])
+
+    def _prepare(self):
+        self._spanList, *self._decoders = _timestampSpans(self._app)
+
+    def _cycle(self):
+        data, _ = llrf.rawReadPipelined(self._spanList)
+        self.analyzer.add(time.time(), *_decodeTimestamps(self._spanList, data, *self._decoders))
+
+    def dump(self, path=None):
+        """Returns the analyzer state (toDict()), and writes it as JSON to path if given"""
+        ret = self.analyzer.toDict()
+        if path:
+            with open(path, 'w') as f:
+                json.dump(ret, f, indent=2)
+        return ret
@@ -0,0 +1,433 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+#
+# SRP transaction instrumentation.
+#
+# A TransactionProbe sits in the SRP path of a carrier, between the devices
+# and the SRP, and forwards every transaction: poll queue, variable
+# get()/set(), GUI reads, the pipelined and raw reads. While a
+# TransactionMonitor is running, each completed transaction is mapped by
+# address to its block and device, which gives for each block:
+#
+#    issue   : time spent handing the transaction to the SRP (Python and SRP overhead)
+#    latency : time from the request to the completion of the transaction
+#
+# A latency close to the issue time points at Python, a latency much larger
+# than the issue time points at the link/SRP round trip. Transactions that
+# are not at the address of a block (e.g. the raw reads of LinkFaultWatch)
+# are counted under '<device>.raw'. The poll overruns are taken from the
+# variable updates of the Root.
+##############################################################################
+
+import time
+import json
+import queue
+import bisect
+import threading
+import collections
+
+import pyrogue as pr
+import rogue.interfaces.memory as rim
+
+import lcls2_llrf as llrf
+
+# A poll gap longer than this factor times the poll interval is an overrun
+OVERRUN_FACTOR_C = 1.5
+
+# Window of the transaction and byte rates (units of seconds)
+RATE_WINDOW_C = 10.0
+
+def _blockAttr(block, name, default=None):
+    value = getattr(block, name, default)
+    return value() if callable(value) else value
+
+class _BlockStats(object):
+    def __init__(self, device, path, size, pollInterval):
+        self.device       = device
+        self.path         = path
+        self.size         = size
+        self.pollInterval = pollInterval
+        self.reads        = 0
+        self.writes       = 0
+        self.bytes        = 0
+        self.errors       = 0
+        self.overruns     = 0
+        self.lastRead     = None
+        self.latency      = llrf.StreamingHistogram()
+        self.issue        = llrf.StreamingHistogram()
+
+class TransactionProbe(rim.Slave, rim.Master):
+    """
+    Pass-through memory slave/master between the devices of a carrier and
+    its SRP. Each transaction is forwarded as is, and completed from a
+    separate thread when the SRP completes it, so several stay in flight.
+    hook(address, size, type, tStart, tIssued, tDone, error) is called for
+    each completed transaction while set.
+    """
+
+    def __init__(self, srp, maxSize=4096):
+        rim.Slave.__init__(self, 4, maxSize)
+        rim.Master.__init__(self)
+        self._setSlave(srp)
+        self._log     = pr.logInit(cls=self)
+        self._pending = queue.Queue()
+        self._thread  = None
+        self.hook     = None
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._worker, name='TransactionProbe', daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        if self._thread is not None:
+            self._pending.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _doMinAccess(self):
+        return self._reqMinAccess()
+
+    def _doMaxAccess(self):
+        return self._reqMaxAccess()
+
+    def _doTransaction(self, transaction):
+        address = transaction.address()
+        size    = transaction.size()
+        tType   = transaction.type()
+        ba      = bytearray(size)
+
+        if tType != rim.Read:
+            transaction.getData(ba, 0)
+
+        t0  = time.monotonic()
+        tid = self._reqTransaction(address, ba, size, 0, tType)
+        t1  = time.monotonic()
+        self._pending.put((transaction, tid, ba, address, size, tType, t0, t1))
+
+    def _worker(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+
+            transaction, tid, ba, address, size, tType, t0, t1 = item
+            self._waitTransaction(tid)
+            t2  = time.monotonic()
+            err = self._getError()
+
+            if err != '':
+                self._clearError()
+                transaction.error(err)
+            else:
+                if tType == rim.Read or tType == rim.Verify:
+                    transaction.setData(ba, 0)
+                transaction.done()
+
+            hook = self.hook
+            if hook is not None:
+                try:
+                    hook(address, size, tType, t0, t1, t2, err != '')
+                except Exception as e:
+                    pr.logException(self._log, e)
+
+class TransactionMonitor(pr.Device):
+    """
+    Per block and per device SRP transaction counts, bytes, latency and
+    issue time histograms, and poll overruns. probes is a list of
+    (TransactionProbe, device) pairs: the transactions seen by each probe
+    are mapped to the blocks of the device (a carrier, or the Root).
+    The totals are exposed as local variables; dump() and the Dump command
+    give the full per block/device detail as JSON.
+    """
+
+    def __init__(self, probes=(), **kwargs):
+        super().__init__(**kwargs)
+        self._probes = list(probes)
+        self._mLock  = threading.Lock()
+        self._blocks = {}
+        self._raw    = {}
+        self._polled = {}
+        self._active = False
+        self._window = collections.deque()
+        self._tReset = time.monotonic()
+
+        self.add(pr.LocalVariable(
+            name         = 'Transactions',
+            description  = 'Number of transactions since the last reset',
+            mode         = 'RO',
+            value        = 0,
+            localGet     = lambda: sum(b.reads + b.writes for b in self._stats()),
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'TransactionRate',
+            description  = f'Transactions per second over the last {RATE_WINDOW_C:.0f} s',
+            mode         = 'RO',
+            units        = 'Hz',
+            disp         = '{:.1f}',
+            value        = 0.0,
+            localGet     = lambda: self._rates()[0],
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'ByteRate',
+            description  = f'Bytes per second over the last {RATE_WINDOW_C:.0f} s',
+            mode         = 'RO',
+            units        = 'B/s',
+            disp         = '{:.1f}',
+            value        = 0.0,
+            localGet     = lambda: self._rates()[1],
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'Bytes',
+            description  = 'Bytes moved since the last reset',
+            mode         = 'RO',
+            value        = 0,
+            localGet     = lambda: sum(b.bytes for b in self._stats()),
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'LatencyP50',
+            description  = 'Median transaction latency of all the blocks',
+            mode         = 'RO',
+            units        = 'ms',
+            disp         = '{:.3f}',
+            value        = 0.0,
+            localGet     = lambda: 1e3*self._merged('latency').percentile(50),
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'LatencyP99',
+            description  = '99th percentile transaction latency of all the blocks',
+            mode         = 'RO',
+            units        = 'ms',
+            disp         = '{:.3f}',
+            value        = 0.0,
+            localGet     = lambda: 1e3*self._merged('latency').percentile(99),
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'IssueP99',
+            description  = '99th percentile time spent issuing a transaction (Python/SRP overhead)',
+            mode         = 'RO',
+            units        = 'ms',
+            disp         = '{:.3f}',
+            value        = 0.0,
+            localGet     = lambda: 1e3*self._merged('issue').percentile(99),
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'Overruns',
+            description  = f'Polled blocks updated later than {OVERRUN_FACTOR_C} x their poll interval',
+            mode         = 'RO',
+            value        = 0,
+            localGet     = lambda: sum(b.overruns for b in self._stats()),
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = 'Errors',
+            description  = 'Failed transactions',
+            mode         = 'RO',
+            value        = 0,
+            localGet     = lambda: sum(b.errors for b in self._stats()),
+            pollInterval = 1,
+        ))
+
+        self.add(pr.LocalCommand(
+            name        = 'Reset',
+            description = 'Reset the statistics',
+            function    = lambda: self.reset(),
+        ))
+
+        self.add(pr.LocalCommand(
+            name        = 'Dump',
+            description = 'Write the statistics as JSON to the file given as argument',
+            value       = '',
+            function    = lambda arg: self.dump(arg),
+        ))
+
+    def _start(self):
+        super()._start()
+
+        # Map each block to its device and poll interval
+        with self._mLock:
+            for var in self.root.variableList:
+                block = getattr(var, '_block', None)
+                if block is None or not isinstance(var, pr.RemoteVariable):
+                    continue
+                stats = self._blocks.get(id(block))
+                if stats is None:
+                    stats = _BlockStats(
+                        device       = var.parent.path,
+                        path         = _blockAttr(block, 'path', var.path),
+                        size         = int(_blockAttr(block, 'size', 0)),
+                        pollInterval = var.pollInterval,
+                    )
+                    self._blocks[id(block)] = stats
+                elif var.pollInterval > 0:
+                    stats.pollInterval = min(stats.pollInterval, var.pollInterval) if stats.pollInterval > 0 else var.pollInterval
+
+            # All the variables of a block are updated together: one of them tracks its polls
+            seen = set()
+            for var in self.root.variableList:
+                stats = self._blocks.get(id(getattr(var, '_block', None)))
+                if stats is not None and stats.pollInterval > 0 and id(stats) not in seen:
+                    seen.add(id(stats))
+                    self._polled[var.path] = stats
+
+        for probe,dev in self._probes:
+            probe.hook = lambda *args, table=self._addressTable(dev): self._transaction(table, *args)
+
+        self._active = True
+        self.root.addVarListener(func=self._varUpdate)
+
+    def _stop(self):
+        self._active = False
+        for probe,_ in self._probes:
+            probe.hook = None
+        super()._stop()
+
+    def _addressTable(self, dev):
+        """(start addresses, [(end address, stats)], device path) of the blocks of dev, sorted by address"""
+        spans = {}
+        for var in dev.variableList:
+            block = getattr(var, '_block', None)
+            stats = self._blocks.get(id(block))
+            if stats is None:
+                continue
+            start = _blockAttr(block, 'address', var.address)
+            if id(block) in spans:
+                start = min(start, spans[id(block)][0])
+            spans[id(block)] = (start, stats)
+
+        entries = sorted((start, start + max(stats.size, 1), stats) for start,stats in spans.values())
+        return [e[0] for e in entries], [e[1:] for e in entries], dev.path
+
+    ########################################################################
+    # Transaction hook (called by the TransactionProbe of each carrier)
+    ########################################################################
+
+    def _transaction(self, table, address, size, tType, t0, t1, t2, error):
+        starts, entries, path = table
+        i = bisect.bisect_right(starts, address) - 1
+
+        if i >= 0 and address < entries[i][0]:
+            stats = entries[i][1]
+        else:
+            # Not a block of the tree: counted per device
+            device = entries[i][1].device if i >= 0 else path
+            stats  = self._raw.get(device)
+            if stats is None:
+                stats = self._raw.setdefault(device, _BlockStats(device=device, path=f'{device}.raw', size=0, pollInterval=0))
+
+        with self._mLock:
+            if tType == rim.Read:
+                stats.reads += 1
+            else:
+                stats.writes += 1
+            if error:
+                stats.errors += 1
+
+            stats.bytes += size
+            stats.issue.add(t1 - t0)
+            stats.latency.add(t2 - t0)
+            self._window.append((t0, size))
+
+    def _varUpdate(self, path, value):
+        stats = self._polled.get(path)
+        if stats is None or not self._active:
+            return
+
+        t = time.monotonic()
+        with self._mLock:
+            if stats.lastRead is not None and (t - stats.lastRead) > OVERRUN_FACTOR_C*stats.pollInterval:
+                stats.overruns += 1
+            stats.lastRead = t
+
+    ########################################################################
+    # Results
+    ########################################################################
+
+    def _stats(self):
+        return list(self._blocks.values()) + list(self._raw.values())
+
+    def _merged(self, name, stats=None):
+        ret = llrf.StreamingHistogram()
+        for b in (self._stats() if stats is None else stats):
+            ret.merge(getattr(b, name))
+        return ret
+
+    def _rates(self):
+        now = time.monotonic()
+        with self._mLock:
+            while len(self._window) > 0 and self._window[0][0] < now - RATE_WINDOW_C:
+                self._window.popleft()
+            span  = min(RATE_WINDOW_C, now - self._tReset)
+            num   = len(self._window)
+            size  = sum(s for _,s in self._window)
+        return (num / span, size / span) if span > 0 else (0.0, 0.0)
+
+    def reset(self):
+        with self._mLock:
+            for b in self._stats():
+                b.reads    = 0
+                b.writes   = 0
+                b.bytes    = 0
+                b.errors   = 0
+                b.overruns = 0
+                b.latency.reset()
+                b.issue.reset()
+            self._window.clear()
+            self._tReset = time.monotonic()
+
+    def dump(self, path=None):
+        """Returns the statistics per block and per device, and writes them as JSON to path if given"""
+        blocks  = [b for b in self._stats() if (b.reads + b.writes) > 0]
+        devices = collections.defaultdict(list)
+        for b in blocks:
+            devices[b.device].append(b)
+
+        def entry(stats):
+            return {
+                'reads'    : sum(b.reads    for b in stats),
+                'writes'   : sum(b.writes   for b in stats),
+                'bytes'    : sum(b.bytes    for b in stats),
+                'errors'   : sum(b.errors   for b in stats),
+                'overruns' : sum(b.overruns for b in stats),
+                'latency'  : self._merged('latency', stats).summary(),
+                'issue'    : self._merged('issue',   stats).summary(),
+            }
+
+        rates = self._rates()
+        ret = {
+            'time'            : time.time(),
+            'elapsed'         : time.monotonic() - self._tReset,
+            'transactionRate' : rates[0],
+            'byteRate'        : rates[1],
+            'total'           : entry(blocks),
+            'devices'         : {k: entry(v) for k,v in sorted(devices.items())},
+            'blocks'          : {b.path: dict(entry([b]), device=b.device, size=b.size, pollInterval=b.pollInterval,
+                                                latencyHist=b.latency.toDict()) for b in blocks},
+        }
+
+        if path:
+            with open(path, 'w') as f:
+                json.dump(ret, f, indent=2)
+
+        return ret
@@ -0,0 +1,48 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+class VarListenerServer(object):
+    """
+    Base of the interfaces (Root.addInterface()) fed from the poll cycles
+    of a Root. A variable update below dev whose name (without index) is
+    one of names marks the update group, and _update() is called at its
+    end: the values are then taken from the variable cache, so no extra
+    transactions are issued.
+    """
+
+    def __init__(self, *, root, dev, names):
+        self._root   = root
+        self._dev    = dev
+        self._names  = frozenset(names)
+        self._prefix = None
+        self._dirty  = False
+
+    def _start(self):
+        self._prefix = self._dev.path + '.'
+        self._root.addVarListener(func=self._varUpdate, done=self._varDone)
+
+    def _stop(self):
+        self._prefix = None
+
+    def _varUpdate(self, path, value):
+        # Other reads of the same device (fault watch, snapshots) do not match
+        prefix = self._prefix
+        if prefix is not None and path.startswith(prefix) and path.rsplit('.', 1)[-1].split('[')[0] in self._names:
+            self._dirty = True
+
+    def _varDone(self):
+        if not self._dirty or self._prefix is None:
+            return
+        self._dirty = False
+        self._update()
+
+    def _update(self):
+        """Called at the end of each update group with a matching variable"""
+        raise NotImplementedError
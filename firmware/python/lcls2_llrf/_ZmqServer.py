@@ -0,0 +1,118 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+
+import pickle
+import fnmatch
+import threading
+
+import numpy as np
+import rogue.interfaces
+import pyrogue.interfaces
+
+import lcls2_llrf as llrf
+
+class ChangeOnlyZmqServer(pyrogue.interfaces.ZmqServer):
+    """
+    ZmqServer that only publishes the variables whose value changed.
+
+    Its own listener (addVarListener) takes the place of the one of the
+    base server: the updates of one poll cycle (one update group) are
+    still sent as a single message, without the entries whose value is
+    unchanged since the last publication. deadbands maps path patterns
+    (fnmatch) to a deadband: a new value is only published when it moved
+    by more than the deadband from the last published value. The packed
+    BsaData words are compared per 16-bit I/Q half. Every keyframe
+    seconds (0 to disable) a timer sends the latest value of every
+    variable again, polling or not, so late-joining clients resynchronise
+    and get what the deadbands held back.
+    """
+
+    def __init__(self, *, root, deadbands=None, keyframe=0.0, incGroups=None, excGroups=['NoServe'], **kwargs):
+        super().__init__(root=root, incGroups=incGroups, excGroups=excGroups, **kwargs)
+        self._coRoot    = root
+        self._coGroups  = (incGroups, excGroups)
+        self._deadbands = dict(deadbands) if deadbands is not None else {}
+        self._keyframe  = keyframe
+        self._lastPub   = {}
+        self._latest    = {}
+        self._pending   = {}
+        self._dbCache   = {}
+        self._lock      = threading.Lock()
+        self._timer     = None
+        self._timerStop = threading.Event()
+        self.published  = 0
+        self.suppressed = 0
+
+    def _start(self):
+        # The rogue server only: the listener below replaces the base one
+        rogue.interfaces.ZmqServer._start(self)
+        self._coRoot.addVarListener(func=self._changeUpdate, done=self._changeDone, incGroups=self._coGroups[0], excGroups=self._coGroups[1])
+
+        if self._keyframe > 0.0:
+            self._timerStop.clear()
+            self._timer = threading.Thread(target=self._keyframeLoop, name='ZmqKeyframe', daemon=True)
+            self._timer.start()
+
+    def _stop(self):
+        if self._timer is not None:
+            self._timerStop.set()
+            self._timer.join()
+            self._timer = None
+        super()._stop()
+
+    def _deadband(self, path):
+        if path not in self._dbCache:
+            self._dbCache[path] = next((db for pat,db in self._deadbands.items() if fnmatch.fnmatchcase(path, pat)), 0)
+        return self._dbCache[path]
+
+    def _changed(self, path, old, new):
+        db = self._deadband(path)
+
+        if isinstance(new, np.ndarray) or isinstance(old, np.ndarray):
+            if np.shape(old) != np.shape(new):
+                return True
+            if db <= 0:
+                return not np.array_equal(old, new)
+        elif db <= 0 or not isinstance(new, (int, float, np.number)) or isinstance(new, bool):
+            return old != new
+
+        if 'BsaData' in path:
+            return bool(np.any(np.abs(llrf.splitBsaData(new) - llrf.splitBsaData(old)) > db))
+        return bool(np.any(np.abs(np.asarray(new, dtype=np.float64) - np.asarray(old, dtype=np.float64)) > db))
+
+    def _changeUpdate(self, path, value):
+        with self._lock:
+            self._latest[path] = value
+            old = self._lastPub.get(path)
+
+            if old is not None and not self._changed(path, old.value, value.value):
+                self.suppressed += 1
+                return
+
+            self._lastPub[path] = value
+            self._pending[path] = value
+            self.published += 1
+
+    def _changeDone(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        # Called with the lock held, one message per update group or keyframe
+        if len(self._pending) > 0:
+            self._publish(pickle.dumps(self._pending))
+            self._pending = {}
+
+    def _keyframeLoop(self):
+        while not self._timerStop.wait(self._keyframe):
+            with self._lock:
+                self._lastPub.update(self._latest)
+                self._pending.update(self._latest)
+                self._flush()
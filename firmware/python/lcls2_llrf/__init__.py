@@ -1,6 +1,30 @@
 #!/usr/bin/env python
 
-from lcls2_llrf._BsaMpsMsgRxCore    import *
-from lcls2_llrf._BsaMpsMsgRxCombine import *
-from lcls2_llrf._Application        import *
-from lcls2_llrf._Root               import *
+from lcls2_llrf._PollClass               import *
+from lcls2_llrf._RegisterMap             import *
+from lcls2_llrf._StreamingHistogram      import *
+from lcls2_llrf._BsaMpsMsgRxFramerPkg    import *
+from lcls2_llrf._BsaMpsMsgRxFramerModel  import *
+from lcls2_llrf._BsaMpsMsgStimulus       import *
+from lcls2_llrf._BsaMpsMsgRxCombineModel import *
+from lcls2_llrf._CounterSnapshot         import *
+from lcls2_llrf._BsaMpsMsgRxCore         import *
+from lcls2_llrf._BsaMpsMsgRxCombine      import *
+from lcls2_llrf._BsaMpsMsgRxEmulator     import *
+from lcls2_llrf._PipelinedRead           import *
+from lcls2_llrf._VarListenerServer       import *
+from lcls2_llrf._PeriodicDevice          import *
+from lcls2_llrf._LinkConfig              import *
+from lcls2_llrf._BsaRingFile             import *
+from lcls2_llrf._DiagBusShm              import *
+from lcls2_llrf._Snapshot                import *
+from lcls2_llrf._BsaRollup               import *
+from lcls2_llrf._LinkFaultWatch          import *
+from lcls2_llrf._TimestampAnalyzer       import *
+from lcls2_llrf._MpsPermitLog            import *
+from lcls2_llrf._PromUpdate              import *
+from lcls2_llrf._TransactionMonitor      import *
+from lcls2_llrf._ZmqServer               import *
+from lcls2_llrf._Application             import *
+from lcls2_llrf._Root                    import *
+from lcls2_llrf._FleetRoot               import *
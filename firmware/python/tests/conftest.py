@@ -0,0 +1,29 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+# Same library paths as software/scripts/setupLibPaths.py. The tests need
+# pyrogue and the submodules, and are skipped without them.
+import os
+
+try:
+    import pyrogue as pr
+except ImportError:
+    pr = None
+
+# Without pyrogue nothing can be imported: collect no test
+if pr is None:
+    collect_ignore_glob = ['test_*.py']
+
+else:
+    top_level = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')) + '/'
+
+    pr.addLibraryPath(top_level+'firmware/submodules/surf/python')
+    pr.addLibraryPath(top_level+'firmware/submodules/amc-carrier-core/python')
+    pr.addLibraryPath(top_level+'firmware/submodules/lcls-timing-core/python')
+    pr.addLibraryPath(top_level+'firmware/python')
@@ -0,0 +1,22 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+import lcls2_llrf as llrf
+
+def test_drops_counted_between_close_transactions():
+    emu = llrf.BsaMpsMsgRxEmulator(pktRate=1000.0, seed=0)
+    emu.setLinkUp(1, False)
+
+    # 1000 transactions a quarter of a message period apart
+    now = emu._tLast
+    for n in range(1, 1001):
+        emu._advance(now + n*0.25e-3)
+
+    assert emu._dropCnt[0] == 0
+    assert emu._dropCnt[1] in (249, 250)
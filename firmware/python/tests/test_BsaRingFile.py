@@ -0,0 +1,60 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+import numpy as np
+
+import lcls2_llrf as llrf
+
+def _fill(writer, num):
+    for n in range(num):
+        writer.append({'time': float(n), 'localTimestamp': n})
+
+def test_chunks_across_ring_rollover(tmp_path):
+    # 1000 is not a multiple of 300: chunks 3 and 4 cross the end of the ring
+    writer = llrf.BsaRingWriter(str(tmp_path / 'ring.bin'), capacity=1000, chunkDir=str(tmp_path / 'chunks'), chunkSize=300)
+    _fill(writer, 1500)
+    writer.close()
+
+    rec = llrf.readChunks(str(tmp_path / 'chunks'))
+    assert len(rec) == 1500
+    np.testing.assert_array_equal(rec['localTimestamp'], np.arange(1500))
+
+def test_reader_across_ring_rollover(tmp_path):
+    path   = str(tmp_path / 'ring.bin')
+    writer = llrf.BsaRingWriter(path, capacity=1000)
+    _fill(writer, 1500)
+    writer.flush()
+
+    # The oldest slot (record 500) is the next one the writer fills
+    reader = llrf.BsaRingReader(path)
+    rec, nxt = reader.read(since=0)
+    assert nxt == 1500
+    np.testing.assert_array_equal(rec['localTimestamp'], np.arange(501, 1500))
+    np.testing.assert_array_equal(reader.latest(3)['localTimestamp'], [1497, 1498, 1499])
+
+    # Returned records are copies: the writer going round does not change them
+    _fill(writer, 10)
+    np.testing.assert_array_equal(rec['localTimestamp'][0:3], [501, 502, 503])
+    writer.close()
+
+def test_reader_drops_records_overwritten_during_copy(tmp_path, monkeypatch):
+    path   = str(tmp_path / 'ring.bin')
+    writer = llrf.BsaRingWriter(path, capacity=100)
+    _fill(writer, 150)
+    writer.flush()
+
+    # The writer appends 5 records between the two writeIndex reads
+    reader = llrf.BsaRingReader(path)
+    index  = iter([150, 155])
+    monkeypatch.setattr(llrf.BsaRingReader, 'writeIndex', property(lambda self: next(index)))
+
+    rec, nxt = reader.read(since=0)
+    assert nxt == 150
+    np.testing.assert_array_equal(rec['localTimestamp'], np.arange(56, 150))
+    writer.close()
@@ -0,0 +1,73 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+import types
+
+import numpy as np
+import pytest
+
+import lcls2_llrf as llrf
+
+class _Value(object):
+    def __init__(self, value):
+        self._value = value
+
+    def value(self):
+        return self._value
+
+    def set(self, value):
+        self._value = value
+
+def _core(rollOverEn):
+    """Stand-in for the BsaMpsMsgRxCore variables used by CounterSnapshot"""
+    return types.SimpleNamespace(
+        StatusCnt      = types.SimpleNamespace(onRead=None),
+        RollOverEn     = _Value(rollOverEn),
+        StatusCntRate  = _Value(None),
+        StatusCntTotal = _Value(None),
+    )
+
+def _counts(first, rest=0):
+    return [first] + [rest]*(len(llrf.STATUS_CNT_C) - 1)
+
+def test_wrapping_counter_unwrapped():
+    core = _core(rollOverEn=0x1)
+    snap = llrf.CounterSnapshot(core)
+
+    core.StatusCnt.onRead(_counts(0xFFFFFFFE), 10.0)
+    core.StatusCnt.onRead(_counts(3), 12.0)
+
+    assert snap.total[0] == 0xFFFFFFFE + 5
+    assert snap.rate[0] == pytest.approx(2.5)
+    np.testing.assert_array_equal(core.StatusCntTotal.value(), snap.total)
+
+def test_saturating_counter_decrease_is_a_reset():
+    core = _core(rollOverEn=0x0)
+    snap = llrf.CounterSnapshot(core)
+
+    core.StatusCnt.onRead(_counts(100, 0xFFFFFFFF), 10.0)
+    core.StatusCnt.onRead(_counts(4, 0xFFFFFFFF), 11.0)
+
+    assert snap.total[0] == 104
+    assert snap.rate[0] == pytest.approx(4.0)
+    assert snap.saturated[1]
+
+def test_reset_before_cleared_counters():
+    core = _core(rollOverEn=0x1)
+    snap = llrf.CounterSnapshot(core)
+
+    core.StatusCnt.onRead(_counts(1000), 10.0)
+    snap.reset()
+    core.StatusCnt.onRead(_counts(0), 11.0)
+    core.StatusCnt.onRead(_counts(2), 12.0)
+
+    # Without the reset, 1000 -> 0 would unwrap to about 2^32
+    assert snap.total[0] == 2
+    assert snap.rate[0] == pytest.approx(2.0)
+    assert snap.prevTime == 11.0
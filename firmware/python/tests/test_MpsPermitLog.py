@@ -0,0 +1,33 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+import numpy as np
+
+import lcls2_llrf as llrf
+
+def test_reopen_after_partial_record(tmp_path):
+    path = str(tmp_path / 'permits.bin')
+
+    log = llrf.MpsPermitLog(path=path)
+    log.addCore(1.0, [0xFF, 0xFF, 0xFF, 0xFF])
+    log.close()
+
+    # A crash in the middle of a write
+    with open(path, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+
+    log = llrf.MpsPermitLog(path=path)
+    assert len(log) == 16
+    log.addCore(2.0, [0xFC, 0xFF, 0xFF, 0xFF])
+    log.close()
+
+    ev = llrf.readPermitLog(path)
+    assert len(ev) == 17
+    assert tuple(ev[-1]) == (2.0, 0, 0, 3, 0)
+    np.testing.assert_array_equal(llrf.MpsPermitLog(path=path).valueAt(1.5), np.full((4, 4), 3))
@@ -0,0 +1,43 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+import time
+import threading
+
+import lcls2_llrf as llrf
+
+class _Device(llrf.PeriodicDevice):
+    def __init__(self, **kwargs):
+        super().__init__(name='Dut', rate=1000.0, **kwargs)
+        self.fail   = True
+        self.cycled = threading.Event()
+
+    def _prepare(self):
+        if self.fail:
+            raise RuntimeError('prepare failed')
+
+    def _cycle(self):
+        self.cycled.set()
+
+def test_restart_after_prepare_failure():
+    dev = _Device()
+
+    dev.Enable.set(True)
+    tEnd = time.monotonic() + 5.0
+    while dev.Enable.value() and time.monotonic() < tEnd:
+        time.sleep(0.01)
+    assert dev.Enable.value() is False
+    assert dev._thread is None
+
+    # Setting Enable again starts a new loop
+    dev.fail = False
+    dev.Enable.set(True)
+    assert dev.cycled.wait(5.0)
+    dev.Enable.set(False)
+    assert dev._thread is None
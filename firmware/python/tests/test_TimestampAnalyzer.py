@@ -0,0 +1,58 @@
+##############################################################################
+## This file is part of 'LCLS2 LLRF Firmware'.
+## It is subject to the license terms in the LICENSE.txt file found in the
+## top-level directory of this distribution and at:
+##    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+## No part of 'LCLS2 LLRF Firmware', including this file,
+## may be copied, modified, propagated, or distributed except according to
+## the terms contained in the LICENSE.txt file.
+##############################################################################
+import numpy as np
+import pytest
+
+import lcls2_llrf as llrf
+
+# A timing timestamp in 2026: too large to resolve nanoseconds as float64 seconds
+SEC_C = 1100000000
+
+def _stamp(sec, nsec):
+    return np.uint64((sec << 32) | nsec)
+
+def test_timing_diff_resolves_nanoseconds():
+    local = _stamp(SEC_C, 500)
+    assert llrf.timingDiff(local, _stamp(SEC_C, 400)) == pytest.approx(100e-9, rel=1e-9)
+    assert llrf.timingDiff(local, _stamp(SEC_C, 200)) == pytest.approx(300e-9, rel=1e-9)
+
+    # Across a second boundary, in both directions
+    assert llrf.timingDiff(_stamp(SEC_C + 1, 100), _stamp(SEC_C, 999999900)) == pytest.approx(200e-9, rel=1e-9)
+    assert llrf.timingDiff(_stamp(SEC_C, 999999900), _stamp(SEC_C + 1, 100)) == pytest.approx(-200e-9, rel=1e-9)
+
+def test_signed_skew_percentiles():
+    ana    = llrf.TimestampAnalyzer()
+    local  = _stamp(SEC_C, 1000)
+    skews  = [100, 300, -200, 300]
+    remote = [_stamp(SEC_C, 1000 - s) for s in skews]
+
+    for n in range(100):
+        ana.add(float(n), local, remote, remote)
+
+    # Stations ahead of the local timing are late
+    np.testing.assert_array_equal(ana.late, [0, 0, 100, 0])
+
+    # Percentiles within one bin (20 per decade) of the skews
+    for i,s in enumerate(skews):
+        for hist in [ana.skew[i], ana.coreSkew[i]]:
+            assert hist.count == 100
+            assert hist.percentile(50) == pytest.approx(s*1e-9, rel=0.13)
+            assert hist.min == pytest.approx(s*1e-9, rel=1e-6)
+
+def test_signed_percentiles_rank_negative_first():
+    hist = llrf.SignedStreamingHistogram(1e-9, 1e3, 20)
+    hist.addArray(np.concatenate([np.full(10, -1e-6), np.full(80, 1e-7), np.full(10, 1e-5)]))
+
+    assert hist.percentile(5)  == pytest.approx(-1e-6, rel=0.13)
+    assert hist.percentile(50) == pytest.approx(1e-7,  rel=0.13)
+    assert hist.percentile(95) == pytest.approx(1e-5,  rel=0.13)
+
+    ret = llrf.SignedStreamingHistogram.fromDict(hist.toDict())
+    assert ret.percentile(5) == hist.percentile(5)
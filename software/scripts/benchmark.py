@@ -0,0 +1,246 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS2 AMC Carrier Firmware'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS2 AMC Carrier Firmware', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+#
+# Register access benchmarks of the lcls2_llrf tree against the in-process
+# register emulator (no carrier needed). Results are written as JSON and
+# can be compared against a previous run:
+#
+#    python scripts/benchmark.py --output new.json --compare baseline.json
+#
+#-----------------------------------------------------------------------------
+import setupLibPaths
+
+import sys
+import time
+import json
+import socket
+import platform
+import argparse
+import threading
+import subprocess
+
+import numpy as np
+
+import rogue
+import pyrogue as pr
+import pyrogue.interfaces
+
+import lcls2_llrf as amcCarrier
+
+#################################################################
+
+# Set the argument parser
+parser = argparse.ArgumentParser(description='lcls2_llrf register access benchmarks')
+
+# Add arguments
+parser.add_argument(
+    "--emuLatency",
+    type     = float,
+    nargs    = '+',
+    required = False,
+    default  = [0.0, 0.0005],
+    help     = "Emulated per-transaction latencies to run (units of seconds)",
+)
+
+parser.add_argument(
+    "--repeat",
+    type     = int,
+    required = False,
+    default  = 5,
+    help     = "Number of repetitions of each measurement",
+)
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "JSON file for the results",
+)
+
+parser.add_argument(
+    "--compare",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "JSON file of a previous run to compare against",
+)
+
+parser.add_argument(
+    "--tolerance",
+    type     = float,
+    required = False,
+    default  = 0.2,
+    help     = "Relative slowdown (median) reported as a regression in the comparison",
+)
+
+#################################################################
+
+def stats(samples):
+    s = np.asarray(samples, dtype=np.float64)
+    return {
+        'n'      : int(len(s)),
+        'median' : float(np.median(s)),
+        'mean'   : float(s.mean()),
+        'min'    : float(s.min()),
+        'max'    : float(s.max()),
+    }
+
+def timed(func, repeat):
+    ret = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        ret.append(time.perf_counter() - t0)
+    return ret
+
+def makeRoot(latency, blockRead=True, zmqSrvEn=False):
+    return amcCarrier.Root(
+        emulate        = True,
+        emuLatency     = latency,
+        zmqSrvEn       = zmqSrvEn,
+        pollEn         = False,
+        initRead       = False,
+        amcCarrierCore = 'none',
+        blockRead      = blockRead,
+    )
+
+def pollCycle(root):
+    """All the polled blocks, started together then checked (as the poll queue does)"""
+    blocks = [v for v in root.Application.variableList if isinstance(v, pr.RemoteVariable) and v.pollInterval > 0]
+    return lambda: amcCarrier.readPipelined(blocks, maxInFlight=len(blocks))
+
+def sequentialRead(root):
+    """One transaction at a time, waiting for each before the next"""
+    return lambda: amcCarrier.readPipelined([root.Application], maxInFlight=1)
+
+def counterRead(root):
+    """The ten status counters of one core, by name"""
+    core = root.Application.BsaMpsMsgRxCore[0]
+    return lambda: [core.node(n).get(read=True) for n,_ in amcCarrier.STATUS_CNT_C]
+
+def bsaRead(root):
+    """The 32 BsaData and BsaSevr values of the combiner"""
+    comb = root.Application.BsaMpsMsgRxCombine
+    if hasattr(comb, 'BsaBlock'):
+        return lambda: comb.BsaBlock.get(read=True)
+    return lambda: ([comb.BsaData[i].get(read=True) for i in range(32)] +
+                    [comb.BsaSevr[i].get(read=True) for i in range(32)])
+
+def zmqLatency(root, repeat):
+    """Time from a variable update in the server to its delivery to a ZMQ client"""
+    done  = threading.Event()
+    state = {}
+
+    def cb(path, value):
+        if path.endswith('InitReadTime') and value.value == state.get('expect'):
+            state['t1'] = time.perf_counter()
+            done.set()
+
+    client = pyrogue.interfaces.SimpleClient(addr='localhost', port=root.zmqServer.port(), cb=cb)
+    ret = []
+    try:
+        for i in range(repeat):
+            done.clear()
+            state['expect'] = float(i + 1)
+            t0 = time.perf_counter()
+            root.InitReadTime.set(float(i + 1))
+            if done.wait(5.0):
+                ret.append(state['t1'] - t0)
+    finally:
+        client._stop()
+    return ret
+
+def runLatency(latency, repeat):
+    res = {}
+
+    for blockRead in [True, False]:
+        tag = 'block' if blockRead else 'scalar'
+
+        # Tree construction
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            root = makeRoot(latency, blockRead)
+            samples.append(time.perf_counter() - t0)
+            del root
+        res[f'build.{tag}'] = stats(samples)
+
+        with makeRoot(latency, blockRead) as root:
+            res[f'initRead.pipelined.{tag}']  = stats(timed(lambda: root.Application.readPipelined(), repeat))
+            res[f'initRead.sequential.{tag}'] = stats(timed(sequentialRead(root), repeat))
+            res[f'pollCycle.{tag}']           = stats(timed(pollCycle(root), repeat))
+            res[f'counters.{tag}']            = stats(timed(counterRead(root), repeat))
+            res[f'bsa.{tag}']                 = stats(timed(bsaRead(root), repeat))
+
+    with makeRoot(latency, zmqSrvEn=True) as root:
+        samples = zmqLatency(root, repeat)
+        if len(samples) > 0:
+            res['zmqPublish'] = stats(samples)
+
+    return res
+
+def gitDescribe():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ''
+
+def compare(new, old, tolerance):
+    """Print the median ratios new/old, returns the number of regressions"""
+    regressions = 0
+    print(f'{"benchmark":<48} {"old (ms)":>10} {"new (ms)":>10} {"ratio":>7}')
+    for lat,res in new['results'].items():
+        for name,s in res.items():
+            ref = old['results'].get(lat, {}).get(name)
+            if ref is None:
+                continue
+            ratio = s['median'] / ref['median'] if ref['median'] > 0 else float('inf')
+            flag  = ''
+            if ratio > 1.0 + tolerance:
+                flag = ' REGRESSION'
+                regressions += 1
+            print(f'{lat + ":" + name:<48} {1e3*ref["median"]:>10.3f} {1e3*s["median"]:>10.3f} {ratio:>7.2f}{flag}')
+    return regressions
+
+#################################################################
+
+if __name__ == "__main__":
+
+    # Get the arguments
+    args = parser.parse_args()
+
+    out = {
+        'meta' : {
+            'time'     : time.time(),
+            'host'     : socket.gethostname(),
+            'python'   : platform.python_version(),
+            'rogue'    : rogue.Version.current(),
+            'git'      : gitDescribe(),
+            'repeat'   : args.repeat,
+        },
+        'results' : {},
+    }
+
+    for latency in args.emuLatency:
+        key = f'latency={latency:g}'
+        print(f'Running {key}')
+        out['results'][key] = runLatency(latency, args.repeat)
+        for name,s in out['results'][key].items():
+            print(f'    {name:<32} median {1e3*s["median"]:9.3f} ms   min {1e3*s["min"]:9.3f} ms')
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(out, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        sys.exit(1 if compare(out, old, args.tolerance) > 0 else 0)
@@ -0,0 +1,139 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS2 AMC Carrier Firmware'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS2 AMC Carrier Firmware', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+
+import sys
+import time
+import signal
+import argparse
+
+import pyrogue as pr
+
+import lcls2_llrf as amcCarrier
+
+#################################################################
+
+# Convert str to bool
+argBool = lambda s: s.lower() in ['true', 't', 'yes', '1']
+
+# Set the argument parser
+parser = argparse.ArgumentParser(description='Headless BSA/MPS logger to a memory-mapped ring file')
+
+# Add arguments
+parser.add_argument(
+    "--backdoorComm",
+    type     = argBool,
+    required = False,
+    default  = True,
+    help     = "communication type",
+)
+
+parser.add_argument(
+    "--ip",
+    type     = str,
+    required = False,
+    default  = '10.0.0.107',
+    help     = "IP address",
+)
+
+parser.add_argument(
+    "--emulate",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "Use the in-process register emulator instead of a carrier",
+)
+
+parser.add_argument(
+    "--ring",
+    type     = str,
+    required = True,
+    help     = "Path of the ring file",
+)
+
+parser.add_argument(
+    "--capacity",
+    type     = int,
+    required = False,
+    default  = 1<<20,
+    help     = "Number of records in the ring file",
+)
+
+parser.add_argument(
+    "--period",
+    type     = float,
+    required = False,
+    default  = 1.0,
+    help     = "Time between records (units of seconds)",
+)
+
+parser.add_argument(
+    "--chunkDir",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "Directory for the compressed chunk files (no rollover if not set)",
+)
+
+parser.add_argument(
+    "--chunkSize",
+    type     = int,
+    required = False,
+    default  = 1<<16,
+    help     = "Number of records per compressed chunk file",
+)
+
+# Get the arguments
+args = parser.parse_args()
+
+#################################################################
+
+run = True
+
+def stopHandler(sig, frame):
+    global run
+    run = False
+
+signal.signal(signal.SIGINT,  stopHandler)
+signal.signal(signal.SIGTERM, stopHandler)
+
+writer = amcCarrier.BsaRingWriter(
+    path      = args.ring,
+    capacity  = args.capacity,
+    chunkDir  = args.chunkDir,
+    chunkSize = args.chunkSize,
+)
+
+with amcCarrier.Root(
+    ip             = args.ip,
+    backdoorComm   = args.backdoorComm,
+    emulate        = args.emulate,
+    zmqSrvEn       = False,
+    pollEn         = False,
+    initRead       = False,
+    amcCarrierCore = 'none',
+) as root:
+
+    print(f'Logging to {args.ring} ({args.capacity} records) from index {writer.writeIndex}')
+
+    tNext = time.monotonic()
+    while run:
+        try:
+            writer.append(amcCarrier.readBsaRecord(root.Application))
+        except Exception as e:
+            print(f'Read failed: {e}', file=sys.stderr)
+
+        # Skip the missed periods instead of catching up in a burst
+        tNext = max(tNext + args.period, time.monotonic())
+        time.sleep(max(tNext - time.monotonic(), 0.0))
+
+writer.close()
+
+#################################################################
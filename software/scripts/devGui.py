@@ -59,16 +59,125 @@ parser.add_argument(
     help     = "Enable read all variables at start",
 )
 
+parser.add_argument(
+    "--emulate",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "Use the in-process register emulator instead of a carrier",
+)
+
+parser.add_argument(
+    "--emuLatency",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Emulated per-transaction latency (units of seconds)",
+)
+
+parser.add_argument(
+    "--pollClass",
+    type     = str,
+    required = False,
+    default  = '',
+    help     = "Poll interval overrides in seconds, e.g. fast=1,health=5,slow=30,onDemand=0",
+)
+
+parser.add_argument(
+    "--amcCarrierCore",
+    type     = str,
+    required = False,
+    default  = 'full',
+    choices  = ['full', 'lazy', 'none'],
+    help     = "AmcCarrierCore tree: full, lazy (built on first access) or none (initRead limited to the LLRF application)",
+)
+
+parser.add_argument(
+    "--txnMonitor",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "Include the SRP transaction latency/throughput monitor",
+)
+
+parser.add_argument(
+    "--zmqChangeOnly",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "Only publish the variables that changed to the ZMQ clients",
+)
+
+parser.add_argument(
+    "--bsaDeadband",
+    type     = int,
+    required = False,
+    default  = 0,
+    help     = "Deadband of the BsaData I/Q halves with --zmqChangeOnly (0 = publish any change)",
+)
+
+parser.add_argument(
+    "--zmqKeyframe",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Full refresh period with --zmqChangeOnly (units of seconds, 0 = off)",
+)
+
+parser.add_argument(
+    "--diagShm",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "Shared-memory file for the diagnostic bus snapshot of each poll (e.g. /dev/shm/lcls2_llrf_diag)",
+)
+
+parser.add_argument(
+    "--faultWatch",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Rate of the link fault watch loop (units of Hz, 0 = off)",
+)
+
+parser.add_argument(
+    "--tsMonitor",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Sample rate of the remote/local timestamp monitor (units of Hz, 0 = off)",
+)
+
+parser.add_argument(
+    "--permitLog",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "Append-only file of the MPS permit transitions ('' = in memory only)",
+)
+
 # Get the arguments
 args = parser.parse_args()
 
 #################################################################
 
 with amcCarrier.Root(
-    ip           = args.ip,
-    backdoorComm = args.backdoorComm,
-    pollEn       = args.pollEn,
-    initRead     = args.initRead,
+    ip             = args.ip,
+    backdoorComm   = args.backdoorComm,
+    pollEn         = args.pollEn,
+    initRead       = args.initRead,
+    emulate        = args.emulate,
+    emuLatency     = args.emuLatency,
+    pollClass      = amcCarrier.parsePollClass(args.pollClass),
+    amcCarrierCore = args.amcCarrierCore,
+    txnMonitor     = args.txnMonitor,
+    zmqChangeOnly  = args.zmqChangeOnly,
+    zmqDeadbands   = {'*.BsaData*': args.bsaDeadband},
+    zmqKeyframe    = args.zmqKeyframe,
+    diagShm        = args.diagShm,
+    faultWatch     = args.faultWatch,
+    tsMonitor      = args.tsMonitor,
+    permitLog      = args.permitLog,
 ) as root:
     pyrogue.pydm.runPyDM(
         serverList = root.zmqServer.address,
@@ -0,0 +1,146 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS2 AMC Carrier Firmware'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS2 AMC Carrier Firmware', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+
+import sys
+import time
+import signal
+import argparse
+
+import pyrogue as pr
+
+import lcls2_llrf as amcCarrier
+
+#################################################################
+
+# Convert str to bool
+argBool = lambda s: s.lower() in ['true', 't', 'yes', '1']
+
+# Set the argument parser
+parser = argparse.ArgumentParser(description='Monitor many carriers from one process behind one ZMQ server')
+
+# Add arguments
+parser.add_argument(
+    "--backdoorComm",
+    type     = argBool,
+    required = False,
+    default  = True,
+    help     = "communication type",
+)
+
+parser.add_argument(
+    "--ip",
+    type     = str,
+    nargs    = '*',
+    required = False,
+    default  = [],
+    help     = "IP addresses of the carriers",
+)
+
+parser.add_argument(
+    "--ipFile",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "File with one carrier IP address per line ('#' starts a comment)",
+)
+
+parser.add_argument(
+    "--emulate",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "Use the in-process register emulator instead of the carriers",
+)
+
+parser.add_argument(
+    "--pollEn",
+    type     = argBool,
+    required = False,
+    default  = True,
+    help     = "Enable auto-polling",
+)
+
+parser.add_argument(
+    "--pollClass",
+    type     = str,
+    required = False,
+    default  = '',
+    help     = "Poll interval overrides in seconds, e.g. fast=1,health=5,slow=30,onDemand=0",
+)
+
+parser.add_argument(
+    "--serverAddr",
+    type     = str,
+    required = False,
+    default  = '*',
+    help     = "ZMQ server bind address",
+)
+
+parser.add_argument(
+    "--serverPort",
+    type     = int,
+    required = False,
+    default  = 9099,
+    help     = "ZMQ server base port",
+)
+
+parser.add_argument(
+    "--summary",
+    type     = float,
+    required = False,
+    default  = 10.0,
+    help     = "Period of the printed link summary (units of seconds, 0 to disable)",
+)
+
+# Get the arguments
+args = parser.parse_args()
+
+ips = list(args.ip)
+if args.ipFile is not None:
+    with open(args.ipFile) as f:
+        ips += [l.split('#')[0].strip() for l in f if l.split('#')[0].strip() != '']
+
+if len(ips) == 0:
+    parser.error('no carrier given, use --ip and/or --ipFile')
+
+#################################################################
+
+run = True
+
+def stopHandler(sig, frame):
+    global run
+    run = False
+
+signal.signal(signal.SIGINT,  stopHandler)
+signal.signal(signal.SIGTERM, stopHandler)
+
+with amcCarrier.FleetRoot(
+    ips          = ips,
+    backdoorComm = args.backdoorComm,
+    emulate      = args.emulate,
+    pollEn       = args.pollEn,
+    initRead     = True,
+    pollClass    = amcCarrier.parsePollClass(args.pollClass),
+    zmqSrvAddr   = args.serverAddr,
+    zmqSrvPort   = args.serverPort,
+) as root:
+
+    print(f'Monitoring {len(ips)} carriers, ZMQ server at {root.zmqServer.address}')
+
+    tNext = time.monotonic()
+    while run:
+        if args.summary > 0.0 and time.monotonic() >= tNext:
+            tNext = time.monotonic() + args.summary
+            for entry in root.summary():
+                print(f"{entry['Ip']:>15} : RxLinkUp={entry['RxLinkUp']} PacketRate={entry['PacketRate']} RemoteDropCnt={entry['RemoteDropCnt']}")
+        time.sleep(0.1)
+
+#################################################################
@@ -0,0 +1,45 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS2 AMC Carrier Firmware'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS2 AMC Carrier Firmware', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+#
+# Recompile the register tables shipped in lcls2_llrf/_RegisterTables.py
+# after a change of firmware/common/AppCommon/yaml (needs PyYAML):
+#
+#    python scripts/genRegisterMap.py
+#
+#-----------------------------------------------------------------------------
+import setupLibPaths
+
+import argparse
+
+import lcls2_llrf as amcCarrier
+
+#################################################################
+
+# Set the argument parser
+parser = argparse.ArgumentParser(description='Register table generator')
+
+# Add arguments
+parser.add_argument(
+    "--yamlDir",
+    type     = str,
+    required = False,
+    default  = amcCarrier.YAML_DIR_C,
+    help     = "Directory of the register map YAML files",
+)
+
+#################################################################
+
+if __name__ == "__main__":
+
+    # Get the arguments
+    args = parser.parse_args()
+
+    amcCarrier.writeRegisterTables(yamlDir=args.yamlDir)
+    print(f'Wrote the tables of {", ".join(amcCarrier.REGISTER_MAP_FILES_C)}')
@@ -0,0 +1,154 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS2 AMC Carrier Firmware'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS2 AMC Carrier Firmware', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+#
+# Generate a BsaMpsMsg link stimulus file for the simulation testbenches:
+#
+#    python scripts/genStimulus.py --num 100000 --crcErrRate 1e-3 --output stim.txt
+#
+#-----------------------------------------------------------------------------
+import setupLibPaths
+
+import argparse
+
+import numpy as np
+
+import lcls2_llrf as amcCarrier
+
+#################################################################
+
+# Set the argument parser
+parser = argparse.ArgumentParser(description='BsaMpsMsg link stimulus generator')
+
+# Add arguments
+parser.add_argument(
+    "--num",
+    type     = int,
+    required = False,
+    default  = 10000,
+    help     = "Number of messages",
+)
+
+parser.add_argument(
+    "--msgRate",
+    type     = float,
+    required = False,
+    default  = 1.0e6,
+    help     = "Message rate (units of Hz)",
+)
+
+parser.add_argument(
+    "--wordRate",
+    type     = float,
+    required = False,
+    default  = 185.714286e6,
+    help     = "Link word rate (units of 16-bit words per second)",
+)
+
+parser.add_argument(
+    "--t0",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Timestamp of the first message (units of seconds)",
+)
+
+parser.add_argument(
+    "--sevrProb",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Probability of a non-zero BSA severity",
+)
+
+parser.add_argument(
+    "--permitProb",
+    type     = float,
+    required = False,
+    default  = 1.0,
+    help     = "Probability of an MPS permit",
+)
+
+parser.add_argument(
+    "--crcErrRate",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Fraction of the frames with a CRC error",
+)
+
+parser.add_argument(
+    "--lenErrRate",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Fraction of the frames with a length error",
+)
+
+parser.add_argument(
+    "--dropRate",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Fraction of the frames dropped",
+)
+
+parser.add_argument(
+    "--seed",
+    type     = int,
+    required = False,
+    default  = None,
+    help     = "Random seed",
+)
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = True,
+    help     = "Stimulus file (.npy for NumPy format, else text)",
+)
+
+#################################################################
+
+if __name__ == "__main__":
+
+    # Get the arguments
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    msg = amcCarrier.generateMsg(
+        num        = args.num,
+        msgRate    = args.msgRate,
+        t0         = args.t0,
+        sevrProb   = args.sevrProb,
+        permitProb = args.permitProb,
+        seed       = rng,
+    )
+
+    data, dataK, stim = amcCarrier.generateStream(
+        msg,
+        wordRate   = args.wordRate,
+        msgRate    = args.msgRate,
+        crcErrRate = args.crcErrRate,
+        lenErrRate = args.lenErrRate,
+        dropRate   = args.dropRate,
+        seed       = rng,
+    )
+
+    amcCarrier.writeStimulus(args.output, data, dataK, fmt='npy' if args.output.endswith('.npy') else 'text')
+
+    # Check the stream with the framer model
+    framer = amcCarrier.BsaMpsMsgRxFramer()
+    framer.process(data, dataK)
+    expected = amcCarrier.expectedCounters(stim)
+
+    print(f'{len(data)} words written to {args.output}')
+    for k,v in expected.items():
+        print(f'    {k:<14} {v:>10} (model {framer.counters[k]})')
@@ -0,0 +1,160 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS2 AMC Carrier Firmware'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS2 AMC Carrier Firmware', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+#
+# Save, restore (with verify) or diff the link configuration (RxPolarity,
+# TxPolarity, Loopback, RollOverEn of the four cores) of one or more
+# carriers:
+#
+#    python scripts/linkConfig.py --ip 10.0.0.107 --save link.yml
+#    python scripts/linkConfig.py --ipFile rack.txt --restore link.yml
+#    python scripts/linkConfig.py --ipFile rack.txt --diff link.yml
+#
+# With --save, '{ip}' in the file name is replaced by the carrier address.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+
+import sys
+import argparse
+import threading
+import concurrent.futures
+
+import lcls2_llrf as amcCarrier
+
+#################################################################
+
+# Convert str to bool
+argBool = lambda s: s.lower() in ['true', 't', 'yes', '1']
+
+# Set the argument parser
+parser = argparse.ArgumentParser(description='Link configuration save/restore')
+
+# Add arguments
+parser.add_argument(
+    "--ip",
+    type     = str,
+    nargs    = '*',
+    required = False,
+    default  = [],
+    help     = "IP address(es)",
+)
+
+parser.add_argument(
+    "--ipFile",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "File with one target IP address per line ('#' starts a comment)",
+)
+
+parser.add_argument(
+    "--backdoorComm",
+    type     = argBool,
+    required = False,
+    default  = True,
+    help     = "communication type",
+)
+
+parser.add_argument(
+    "--workers",
+    type     = int,
+    required = False,
+    default  = 8,
+    help     = "Number of carriers handled at the same time",
+)
+
+group = parser.add_mutually_exclusive_group(required=True)
+
+group.add_argument(
+    "--save",
+    type     = str,
+    default  = None,
+    help     = "Save the configuration to this YAML file",
+)
+
+group.add_argument(
+    "--restore",
+    type     = str,
+    default  = None,
+    help     = "Write and verify the configuration of this YAML file",
+)
+
+group.add_argument(
+    "--diff",
+    type     = str,
+    default  = None,
+    help     = "Compare the carriers against this YAML file",
+)
+
+#################################################################
+
+printLock = threading.Lock()
+
+def log(ip, msg):
+    with printLock:
+        print(f'[{ip:>15}] {msg}', flush=True)
+
+def runTarget(ip, args):
+    """Run the requested operation on one carrier, returns True on success"""
+    try:
+        with amcCarrier.Root(
+            ip             = ip,
+            backdoorComm   = args.backdoorComm,
+            zmqSrvEn       = False,
+            pollEn         = False,
+            initRead       = False,
+            amcCarrierCore = 'none',
+        ) as root:
+            app = root.Application
+
+            if args.save is not None:
+                path = args.save.format(ip=ip)
+                app.saveLinkConfig(path)
+                log(ip, f'saved to {path}')
+
+            elif args.restore is not None:
+                num, elapsed = app.restoreLinkConfig(args.restore)
+                log(ip, f'restored and verified ({num} blocks written in {1e3*elapsed:.1f} ms)')
+
+            else:
+                diff = app.diffLinkConfig(args.diff)
+                if len(diff) == 0:
+                    log(ip, 'matches the profile')
+                for path,saved,live in diff:
+                    log(ip, f'{path}: {live} (profile {saved})')
+                return len(diff) == 0
+
+        return True
+
+    except Exception as e:
+        log(ip, f'FAILED: {e}')
+        return False
+
+#################################################################
+
+if __name__ == "__main__":
+
+    # Get the arguments
+    args = parser.parse_args()
+
+    ips = list(args.ip)
+    if args.ipFile is not None:
+        with open(args.ipFile) as f:
+            ips += [l.split('#')[0].strip() for l in f if l.split('#')[0].strip() != '']
+
+    if len(ips) == 0:
+        parser.error('no target given, use --ip and/or --ipFile')
+
+    if args.save is not None and len(ips) > 1 and '{ip}' not in args.save:
+        parser.error('--save with several carriers needs "{ip}" in the file name')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(lambda ip: runTarget(ip, args), ips))
+
+    sys.exit(0 if all(results) else 1)
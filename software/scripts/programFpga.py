@@ -16,10 +16,18 @@ import rogue
 import pyrogue.protocols
 import argparse
 import time
+import os
+import threading
+import concurrent.futures
 
 import surf.axi as axi
 import surf.devices.micron as micron
 
+import lcls2_llrf as llrf
+
+# Convert str to bool
+argBool = lambda s: s.lower() in ['true', 't', 'yes', '1']
+
 # Set the argument parser
 parser = argparse.ArgumentParser()
 
@@ -34,12 +42,43 @@ parser.add_argument(
 parser.add_argument(
     "--ip",
     type     = str,
-    required = True,
-    help     = "IP address",
+    nargs    = '*',
+    required = False,
+    default  = [],
+    help     = "IP address(es)",
+)
+
+parser.add_argument(
+    "--ipFile",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "File with one target IP address per line ('#' starts a comment)",
+)
+
+parser.add_argument(
+    "--workers",
+    type     = int,
+    required = False,
+    default  = 8,
+    help     = "Number of targets programmed at the same time",
+)
+
+parser.add_argument(
+    "--incremental",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "Only erase/program the PROM sectors that differ from the MCS image",
 )
 
-# Get the arguments
-args = parser.parse_args()
+parser.add_argument(
+    "--mcsCache",
+    type     = str,
+    required = False,
+    default  = os.path.expanduser('~/.cache/lcls2_llrf/mcs'),
+    help     = "Cache directory of the parsed MCS images (incremental mode)",
+)
 
 class MyRoot(pr.Root):
     def __init__(   self,
@@ -47,7 +86,7 @@ class MyRoot(pr.Root):
             **kwargs):
         super().__init__(**kwargs)
 
-        self.udp = rogue.protocols.udp.Client(args.ip, 8192, 1500 )
+        self.udp = rogue.protocols.udp.Client(ipAddr, 8192, 1500 )
         self.srp = rogue.protocols.srp.SrpV0()
         self.udp == self.srp
 
@@ -64,58 +103,141 @@ class MyRoot(pr.Root):
             addrMode = True,
         ))
 
-# Set base
-base = MyRoot(
-    name     = 'AMCc',
-    pollEn   = False,
-    initRead = False,
-)
-
-# Start the system
-base.start()
-
-# Create useful pointers
-AxiVersion = base.AxiVersion
-MicronN25Q = base.MicronN25Q
-
 #-----------------------------------------------------------------------------
 
-# # Reset the status register
-# MicronN25Q.setPromStatusReg(0x0)
-# if ( MicronN25Q.getPromStatusReg() != 0x0 ):
-    # raise SysTestException( "Failed program FPGA PROM into FSBL hardware-protected mode (0x%x) \n\
-                             # Error Probably due to not having the 2-pin jumper installed" % (MicronN25Q.getPromStatusReg()) )
+printLock = threading.Lock()
+
+def log(ip, msg):
+    with printLock:
+        print(f'[{ip:>15}] {msg}', flush=True)
+
+def buildStamp(AxiVersion):
+    try:
+        return AxiVersion.BuildStamp.get()
+    except Exception as e:
+        return f'unreadable ({e})'
+
+def programTarget(ip, mcs, image, verbose):
+    """Program one carrier (image is None for a full LoadMcsFile), returns a dictionary for the summary"""
+    result = {'ip': ip, 'old': '', 'new': '', 'sectors': None, 'error': None}
+
+    # Set base
+    base = MyRoot(
+        ipAddr   = ip,
+        name     = 'AMCc',
+        pollEn   = False,
+        initRead = False,
+    )
+
+    try:
+        # Start the system
+        base.start()
+
+        # Create useful pointers
+        AxiVersion = base.AxiVersion
+        MicronN25Q = base.MicronN25Q
+
+        # # Reset the status register
+        # MicronN25Q.setPromStatusReg(0x0)
+        # if ( MicronN25Q.getPromStatusReg() != 0x0 ):
+            # raise SysTestException( "Failed program FPGA PROM into FSBL hardware-protected mode (0x%x) \n\
+                                     # Error Probably due to not having the 2-pin jumper installed" % (MicronN25Q.getPromStatusReg()) )
+
+        result['old'] = buildStamp(AxiVersion)
+        if verbose:
+            print ( '###################################################')
+            print ( '#                 Old Firmware                    #')
+            print ( '###################################################')
+            AxiVersion.printStatus()
+        else:
+            log(ip, f'Old firmware: {result["old"]}')
+
+        # Program the FPGA's PROM
+        if image is not None:
+            def progress(step, done, total):
+                if done == total or (done % 16) == 0:
+                    log(ip, f'{step:>8}: {done}/{total} sectors')
+
+            dirty = llrf.incrementalLoad(llrf.N25QProm(MicronN25Q), image, progress)
+            log(ip, f'{len(dirty)} of {len(image.sectors())} sectors programmed')
+            result['sectors'] = len(dirty)
+            progDone = True
+            changed  = len(dirty) > 0
+        else:
+            log(ip, 'Loading the MCS file')
+            MicronN25Q.LoadMcsFile(mcs)
+            progDone = MicronN25Q._progDone
+            changed  = True
+
+        if(progDone and not changed):
+            log(ip, 'PROM already holds the MCS image, FPGA reload skipped')
+            result['new'] = result['old']
+        elif(progDone):
+            log(ip, 'Reloading FPGA firmware from PROM ....')
+            AxiVersion.FpgaReload()
+            time.sleep(10)
+            log(ip, 'Reloading FPGA done')
+
+            result['new'] = buildStamp(AxiVersion)
+            if verbose:
+                print ( '###################################################')
+                print ( '#                 New Firmware                    #')
+                print ( '###################################################')
+                AxiVersion.printStatus()
+        else:
+            result['error'] = 'Failed to program FPGA'
+
+        # MicronN25Q.setPromStatusReg(0xE8)
+        # if ( MicronN25Q.getPromStatusReg() != 0xE8 ):
+            # raise SysTestException( "Failed program FPGA PROM into FSBL hardware-protected mode (0x%x)" % (MicronN25Q.getPromStatusReg()) )
+
+    except Exception as e:
+        result['error'] = str(e)
+
+    finally:
+        base.stop()
+
+    if result['error'] is not None:
+        log(ip, result['error'])
+
+    return result
 
 #-----------------------------------------------------------------------------
 
-print ( '###################################################')
-print ( '#                 Old Firmware                    #')
-print ( '###################################################')
-AxiVersion.printStatus()
+if __name__ == "__main__":
 
-# Program the FPGA's PROM
-MicronN25Q.LoadMcsFile(args.mcs)
+    # Get the arguments
+    args = parser.parse_args()
 
-if(MicronN25Q._progDone):
-    print('\nReloading FPGA firmware from PROM ....')
-    AxiVersion.FpgaReload()
-    time.sleep(10)
-    print('\nReloading FPGA done')
+    ips = list(args.ip)
+    if args.ipFile is not None:
+        with open(args.ipFile) as f:
+            ips += [l.split('#')[0].strip() for l in f if l.split('#')[0].strip() != '']
 
-    print ( '###################################################')
-    print ( '#                 New Firmware                    #')
-    print ( '###################################################')
-    AxiVersion.printStatus()
-else:
-    print('Failed to program FPGA')
+    if len(ips) == 0:
+        parser.error('no target given, use --ip and/or --ipFile')
 
-#-----------------------------------------------------------------------------
+    # Parse the MCS file once for all the targets
+    image = llrf.loadMcs(args.mcs, args.mcsCache) if args.incremental else None
 
-# MicronN25Q.setPromStatusReg(0xE8)
-# if ( MicronN25Q.getPromStatusReg() != 0xE8 ):
-    # raise SysTestException( "Failed program FPGA PROM into FSBL hardware-protected mode (0x%x)" % (MicronN25Q.getPromStatusReg()) )
+    # Full status printout is only readable with a single target
+    verbose = (len(ips) == 1)
 
-#-----------------------------------------------------------------------------
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(lambda ip: programTarget(ip, args.mcs, image, verbose), ips))
 
-base.stop()
-exit()
+    print ( '###################################################')
+    print ( '#                    Summary                      #')
+    print ( '###################################################')
+    for r in results:
+        status = 'OK' if r['error'] is None else f'FAILED: {r["error"]}'
+        print(f'{r["ip"]:>15} : {status}')
+        print(f'{"":>15}   old : {r["old"]}')
+        print(f'{"":>15}   new : {r["new"]}')
+        if r['sectors'] is not None:
+            print(f'{"":>15}   sectors programmed : {r["sectors"]}')
+
+    failed = [r['ip'] for r in results if r['error'] is not None]
+    print(f'{len(results) - len(failed)} of {len(results)} targets programmed, {len(failed)} failed')
+
+    exit(1 if len(failed) > 0 else 0)